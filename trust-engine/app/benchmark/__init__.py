@@ -0,0 +1,53 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+def synthetic_addresses(num_nodes: int, seed: int = 0) -> np.ndarray:
+    """
+    ランダムなウォレットアドレスを生成する
+    """
+    rng = np.random.default_rng(seed)
+    raw = rng.integers(0, 256, size=(num_nodes, 20), dtype=np.uint8)
+    return np.array(["0x" + row.tobytes().hex() for row in raw], dtype=object)
+
+def synthetic_transactions(num_edges: int, num_nodes: int = None, contract_address: str = "0xbenchmark", seed: int = 0) -> pd.DataFrame:
+    """
+    べき乗則に従う次数分布を持つ合成の取引データを生成する
+    """
+    rng = np.random.default_rng(seed)
+    num_nodes = num_nodes or max(num_edges // 10, 2)
+    addresses = synthetic_addresses(num_nodes, seed=seed)
+
+    # Zipf分布で取引が一部のアドレスに集中するようにする
+    source = (rng.zipf(2.0, size=num_edges) - 1) % num_nodes
+    target = rng.integers(0, num_nodes, size=num_edges)
+    target = np.where(target == source, (target + 1) % num_nodes, target)
+
+    return pd.DataFrame({
+        "tokenId": pd.array(np.arange(num_edges).astype(str), dtype="string"),
+        "from": pd.array(addresses[source], dtype="string"),
+        "to": pd.array(addresses[target], dtype="string"),
+        "gasPrice": rng.uniform(1e9, 1e11, size=num_edges).astype("float32"),
+        "gasUsed": rng.uniform(2e4, 2e5, size=num_edges).astype("float32"),
+        "contractAddress": pd.array([contract_address] * num_edges, dtype="string"),
+        "tokenUri": pd.array([""] * num_edges, dtype="string"),
+        "blockNumber": np.sort(rng.integers(0, num_edges, size=num_edges)).astype("uint32"),
+    })
+
+@contextmanager
+def measure(label: str, result: dict):
+    """
+    処理時間とPythonヒープのピークメモリを計測してresultに保存する
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result[label] = {"seconds": elapsed, "peak_mb": peak / 1024 ** 2}
+        print(f"{label}: {elapsed:.3f} s, peak {peak / 1024 ** 2:.1f} MB")
@@ -0,0 +1,61 @@
+"""
+バッチ生成のジョブをスレッドで実行する場合とワーカープロセスで実行する場合のスループットを比較するベンチマーク
+
+取引データはリクエストで指定し、学習済みモデルの代わりにランダムな重みのチェックポイントを一時ディレクトリに作成する
+スレッドではGILにより中心性の計算などのPythonの処理が並列に実行されないため、CPUのコア数に応じてプロセスの方が速くなる
+    python -m benchmark.batch_workers --contracts 8 --edges 20000 --workers 1 2 4
+"""
+import argparse
+import os
+import tempfile
+import time
+import torch
+from torch_geometric.nn import VGAE
+from benchmark import synthetic_transactions
+from components import worker
+from components.database import FEATURE_COLUMNS
+from components.jobs import JobManager
+from components.model import GraphEncoder
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contracts", type=int, default=8)
+    parser.add_argument("--edges", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    # 取引データ(コントラクトごとに異なる乱数)
+    batches = []
+    for seed in range(args.contracts):
+        df_transaction = synthetic_transactions(args.edges, contract_address=f"0xbenchmark{seed}", seed=seed)
+        df_transaction["blockNumber"] = df_transaction["blockNumber"].astype(int)
+        batches.append(df_transaction.to_dict("records"))
+    options = {"betweenness_mode": "sample", "k": 100, "seed": 0}
+
+    with tempfile.TemporaryDirectory() as directory:
+        # ワーカープロセスは作業ディレクトリを引き継ぐ
+        os.chdir(directory)
+        os.makedirs("data")
+        model = VGAE(GraphEncoder(in_channels=len(FEATURE_COLUMNS), out_channels=len(FEATURE_COLUMNS)))
+        torch.save({"model_state_dict": model.state_dict()}, os.path.join("data", "best_model.pt"))
+
+        print(f"cpu={os.cpu_count()} contracts={args.contracts} edges={args.edges}")
+        for workers in args.workers:
+            for label, processes in [("thread", False), ("process", True)]:
+                job_manager = JobManager(max_workers=workers, processes=processes, initializer=worker.init_worker, initargs=("neo4j://localhost:7687",))
+                # ワーカーの起動とモデルのロードを計測から除外する
+                warmup = [job_manager.submit(worker.run_generate, contract_address="0xwarmup", transactions=batches[0][:100]) for _ in range(workers)]
+                list(job_manager.as_completed(warmup))
+
+                begin = time.perf_counter()
+                job_ids = [
+                    job_manager.submit(worker.run_generate, contract_address=f"0xbenchmark{i}", transactions=transactions, centrality_options=options)
+                    for i, transactions in enumerate(batches)
+                ]
+                statuses = [job["status"] for job in job_manager.as_completed(job_ids)]
+                elapsed = time.perf_counter() - begin
+                job_manager.shutdown()
+                print(f"workers={workers} {label:>7}: {elapsed:.2f} s, {args.contracts / elapsed:.2f} contracts/s, {statuses.count('finished')} finished")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+媒介中心性の計算方法ごとの精度と計算時間を比較するベンチマーク
+
+lesmis.gmlと合成のべき乗則グラフに対してexact, sample, parallelを計測する
+parallelはノード数がPARALLEL_BETWEENNESS_MIN_NODES未満のグラフでは1プロセスで計算する
+    python -m benchmark.betweenness --gml ../../lesmis.gml --nodes 1000 5000 --k 64 256 --workers 4
+"""
+import argparse
+import time
+import networkx as nx
+import pandas as pd
+from components.centralality import betweenness_centrality, parallel_betweenness_centrality
+
+def power_law_graph(num_nodes: int, seed: int = 0) -> nx.DiGraph:
+    graph = nx.DiGraph(nx.scale_free_graph(num_nodes, seed=seed))
+    graph.remove_edges_from(nx.selfloop_edges(graph))
+    return graph
+
+def accuracy(exact: dict, approx: dict, top: int = 10) -> dict:
+    exact = pd.Series(exact)
+    approx = pd.Series(approx)[exact.index]
+    top_exact = set(exact.nlargest(top).index)
+    top_approx = set(approx.nlargest(top).index)
+    return {
+        "max_abs_error": float((exact - approx).abs().max()),
+        "spearman": float(exact.rank().corr(approx.rank())),
+        f"top{top}_overlap": len(top_exact & top_approx) / top,
+    }
+
+def run(name: str, graph: nx.DiGraph, k_list: list, workers: int) -> list:
+    rows = []
+    start = time.perf_counter()
+    exact = betweenness_centrality(graph, mode="exact")
+    exact_seconds = time.perf_counter() - start
+    rows.append({"graph": name, "mode": "exact", "k": None, "seconds": exact_seconds, **accuracy(exact, exact)})
+
+    settings = [("parallel", None)] + [(mode, k) for k in k_list for mode in ["sample", "parallel"]]
+    for mode, k in settings:
+        start = time.perf_counter()
+        approx = betweenness_centrality(graph, mode=mode, k=k, workers=workers, seed=0)
+        seconds = time.perf_counter() - start
+        rows.append({"graph": name, "mode": mode, "k": k, "seconds": seconds, **accuracy(exact, approx)})
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gml", default="../../lesmis.gml")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--k", type=int, nargs="+", default=[64, 256])
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    graphs = [("lesmis", nx.DiGraph(nx.read_gml(args.gml)))]
+    graphs += [(f"power_law_{n}", power_law_graph(n)) for n in args.nodes]
+
+    # ワーカープロセスの起動時間を計測に含めないように、先にプールを起動する
+    parallel_betweenness_centrality(power_law_graph(args.workers * 2), workers=args.workers, min_nodes=0)
+
+    rows = []
+    for name, graph in graphs:
+        print(f"{name}: nodes={graph.number_of_nodes()}, edges={graph.number_of_edges()}")
+        rows += run(name, graph, args.k, args.workers)
+    print(pd.DataFrame(rows).to_string(index=False, float_format="%.4f"))
+
+if __name__ == "__main__":
+    main()
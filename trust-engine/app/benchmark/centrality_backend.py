@@ -0,0 +1,45 @@
+"""
+次数中心性とPageRankのNetworkXとSciPyの疎行列による計算時間と誤差を比較するベンチマーク
+
+合成の取引データから作成したグラフに対して計測する(重複する取引は1本のエッジになる。グラフの作成時間は含めない)
+NetworkX側はnx.in_degree_centralityとnx.pagerankを直接呼ぶ(calculate_centrality(backend="networkx")と同じ値)
+PageRankはどちらも同じべき乗法のため、誤差は浮動小数点の丸め誤差程度になる
+    python -m benchmark.centrality_backend --edges 10000 100000 1000000
+"""
+import argparse
+import time
+import networkx as nx
+from benchmark import synthetic_transactions
+from components.centralality import PAGERANK_MAX_ITER, sparse_centrality
+
+def networkx_centrality(graph: nx.DiGraph) -> tuple[dict, dict]:
+    return nx.in_degree_centrality(graph), nx.pagerank(graph, max_iter=PAGERANK_MAX_ITER)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edges", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    for num_edges in args.edges:
+        df_transaction = synthetic_transactions(num_edges, num_nodes=max(num_edges // 4, 2))
+        graph = nx.DiGraph()
+        graph.add_edges_from(zip(df_transaction["from"], df_transaction["to"]))
+
+        seconds = {}
+        results = {}
+        for backend, calculate in [("networkx", networkx_centrality), ("scipy", sparse_centrality)]:
+            start = time.perf_counter()
+            results[backend] = calculate(graph)
+            seconds[backend] = time.perf_counter() - start
+
+        errors = [
+            max(abs(expected[node] - actual[node]) for node in graph)
+            for expected, actual in zip(results["networkx"], results["scipy"])
+        ]
+        print(f"edges={graph.number_of_edges():>8} nodes={graph.number_of_nodes():>7} "
+              f"networkx {seconds['networkx']:.3f} s, scipy {seconds['scipy']:.3f} s "
+              f"({seconds['networkx'] / seconds['scipy']:.1f}x), "
+              f"max abs error degree {errors[0]:.1e}, pagerank {errors[1]:.1e}")
+
+if __name__ == "__main__":
+    main()
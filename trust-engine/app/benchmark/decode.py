@@ -0,0 +1,52 @@
+"""
+generateのエッジデコードにおける密行列と行ブロック処理のピークメモリと計算時間を比較するベンチマーク
+
+各計測は別プロセスで実行し、潜在表現の作成後からの最大常駐メモリの増加量を計測する
+    python -m benchmark.decode --nodes 5000 10000 20000
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+import torch
+from components.generate import decode_edges
+
+def dense_decode(z: torch.Tensor, threshold: float, num_edges: int) -> torch.Tensor:
+    # 従来の実装
+    prob = torch.sigmoid(z @ z.t())
+    adj_matrix = (prob > threshold).nonzero(as_tuple=False).t().cpu()
+    return adj_matrix[:, torch.randperm(adj_matrix.size(1))[:num_edges]]
+
+def run(mode: str, num_nodes: int, dim: int, threshold: float) -> dict:
+    torch.manual_seed(0)
+    z = torch.randn(num_nodes, dim) / dim ** 0.5
+    num_edges = num_nodes * 5
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    if mode == "dense":
+        edges = dense_decode(z, threshold, num_edges)
+    else:
+        edges = decode_edges(z, threshold=threshold, num_edges=num_edges)
+    seconds = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"mode": mode, "nodes": num_nodes, "edges": edges.size(1), "seconds": seconds, "peak_mb": (peak - baseline) / 1024}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, nargs="+", default=[5000, 10000, 20000])
+    parser.add_argument("--dim", type=int, default=6)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    for num_nodes in args.nodes:
+        for mode in ["dense", "block"]:
+            with context.Pool(1) as pool:
+                result = pool.apply(run, (mode, num_nodes, args.dim, args.threshold))
+            print(f"{result['mode']:>5} nodes={result['nodes']:>7} edges={result['edges']:>7} "
+                  f"{result['seconds']:.3f} s, peak +{result['peak_mb']:.1f} MB")
+
+if __name__ == "__main__":
+    main()
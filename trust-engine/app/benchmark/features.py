@@ -0,0 +1,58 @@
+"""
+ノードの特徴量作成における従来のpandasの集計と1回の走査による集計の計算時間とピークメモリを比較するベンチマーク
+
+中心性の計算は両方で共通のため、入次数から求めた値を事前にキャッシュして計測から除外する
+    python -m benchmark.features --edges 1000000
+"""
+import argparse
+import networkx as nx
+import numpy as np
+from benchmark import synthetic_transactions, measure
+from components.cache import CentralityCache
+from components.database import Database
+
+def legacy_feature_data(database: Database, df_transaction, graph):
+    # 従来の実装(集計・標準化・変換をそれぞれDataFrameで行う)
+    df_feature = database.get_features(df_transaction=df_transaction, graph=graph)
+    feature_means = df_feature.mean()
+    feature_stds = df_feature.std(ddof=0).replace(0, 1)
+    df_feature = (df_feature - feature_means) / feature_stds
+    data = database.transform_data(df_transaction=df_transaction, df_feature=df_feature)
+    return df_feature, data
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edges", type=int, default=1000000)
+    parser.add_argument("--nodes", type=int, default=None)
+    args = parser.parse_args()
+
+    df_transaction = synthetic_transactions(args.edges, args.nodes)
+    graph = nx.DiGraph()
+    graph.add_edges_from(zip(df_transaction["from"], df_transaction["to"]))
+    print(f"transfers={len(df_transaction)} nodes={graph.number_of_nodes()}")
+
+    # 中心性は計測の対象外とする
+    database = Database.__new__(Database)  # driver接続を避けてメソッドだけ利用
+    database.centrality_cache = CentralityCache()
+    in_degree = dict(graph.in_degree())
+    centrality = {
+        "degree": {node: value / graph.number_of_nodes() for node, value in in_degree.items()},
+        "betweenness": dict.fromkeys(graph.nodes, 0.0),
+        "pagerank": {node: 1 / graph.number_of_nodes() for node in graph.nodes},
+    }
+    database.centrality_cache.put(graph, centrality, {})
+
+    result = {}
+    with measure("pandas", result):
+        expected, expected_data = legacy_feature_data(database, df_transaction, graph)
+    with measure("single-pass", result):
+        df_feature, data = database.build_feature_data(df_transaction=df_transaction, graph=graph)
+
+    # 結果が一致することを確認(行の順番はDataのノード順)
+    expected = expected.loc[df_feature.index].to_numpy(dtype=np.float32)
+    print(f"max abs diff: {np.abs(expected - df_feature.to_numpy()).max():.2e}")
+    print(f"speedup: {result['pandas']['seconds'] / result['single-pass']['seconds']:.1f}x, "
+          f"peak memory: {result['single-pass']['peak_mb'] / result['pandas']['peak_mb']:.2f}x")
+
+if __name__ == "__main__":
+    main()
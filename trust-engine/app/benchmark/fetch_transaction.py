@@ -0,0 +1,66 @@
+"""
+fetch_transactionのパス取得モードとカラム取得モードを比較するベンチマーク
+
+合成の取引データをNeo4jに書き込み、両方のモードで取得時間を計測した後に削除する
+    python -m benchmark.fetch_transaction --url neo4j://graph-db:7687 --edges 1000000
+"""
+import argparse
+from benchmark import synthetic_transactions, measure
+from components.database import Database
+
+BATCH_SIZE = 50000
+
+def load(database: Database, contract_address: str, num_edges: int) -> None:
+    df_transaction = synthetic_transactions(num_edges, contract_address=contract_address)
+    rows = df_transaction.astype({"gasPrice": "float64", "gasUsed": "float64", "blockNumber": "int64"}).to_dict("records")
+    with database.driver.session() as session:
+        for start in range(0, len(rows), BATCH_SIZE):
+            session.run(
+                """
+                UNWIND $rows AS row
+                MERGE (s:User {address: row.from})
+                MERGE (e:User {address: row.to})
+                CREATE (s)-[:TRANSFER {
+                    tokenId: row.tokenId,
+                    contractAddress: row.contractAddress,
+                    blockNumber: row.blockNumber,
+                    gasPrice: row.gasPrice,
+                    gasUsed: row.gasUsed,
+                    tokenUri: row.tokenUri
+                }]->(e)
+                """,
+                rows=rows[start:start + BATCH_SIZE]
+            ).consume()
+
+def cleanup(database: Database, contract_address: str) -> None:
+    with database.driver.session() as session:
+        session.run(
+            """
+            MATCH ()-[r:TRANSFER {contractAddress: $address}]->()
+            CALL (r) { DELETE r } IN TRANSACTIONS OF 50000 ROWS
+            """,
+            address=contract_address
+        ).consume()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="neo4j://graph-db:7687")
+    parser.add_argument("--edges", type=int, default=1000000)
+    parser.add_argument("--contract-address", default="0xbenchmark-fetch-transaction")
+    args = parser.parse_args()
+
+    database = Database(args.url)
+    load(database, args.contract_address, args.edges)
+    try:
+        result = {}
+        for fetch_mode in ["path", "columnar"]:
+            with measure(fetch_mode, result):
+                df_transaction, graph = database.get_transaction(args.contract_address, use_cache=False, fetch_mode=fetch_mode)
+            print(f"  rows={len(df_transaction)}, nodes={graph.number_of_nodes()}, edges={graph.number_of_edges()}")
+        print(f"speedup: {result['path']['seconds'] / result['columnar']['seconds']:.2f}x")
+    finally:
+        cleanup(database, args.contract_address)
+        database.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+取引が追加されたグラフのPageRankを一様な初期値から計算する場合と前回の値から計算する場合の反復回数と計算時間を比較するベンチマーク
+
+収束判定はnx.pagerankと同じく変化量のL1ノルムがノード数×tol未満であり、大きなグラフでは緩くなるため小さなtolでも計測する
+    python -m benchmark.pagerank_warm_start --edges 100000 1000000 --new-edges 100 --tol 1e-6 1e-12
+"""
+import argparse
+import time
+import networkx as nx
+import numpy as np
+from benchmark import synthetic_transactions
+from components.centralality import adjacency_matrix, sparse_pagerank
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edges", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--new-edges", type=int, default=100)
+    parser.add_argument("--tol", type=float, nargs="+", default=[1e-6, 1e-12])
+    args = parser.parse_args()
+
+    for num_edges in args.edges:
+        df_transaction = synthetic_transactions(num_edges, num_nodes=max(num_edges // 4, 2))
+        edges = list(zip(df_transaction["from"], df_transaction["to"]))
+
+        # 前回の計算時のグラフ(最後のnew_edges件の取引を除く)
+        graph = nx.DiGraph()
+        graph.add_edges_from(edges[:-args.new_edges])
+        nodes, adjacency = adjacency_matrix(graph)
+        previous = dict(zip(nodes, sparse_pagerank(adjacency, tol=min(args.tol))[0]))
+
+        # 取引を追加したグラフ
+        graph.add_edges_from(edges[-args.new_edges:])
+        nodes, adjacency = adjacency_matrix(graph)
+        x0 = np.fromiter((previous.get(node, 1.0 / len(nodes)) for node in nodes), dtype=np.float64, count=len(nodes))
+
+        for tol in args.tol:
+            results = {}
+            for label, start in [("cold", None), ("warm", x0)]:
+                begin = time.perf_counter()
+                pagerank, iterations, residual = sparse_pagerank(adjacency, tol=tol, x0=start)
+                results[label] = pagerank
+                print(f"edges={graph.number_of_edges():>8} new={args.new_edges} tol={tol:.0e} {label}: "
+                      f"{iterations:>3} iterations, residual {residual:.2e}, {time.perf_counter() - begin:.3f} s")
+            print(f"  max abs diff: {np.abs(results['cold'] - results['warm']).max():.1e}")
+
+if __name__ == "__main__":
+    main()
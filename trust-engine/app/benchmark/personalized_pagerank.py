@@ -0,0 +1,41 @@
+"""
+1つのアドレスのスコアを求める場合に、グラフ全体のPageRankと個人化PageRank(フォワードプッシュ)の計算時間を比較するベンチマーク
+
+個人化PageRankはプッシュ回数が閾値epsilonで決まるため、グラフが大きくなっても計算時間がほとんど変わらない
+    python -m benchmark.personalized_pagerank --edges 100000 1000000 --epsilon 1e-3 1e-4 1e-5
+"""
+import argparse
+import time
+import networkx as nx
+from benchmark import synthetic_transactions
+from components.centralality import adjacency_matrix, sparse_pagerank, personalized_pagerank
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edges", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--epsilon", type=float, nargs="+", default=[1e-3, 1e-4, 1e-5])
+    args = parser.parse_args()
+
+    for num_edges in args.edges:
+        df_transaction = synthetic_transactions(num_edges, num_nodes=max(num_edges // 4, 2))
+        graph = nx.DiGraph()
+        graph.add_edges_from(zip(df_transaction["from"], df_transaction["to"]))
+        # 取引が集中するアドレスではなく、出次数が中央値の一般的なアドレスを始点にする
+        senders = sorted((node for node in graph if graph.out_degree(node) > 0), key=graph.out_degree)
+        source = senders[len(senders) // 2]
+
+        num_edges = graph.number_of_edges()
+
+        begin = time.perf_counter()
+        sparse_pagerank(adjacency_matrix(graph)[1])
+        print(f"edges={num_edges:>8} global pagerank: {time.perf_counter() - begin:.3f} s")
+
+        for epsilon in args.epsilon:
+            begin = time.perf_counter()
+            estimate, pushes, residual = personalized_pagerank(graph, source, epsilon=epsilon)
+            elapsed = time.perf_counter() - begin
+            print(f"edges={num_edges:>8} personalized eps={epsilon:.0e}: {elapsed * 1000:.2f} ms, "
+                  f"{pushes} pushes, {len(estimate)} nodes, residual {residual:.2e}")
+
+if __name__ == "__main__":
+    main()
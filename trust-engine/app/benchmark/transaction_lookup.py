@@ -0,0 +1,62 @@
+"""
+/transactionの取得方法ごとのレイテンシを比較するベンチマーク
+
+合成の取引データをNeo4jに書き込み、全件取得してDataFrameで絞り込む従来の方法と
+インデックスを使って指定したアドレスの最新の取引のみを取得する方法を比較した後に削除する
+    python -m benchmark.transaction_lookup --url neo4j://graph-db:7687 --edges 500000
+"""
+import argparse
+import random
+import statistics
+import time
+from benchmark.fetch_transaction import load, cleanup
+from components.database import Database
+
+def lookup_full_scan(database: Database, contract_address: str, address: str) -> dict | None:
+    # 従来の実装(取引データのアドレスはIDのため、IDで絞り込んで文字列に戻す)
+    df_transaction, graph = database.get_transaction(contract_address=contract_address, use_cache=False)
+    address_id = database.address_table.get_id(address)
+    df_transaction = df_transaction.sort_values(by="blockNumber", ascending=False)
+    result = df_transaction[df_transaction["from"] == address_id][["from", "to", "tokenUri"]]
+    if result.empty:
+        result = df_transaction[df_transaction["to"] == address_id][["from", "to", "tokenUri"]]
+    if result.empty:
+        return None
+    transaction = result.iloc[0].to_dict()
+    transaction["from"], transaction["to"] = database.address_table.labels([transaction["from"], transaction["to"]])
+    return transaction
+
+def lookup_indexed(database: Database, contract_address: str, address: str) -> dict | None:
+    return database.get_latest_transaction(contract_address=contract_address, address=address)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="neo4j://graph-db:7687")
+    parser.add_argument("--edges", type=int, default=500000)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--contract-address", default="0xbenchmark-transaction-lookup")
+    args = parser.parse_args()
+
+    database = Database(args.url)
+    database.ensure_indexes()
+    load(database, args.contract_address, args.edges)
+    try:
+        df_transaction, _ = database.get_transaction(args.contract_address, use_cache=False)
+        # 取引データのアドレスはIDのため、対応表でアドレスに戻してから問い合わせる
+        address_ids = random.Random(0).sample(df_transaction["from"].unique().tolist(), args.queries)
+        addresses = database.address_table.labels(address_ids)
+        for name, lookup in [("full_scan", lookup_full_scan), ("indexed", lookup_indexed)]:
+            latencies = []
+            for address in addresses:
+                start = time.perf_counter()
+                transaction = lookup(database, args.contract_address, address)
+                latencies.append(time.perf_counter() - start)
+                if transaction is None:
+                    raise RuntimeError(f"{name}: no transaction found for {address}")
+            print(f"{name}: median {statistics.median(latencies) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms")
+    finally:
+        cleanup(database, args.contract_address)
+        database.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import itertools
+import threading
+import numpy as np
+import pandas as pd
+
+# アドレスのバイト数
+ADDRESS_BYTES = 20
+
+# 大文字の位置のビットマスクのバイト数(16進数40桁分)
+CASE_MASK_BYTES = 5
+
+# 0xを含むアドレスの文字数
+ADDRESS_LENGTH = 2 + ADDRESS_BYTES * 2
+
+# 登録できるアドレス数の上限
+# 1アドレスあたり値とビットマスクで25byte、検索用のハッシュ表で最大16byteのため、上限まで登録した場合は約350MBになる
+MAX_ADDRESSES = 2 ** 23
+
+# 配列の初期の確保数
+INITIAL_CAPACITY = 1024
+
+# 16進数の文字の値(16進数でない文字は-1)
+HEX_VALUES = np.full(256, -1, dtype=np.int16)
+for digits, offset in [(b"0123456789", 0), (b"abcdef", 10), (b"ABCDEF", 10)]:
+    HEX_VALUES[np.frombuffer(digits, dtype=np.uint8)] = np.arange(len(digits)) + offset
+
+# 値から16進数の文字への変換表(小文字)
+HEX_CHARS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+# ハッシュ値の計算に使う奇数の定数
+HASH_MULTIPLIERS = np.array(
+    [0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93],
+    dtype=np.uint64
+)
+
+# 対応表を区別する番号(IDは対応表ごとに異なるため、結果のキャッシュのキーに使う)
+_generations = itertools.count()
+
+class AddressTableFullError(ValueError):
+    """
+    対応表の登録数が上限に達した場合のエラー
+    """
+
+def parse_addresses(addresses) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    アドレスを20byteの値と大文字の位置のビットマスク(5byte)に変換する
+    16進数の変換は全てのアドレスをまとめてNumPyで行う
+    (20byteの16進数のアドレスかどうか, 値の配列(N×20), ビットマスクの配列(N×5))を返す
+    """
+    addresses = list(addresses)
+    is_hex = np.zeros(len(addresses), dtype=bool)
+    values = np.zeros((len(addresses), ADDRESS_BYTES), dtype=np.uint8)
+    case_masks = np.zeros((len(addresses), CASE_MASK_BYTES), dtype=np.uint8)
+    candidates = np.array([
+        i for i, address in enumerate(addresses)
+        if isinstance(address, str) and len(address) == ADDRESS_LENGTH and address.startswith("0x") and address.isascii()
+    ], dtype=np.int64)
+    if len(candidates) == 0:
+        return is_hex, values, case_masks
+
+    chars = np.frombuffer("".join(addresses[i][2:] for i in candidates).encode("ascii"), dtype=np.uint8)
+    chars = chars.reshape(len(candidates), ADDRESS_BYTES * 2)
+    digits = HEX_VALUES[chars]
+    is_hex[candidates] = (digits >= 0).all(axis=1)
+
+    # 2桁ずつ1byteにまとめ、大文字の位置を桁の順にビットマスクにする
+    values[candidates] = (digits[:, 0::2] << 4 | digits[:, 1::2]).astype(np.uint8)
+    is_upper = (chars >= ord("A")) & (chars <= ord("F"))
+    case_masks[candidates] = np.packbits(is_upper, axis=1, bitorder="little")
+    return is_hex, values, case_masks
+
+def format_addresses(values: np.ndarray, case_masks: np.ndarray) -> list[str]:
+    """
+    20byteの値と大文字の位置のビットマスクを元のアドレスの文字列に戻す
+    """
+    if len(values) == 0:
+        return []
+    chars = np.empty((len(values), ADDRESS_LENGTH), dtype=np.uint8)
+    chars[:, 0] = ord("0")
+    chars[:, 1] = ord("x")
+    digits = chars[:, 2:]
+    digits[:, 0::2] = HEX_CHARS[values >> 4]
+    digits[:, 1::2] = HEX_CHARS[values & 0x0F]
+
+    # ビットマスクが立っている桁を大文字にする(a-fのみが対象になる)
+    is_upper = np.unpackbits(case_masks, axis=1, bitorder="little")[:, :ADDRESS_BYTES * 2].astype(bool)
+    digits[is_upper] -= ord("a") - ord("A")
+    text = chars.tobytes().decode("ascii")
+    return [text[i:i + ADDRESS_LENGTH] for i in range(0, len(text), ADDRESS_LENGTH)]
+
+def hash_addresses(values: np.ndarray, case_masks: np.ndarray) -> np.ndarray:
+    """
+    値とビットマスクの25byteから64bitのハッシュ値を計算する
+    """
+    words = np.zeros((len(values), 32), dtype=np.uint8)
+    words[:, :ADDRESS_BYTES] = values
+    words[:, ADDRESS_BYTES:ADDRESS_BYTES + CASE_MASK_BYTES] = case_masks
+    words = words.view(np.uint64)
+    hashes = np.bitwise_xor.reduce(words * HASH_MULTIPLIERS, axis=1)
+    hashes ^= hashes >> np.uint64(29)
+    return hashes * HASH_MULTIPLIERS[0]
+
+class AddressTable:
+    """
+    ウォレットアドレスを連番のuint32のIDに対応付けるテーブル
+    アドレスはIDの順に20byteの値(N×20のuint8の配列)と大文字の位置のビットマスク(N×5、チェックサム形式の復元用)で保持し、
+    アドレスからIDへの検索はIDを格納したハッシュ表(線形探索のオープンアドレス法)で行う
+    20byteの16進数でないアドレスは件数が少ないため辞書で保持する
+    IDはテーブル内で変わらないため、キャッシュしたグラフや計算結果でも同じIDを使える
+    登録数がmax_sizeを超える場合はAddressTableFullErrorを送出する
+    """
+    def __init__(self, max_size: int = MAX_ADDRESSES):
+        self.max_size = max_size
+        self.generation = next(_generations)
+        self.size = 0
+        self.values = np.zeros((INITIAL_CAPACITY, ADDRESS_BYTES), dtype=np.uint8)
+        self.case_masks = np.zeros((INITIAL_CAPACITY, CASE_MASK_BYTES), dtype=np.uint8)
+        # ハッシュ表の各要素はID+1(0は空き)。要素数は2の累乗で、登録数の2倍以上を保つ
+        self.slots = np.zeros(INITIAL_CAPACITY * 2, dtype=np.uint32)
+        # 16進数でないアドレス
+        self.other_ids: dict[str, int] = {}
+        self.other_labels: dict[int, str] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _positions(self, hashes: np.ndarray) -> np.ndarray:
+        # ハッシュ値の上位ビットをハッシュ表の位置にする
+        bits = int(len(self.slots)).bit_length() - 1
+        return (hashes >> np.uint64(64 - bits)).astype(np.int64)
+
+    def _lookup(self, values: np.ndarray, case_masks: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        ハッシュ表からIDを検索する
+        (ID(未登録の場合は-1), 未登録のアドレスが最初に見つけた空きの位置)を返す
+        """
+        ids = np.full(len(values), -1, dtype=np.int64)
+        positions = self._positions(hash_addresses(values, case_masks))
+        pending = np.arange(len(values))
+        mask = len(self.slots) - 1
+        while len(pending) > 0:
+            candidates = self.slots[positions[pending]].astype(np.int64) - 1
+            found = candidates >= 0
+            matched = np.zeros(len(pending), dtype=bool)
+            rows = candidates[found]
+            matched[found] = (
+                (self.values[rows] == values[pending[found]]).all(axis=1)
+                & (self.case_masks[rows] == case_masks[pending[found]]).all(axis=1)
+            )
+            ids[pending[matched]] = candidates[matched]
+
+            # 一致せず空きでもない場合は次の位置を探す
+            collided = found & ~matched
+            positions[pending[collided]] = (positions[pending[collided]] + 1) & mask
+            pending = pending[collided]
+        return ids, positions
+
+    def _insert(self, ids: np.ndarray, positions: np.ndarray) -> None:
+        """
+        重複のない未登録のIDをハッシュ表に追加する(同じ空きを選んだIDは1つのみ格納し、残りは次の位置を探す)
+        """
+        pending = np.arange(len(ids))
+        mask = len(self.slots) - 1
+        while len(pending) > 0:
+            free = pending[self.slots[positions[pending]] == 0]
+            _, first = np.unique(positions[free], return_index=True)
+            placed = free[first]
+            self.slots[positions[placed]] = ids[placed] + 1
+            pending = np.setdiff1d(pending, placed, assume_unique=True)
+            positions[pending] = (positions[pending] + 1) & mask
+
+    def _reserve(self, count: int) -> None:
+        """
+        count件を追加できるように配列とハッシュ表を拡張する
+        """
+        required = self.size + count
+        if required > self.max_size:
+            raise AddressTableFullError(f"Address table is full ({self.max_size} addresses)")
+        if required > len(self.values):
+            capacity = min(max(len(self.values) * 2, required), self.max_size)
+            for name in ["values", "case_masks"]:
+                array = getattr(self, name)
+                grown = np.zeros((capacity, array.shape[1]), dtype=np.uint8)
+                grown[:self.size] = array[:self.size]
+                setattr(self, name, grown)
+        if required * 2 > len(self.slots):
+            # ハッシュ表を作り直して登録済みのIDを入れ直す
+            self.slots = np.zeros(1 << (required * 2 - 1).bit_length(), dtype=np.uint32)
+            hex_ids = np.setdiff1d(np.arange(self.size), np.fromiter(self.other_labels, dtype=np.int64))
+            self._insert(hex_ids, self._positions(hash_addresses(self.values[hex_ids], self.case_masks[hex_ids])))
+
+    def _intern_hex(self, values: np.ndarray, case_masks: np.ndarray) -> np.ndarray:
+        ids, positions = self._lookup(values, case_masks)
+        missing = np.flatnonzero(ids < 0)
+        if len(missing) == 0:
+            return ids
+        size = len(self.slots)
+        self._reserve(len(missing))
+        if len(self.slots) != size:
+            positions = self._positions(hash_addresses(values, case_masks))
+
+        new_ids = np.arange(self.size, self.size + len(missing))
+        self.values[new_ids] = values[missing]
+        self.case_masks[new_ids] = case_masks[missing]
+        self.size += len(missing)
+        self._insert(new_ids, positions[missing])
+        ids[missing] = new_ids
+        return ids
+
+    def _intern_other(self, address: str) -> int:
+        address_id = self.other_ids.get(address)
+        if address_id is None:
+            self._reserve(1)
+            address_id = self.size
+            self.size += 1
+            self.other_ids[address] = address_id
+            self.other_labels[address_id] = address
+        return address_id
+
+    def intern(self, addresses) -> np.ndarray:
+        """
+        アドレスの配列をIDの配列に変換する。未登録のアドレスは出現順に新しいIDを割り当てる
+        変換と検索は重複を除いたアドレスごとに1回だけ行う
+        """
+        codes, uniques = pd.factorize(np.asarray(addresses, dtype=object))
+        if (codes < 0).any():
+            raise ValueError("Address must not be missing")
+        is_hex, values, case_masks = parse_addresses(uniques)
+        unique_ids = np.empty(len(uniques), dtype=np.uint32)
+        with self.lock:
+            hex_index = np.flatnonzero(is_hex)
+            unique_ids[hex_index] = self._intern_hex(values[hex_index], case_masks[hex_index])
+            for i in np.flatnonzero(~is_hex):
+                unique_ids[i] = self._intern_other(str(uniques[i]))
+        return unique_ids[codes]
+
+    def get_ids(self, addresses: list[str]) -> list[int]:
+        """
+        登録済みのアドレスのIDを返す(未登録のアドレスは除く)
+        """
+        is_hex, values, case_masks = parse_addresses(addresses)
+        with self.lock:
+            ids, _ = self._lookup(values[is_hex], case_masks[is_hex])
+            hex_ids = iter(ids.tolist())
+            found = [next(hex_ids) if hex_address else self.other_ids.get(address, -1) for address, hex_address in zip(addresses, is_hex)]
+        return [address_id for address_id in found if address_id >= 0]
+
+    def get_id(self, address: str) -> int | None:
+        ids = self.get_ids([address])
+        return ids[0] if ids else None
+
+    def label(self, address_id: int) -> str:
+        """
+        IDを元のアドレスの文字列に戻す
+        """
+        return self.labels([address_id])[0]
+
+    def labels(self, address_ids) -> list[str]:
+        ids = np.fromiter((int(address_id) for address_id in address_ids), dtype=np.int64)
+        if ((ids < 0) | (ids >= self.size)).any():
+            raise KeyError("Unknown address id")
+        labels = format_addresses(self.values[ids], self.case_masks[ids])
+        if self.other_labels:
+            labels = [self.other_labels.get(address_id, label) for address_id, label in zip(ids.tolist(), labels)]
+        return labels
+
+    def update_digest(self, digest) -> None:
+        """
+        登録済みのアドレスをIDの順にハッシュに追加する(同じ順に同じアドレスを登録した対応表は同じ値になる)
+        """
+        digest.update(self.values[:self.size].tobytes())
+        digest.update(self.case_masks[:self.size].tobytes())
+        for address_id, address in sorted(self.other_labels.items()):
+            encoded = address.encode()
+            digest.update(address_id.to_bytes(4, "little") + len(encoded).to_bytes(4, "little") + encoded)
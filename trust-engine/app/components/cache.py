@@ -0,0 +1,228 @@
+import hashlib
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import networkx as nx
+from components.address import AddressTable
+
+# グラフのエッジ1本あたりのメモリ使用量の概算値(byte)
+EDGE_BYTES = 200
+
+# 取引データのハッシュに含める列(グラフと特徴量の計算に使う全ての列)
+DIGEST_COLUMNS = ["from", "to", "gasPrice", "gasUsed", "blockNumber"]
+
+def transaction_version(df_transaction: pd.DataFrame) -> tuple:
+    """
+    取引データの版(最大ブロック番号, 取引数)を返す
+    取引は追加のみのため、新しい取引が追加されると版が変わる
+    """
+    if df_transaction.empty:
+        return (-1, 0)
+    return (int(df_transaction["blockNumber"].max()), len(df_transaction))
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    """
+    DataFrameのメモリ使用量(文字列の中身を含む)を返す
+    """
+    return int(df.memory_usage(deep=True).sum())
+
+def extend_graph(graph: nx.DiGraph, edges) -> nx.DiGraph:
+    """
+    元のグラフを変更せずに、エッジを追加した新しいグラフを返す
+    graph.copy()は全てのノードとエッジの辞書を作り直すため、外側の辞書のみを複製し、
+    エッジが追加されるノードの隣接辞書だけを複製する(その他のノードの辞書は元のグラフと共有する)
+    """
+    edges = list(edges)
+    extended = graph.__class__()
+    extended.graph.update(graph.graph)
+    extended._node = graph._node.copy()
+    extended._succ = extended._adj = graph._succ.copy()
+    extended._pred = graph._pred.copy()
+    for source in {source for source, _ in edges if source in graph._succ}:
+        extended._succ[source] = graph._succ[source].copy()
+    for target in {target for _, target in edges if target in graph._pred}:
+        extended._pred[target] = graph._pred[target].copy()
+    extended.add_edges_from(edges)
+    return extended
+
+def transaction_digest(df_transaction: pd.DataFrame, address_table: AddressTable) -> str:
+    """
+    取引データの内容(グラフと特徴量の計算に使う全ての列)のハッシュを返す
+    リクエストで指定された取引は最大ブロック番号と取引数が同じでも内容が異なる場合があるため、版の代わりに使う
+    IDは対応表ごとに異なるため、IDの順に並べたアドレスもハッシュに含める
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for column in DIGEST_COLUMNS:
+        digest.update(np.ascontiguousarray(df_transaction[column].to_numpy()).tobytes())
+    address_table.update_digest(digest)
+    return digest.hexdigest()
+
+class Snapshot:
+    """
+    コントラクトごとの取引データのスナップショット
+    取引を追加したスナップショットは、メモリ使用量とエッジ数を差分から求めて全件の走査を避ける
+    """
+    def __init__(self, df_transaction: pd.DataFrame, graph: nx.DiGraph, size: int = None, num_edges: int = None):
+        self.df_transaction = df_transaction
+        self.graph = graph
+        self.last_block = transaction_version(df_transaction)[0]
+        self.num_edges = graph.number_of_edges() if num_edges is None else num_edges
+        self.size = frame_bytes(df_transaction) + self.num_edges * EDGE_BYTES if size is None else size
+
+    @property
+    def version(self) -> tuple:
+        return transaction_version(self.df_transaction)
+
+class SnapshotCache:
+    """
+    取引データのスナップショットをLRU方式で保持するキャッシュ
+    保持数の上限とメモリ使用量の上限を超えた場合は最も古く参照されたものから削除する
+    """
+    def __init__(self, max_entries: int = 8, max_bytes: int = 1024 ** 3):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.snapshots: OrderedDict[str, Snapshot] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, contract_address: str) -> Snapshot | None:
+        with self.lock:
+            snapshot = self.snapshots.get(contract_address)
+            if snapshot is not None:
+                self.snapshots.move_to_end(contract_address)
+            return snapshot
+
+    def put(self, contract_address: str, snapshot: Snapshot) -> None:
+        with self.lock:
+            # 既存のスナップショットを置き換える
+            old = self.snapshots.pop(contract_address, None)
+            if old is not None:
+                self.total_bytes -= old.size
+
+            # 上限を超える単一のスナップショットは保持しない
+            if snapshot.size > self.max_bytes:
+                return
+
+            self.snapshots[contract_address] = snapshot
+            self.total_bytes += snapshot.size
+
+            # 上限を下回るまで古いスナップショットを削除
+            while len(self.snapshots) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, evicted = self.snapshots.popitem(last=False)
+                self.total_bytes -= evicted.size
+
+    def invalidate(self, contract_address: str = None) -> None:
+        with self.lock:
+            if contract_address is None:
+                self.snapshots.clear()
+                self.total_bytes = 0
+            else:
+                old = self.snapshots.pop(contract_address, None)
+                if old is not None:
+                    self.total_bytes -= old.size
+
+class CentralityCache:
+    """
+    グラフごとの中心性の計算結果を保持するキャッシュ
+    スナップショットのグラフは更新時に複製されるため、同じグラフオブジェクトであれば同じ版とみなす
+    グラフへの参照は弱参照で保持し、グラフが破棄された結果は再利用しない
+    """
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self.results: OrderedDict[tuple, tuple] = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(graph: nx.DiGraph, options: dict = None) -> tuple:
+        options = {name: value for name, value in (options or {}).items() if value is not None}
+        return (id(graph), tuple(sorted(options.items())))
+
+    def get(self, graph: nx.DiGraph, options: dict = None) -> dict | None:
+        key = self.make_key(graph, options)
+        with self.lock:
+            entry = self.results.get(key)
+            if entry is None:
+                return None
+            graph_ref, result = entry
+
+            # 同じidの別のグラフの場合は破棄
+            if graph_ref() is not graph:
+                del self.results[key]
+                return None
+            self.results.move_to_end(key)
+            return result
+
+    def put(self, graph: nx.DiGraph, result: dict, options: dict = None) -> None:
+        key = self.make_key(graph, options)
+        with self.lock:
+            self.results[key] = (weakref.ref(graph), result)
+            self.results.move_to_end(key)
+            while len(self.results) > self.max_entries:
+                self.results.popitem(last=False)
+
+def payload_bytes(value) -> int:
+    """
+    計算結果(辞書・リスト・数値・文字列の入れ子)のメモリ使用量の概算値を返す
+    """
+    total = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set)):
+            stack.extend(item)
+        elif isinstance(item, np.ndarray):
+            total += item.nbytes
+    return total
+
+class ResultCache:
+    """
+    計算結果をキーごとにLRU方式で保持するキャッシュ
+    保持数の上限とメモリ使用量の上限を超えた場合は最も古く参照されたものから削除する
+    """
+    def __init__(self, max_entries: int = 64, max_bytes: int = 256 * 1024 ** 2):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.results: OrderedDict[tuple, dict] = OrderedDict()
+        self.sizes: dict[tuple, int] = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple) -> dict | None:
+        with self.lock:
+            result = self.results.get(key)
+            if result is not None:
+                self.results.move_to_end(key)
+            return result
+
+    def clear(self) -> None:
+        with self.lock:
+            self.results.clear()
+            self.sizes.clear()
+            self.total_bytes = 0
+
+    def put(self, key: tuple, result: dict) -> None:
+        size = payload_bytes(result)
+        with self.lock:
+            # 既存の結果を置き換える
+            if self.results.pop(key, None) is not None:
+                self.total_bytes -= self.sizes.pop(key)
+
+            # 上限を超える単一の結果は保持しない
+            if size > self.max_bytes:
+                return
+
+            self.results[key] = result
+            self.sizes[key] = size
+            self.total_bytes += size
+
+            # 上限を下回るまで古い結果を削除
+            while len(self.results) > self.max_entries or self.total_bytes > self.max_bytes:
+                evicted, _ = self.results.popitem(last=False)
+                self.total_bytes -= self.sizes.pop(evicted)
@@ -1,21 +1,288 @@
+import atexit
+import multiprocessing
+import os
+import pickle
+import random
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import networkx as nx
+import numpy as np
+import scipy.sparse as sp
 
-def calculate_centrality(graph: nx.DiGraph) -> dict:
-    # 有向グラフの中心性指標を計算
-    degree_centrality = nx.in_degree_centrality(graph)
-    betweenness_centrality = nx.betweenness_centrality(graph)
-    pagerank = nx.pagerank(graph, max_iter=500)
+# PageRankの減衰率・最大反復回数・収束判定の許容誤差(nx.pagerankと同じ値)
+PAGERANK_ALPHA = 0.85
+PAGERANK_MAX_ITER = 500
+PAGERANK_TOL = 1e-6
+
+# 個人化PageRankのプッシュを打ち切る残差の閾値(出次数あたり)
+PPR_EPSILON = 1e-4
+
+# 中心性の指標
+CENTRALITY_METRICS = ["degree", "betweenness", "pagerank"]
+
+# 複数プロセスで媒介中心性を計算するノード数の下限(これより小さいグラフはプロセス間の受け渡しの方が遅いため1プロセスで計算する)
+PARALLEL_BETWEENNESS_MIN_NODES = 1000
+
+# 媒介中心性を計算するワーカープロセス(最初の呼び出し時に起動し、以降の呼び出しで再利用する)
+_betweenness_executor: ProcessPoolExecutor | None = None
+_betweenness_workers = 0
+_betweenness_lock = threading.Lock()
+
+def _get_betweenness_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    ワーカープロセスのプールを返す。必要なワーカー数が足りない場合は作り直す
+    スレッドを使うプロセス(uvicornやtorch)からforkするとデッドロックする場合があるため、spawnで起動する
+    """
+    global _betweenness_executor, _betweenness_workers
+    with _betweenness_lock:
+        if _betweenness_executor is None or _betweenness_workers < workers:
+            if _betweenness_executor is not None:
+                _betweenness_executor.shutdown(wait=False)
+            _betweenness_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _betweenness_workers = workers
+        return _betweenness_executor
+
+def shutdown_betweenness_executor() -> None:
+    global _betweenness_executor, _betweenness_workers
+    with _betweenness_lock:
+        if _betweenness_executor is not None:
+            _betweenness_executor.shutdown(wait=False, cancel_futures=True)
+        _betweenness_executor = None
+        _betweenness_workers = 0
+
+atexit.register(shutdown_betweenness_executor)
+
+def _betweenness_subset(graph: nx.DiGraph, sources: list) -> dict:
+    # 指定した始点からの最短経路のみを数える(正規化なし)
+    return nx.betweenness_centrality_subset(graph, sources=sources, targets=list(graph.nodes), normalized=False)
+
+def _pickled_betweenness_subset(payload: bytes, sources: list) -> dict:
+    # ワーカープロセスでシリアライズ済みのグラフを読み込んで計算する
+    return _betweenness_subset(pickle.loads(payload), sources)
+
+def parallel_betweenness_centrality(
+    graph: nx.DiGraph,
+    k: int = None,
+    workers: int = None,
+    seed: int = None,
+    min_nodes: int = PARALLEL_BETWEENNESS_MIN_NODES
+) -> dict:
+    """
+    始点を分割して複数プロセスで媒介中心性を計算する
+    kを指定した場合はk個の始点をサンプリングして近似する
+    ワーカープロセスはspawnで起動して呼び出し間で再利用し、グラフは一度だけシリアライズして各ワーカーに1回だけ送る
+    ノード数がmin_nodes未満のグラフは同じ始点を1プロセスで計算する
+    """
+    nodes = list(graph.nodes)
+    n = len(nodes)
+    sources = nodes if k is None or k >= n else random.Random(seed).sample(nodes, k)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sources)))
+
+    betweenness = dict.fromkeys(nodes, 0.0)
+    if workers == 1 or n < min_nodes:
+        partials = [_betweenness_subset(graph, sources)]
+    else:
+        # 始点をワーカー数に分割して計算し、結果を合算
+        # グラフは一度だけシリアライズし、各ワーカーには1つの分割とともに1回だけ送る
+        chunks = [sources[i::workers] for i in range(workers)]
+        payload = pickle.dumps(graph, protocol=pickle.HIGHEST_PROTOCOL)
+        executor = _get_betweenness_executor(workers)
+        futures = [executor.submit(_pickled_betweenness_subset, payload, chunk) for chunk in chunks]
+        partials = [future.result() for future in futures]
+    for partial in partials:
+        for node, value in partial.items():
+            betweenness[node] += value
+
+    # nx.betweenness_centralityと同じ正規化をする(サンプリング時は始点数で補正)
+    if n > 2:
+        scale = 1 / ((n - 1) * (n - 2)) * (n / len(sources))
+        for node in betweenness:
+            betweenness[node] *= scale
+    return betweenness
+
+def betweenness_centrality(graph: nx.DiGraph, mode: str = "exact", k: int = None, workers: int = None, seed: int = None) -> dict:
+    """
+    媒介中心性を計算する
+    mode="exact": 全ての始点から厳密に計算する
+    mode="sample": k個の始点をサンプリングして近似する
+    mode="parallel": 始点を分割して複数プロセスで計算する(kを指定した場合はサンプリングも行う。小さいグラフは1プロセスで計算する)
+    """
+    if mode == "exact":
+        return nx.betweenness_centrality(graph)
+    elif mode == "sample":
+        if k is None or k >= graph.number_of_nodes():
+            return nx.betweenness_centrality(graph)
+        return nx.betweenness_centrality(graph, k=k, seed=seed)
+    elif mode == "parallel":
+        return parallel_betweenness_centrality(graph, k=k, workers=workers, seed=seed)
+    raise ValueError(f"Unknown betweenness mode: {mode}")
+
+def adjacency_matrix(graph: nx.DiGraph) -> tuple[list, sp.csr_array]:
+    """
+    グラフのノードのリストとCSR形式の隣接行列(行: 始点, 列: 終点)を返す
+    """
+    nodes = list(graph.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    num_edges = graph.number_of_edges()
+    rows = np.fromiter((index[source] for source, _ in graph.edges), dtype=np.int64, count=num_edges)
+    cols = np.fromiter((index[target] for _, target in graph.edges), dtype=np.int64, count=num_edges)
+    adjacency = sp.csr_array((np.ones(num_edges, dtype=np.float64), (rows, cols)), shape=(len(nodes), len(nodes)))
+    return nodes, adjacency
+
+def sparse_in_degree_centrality(adjacency: sp.csr_array) -> np.ndarray:
+    # nx.in_degree_centralityと同じくノード数-1で正規化する
+    n = adjacency.shape[0]
+    scale = 1 / (n - 1) if n > 1 else 1
+    return np.asarray(adjacency.sum(axis=0)).ravel() * scale
+
+def sparse_pagerank(
+    adjacency: sp.csr_array,
+    alpha: float = PAGERANK_ALPHA,
+    max_iter: int = PAGERANK_MAX_ITER,
+    tol: float = PAGERANK_TOL,
+    x0: np.ndarray = None
+) -> tuple[np.ndarray, int, float]:
+    """
+    CSR形式の隣接行列からべき乗法でPageRankを計算する
+    出次数0のノードの値は全ノードに均等に分配する(nx.pagerankと同じ)
+    x0を指定した場合はその値から反復を始める(合計が1になるように正規化する)
+    (PageRank, 反復回数, 最後の反復での変化量のL1ノルム)を返す
+    """
+    n = adjacency.shape[0]
+    if n == 0:
+        return np.zeros(0), 0, 0.0
+
+    # 行を出次数で正規化した遷移行列の転置
+    out_degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    inverse = np.divide(1.0, out_degree, out=np.zeros(n), where=out_degree != 0)
+    transition = (sp.diags_array(inverse) @ adjacency).T.tocsr()
+    dangling = out_degree == 0
+
+    x = np.full(n, 1.0 / n) if x0 is None else x0 / x0.sum()
+    for iteration in range(1, max_iter + 1):
+        last = x
+        x = alpha * (transition @ last + last[dangling].sum() / n) + (1 - alpha) / n
+        residual = float(np.abs(x - last).sum())
+        if residual < n * tol:
+            return x, iteration, residual
+    raise nx.PowerIterationFailedConvergence(max_iter)
+
+def pagerank_initial(nodes: list, pagerank_start: dict = None) -> np.ndarray | None:
+    """
+    前回のPageRankからノードの順の初期値を作成する(新しいノードは1/ノード数から始める)
+    """
+    if not pagerank_start:
+        return None
+    return np.fromiter((pagerank_start.get(node, 1.0 / len(nodes)) for node in nodes), dtype=np.float64, count=len(nodes))
+
+def sparse_centrality(graph: nx.DiGraph, pagerank_start: dict = None) -> tuple[dict, dict, dict]:
+    """
+    SciPyの疎行列で次数中心性とPageRankを計算する
+    pagerank_startを指定した場合は前回のPageRankから反復を始める
+    (次数中心性, PageRank, PageRankの収束情報)を返す
+    """
+    nodes, adjacency = adjacency_matrix(graph)
+    degree = dict(zip(nodes, sparse_in_degree_centrality(adjacency).tolist()))
+
+    x0 = pagerank_initial(nodes, pagerank_start)
+    pagerank, iterations, residual = sparse_pagerank(adjacency, x0=x0)
+    convergence = {"iterations": iterations, "residual": residual, "warm_start": x0 is not None}
+    return degree, dict(zip(nodes, pagerank.tolist())), convergence
+
+def networkx_centrality(graph: nx.DiGraph, pagerank_start: dict = None) -> tuple[dict, dict, dict]:
+    """
+    NetworkXで次数中心性とPageRankを計算する
+    pagerank_startを指定した場合はnx.pagerankのnstartに渡して前回のPageRankから反復を始める
+    nx.pagerankは反復回数を返さないため、収束情報は同じ初期値からの疎行列のべき乗法で別に数える
+    (次数中心性, PageRank, PageRankの収束情報)を返す
+    """
+    degree = nx.in_degree_centrality(graph)
+    nodes, adjacency = adjacency_matrix(graph)
+    x0 = pagerank_initial(nodes, pagerank_start)
+    nstart = None if x0 is None else dict(zip(nodes, x0.tolist()))
+    pagerank = nx.pagerank(graph, alpha=PAGERANK_ALPHA, max_iter=PAGERANK_MAX_ITER, tol=PAGERANK_TOL, nstart=nstart)
+    _, iterations, residual = sparse_pagerank(adjacency, x0=x0)
+    convergence = {"iterations": iterations, "residual": residual, "warm_start": x0 is not None}
+    return degree, pagerank, convergence
+
+def personalized_pagerank(
+    graph: nx.DiGraph,
+    source,
+    alpha: float = PAGERANK_ALPHA,
+    epsilon: float = PPR_EPSILON
+) -> tuple[dict, int, float]:
+    """
+    始点から見た個人化PageRankを局所的なフォワードプッシュで近似する
+    残差が出次数×epsilon以上のノードのみを処理するため、計算量はグラフの大きさではなく1/((1-alpha)×epsilon)に比例する
+    出次数0のノードの値は始点に戻す(nx.pagerankでpersonalizationに始点のみを指定した場合と同じ)
+    (値が0より大きいノードの推定値, プッシュ回数, 残差の合計)を返す
+    """
+    if source not in graph:
+        return {}, 0, 0.0
+
+    estimate = {}
+    residual = {source: 1.0}
+    queue = deque([source])
+    queued = {source}
+    pushes = 0
+    while queue:
+        node = queue.popleft()
+        queued.discard(node)
+        mass = residual.pop(node, 0.0)
+        estimate[node] = estimate.get(node, 0.0) + (1 - alpha) * mass
+        pushes += 1
+
+        # 残りを隣接ノードに均等に分配する(出次数0の場合は始点に戻す)
+        successors = graph.succ[node]
+        targets = successors if successors else (source,)
+        share = alpha * mass / len(targets)
+        for target in targets:
+            residual[target] = residual.get(target, 0.0) + share
+            if target not in queued and residual[target] >= epsilon * max(len(graph.succ[target]), 1):
+                queue.append(target)
+                queued.add(target)
+    return estimate, pushes, sum(residual.values())
+
+def calculate_centrality(
+    graph: nx.DiGraph,
+    betweenness_mode: str = "exact",
+    k: int = None,
+    workers: int = None,
+    seed: int = None,
+    backend: str = "networkx",
+    pagerank_start: dict = None
+) -> dict:
+    """
+    有向グラフの中心性指標を計算する
+    backend="networkx": 次数中心性・PageRank・媒介中心性をNetworkXで計算する
+    backend="scipy": 次数中心性とPageRankをSciPyの疎行列で計算する(媒介中心性はNetworkXで計算する)
+    PageRankの反復回数と収束時の変化量をconvergenceに記録する
+    pagerank_startを指定した場合は前回のPageRankを初期値にして反復を始める
+    """
+    # グラフに含まれないノードのみの初期値は使わない
+    if pagerank_start and not any(node in graph for node in pagerank_start):
+        pagerank_start = None
+
+    if backend == "networkx":
+        degree_centrality, pagerank, convergence = networkx_centrality(graph, pagerank_start)
+    elif backend == "scipy":
+        degree_centrality, pagerank, convergence = sparse_centrality(graph, pagerank_start)
+    else:
+        raise ValueError(f"Unknown centrality backend: {backend}")
+    betweenness = betweenness_centrality(graph, mode=betweenness_mode, k=k, workers=workers, seed=seed)
 
     # 平均値を求める
     average_centrality = {
         "degree": sum(degree_centrality.values()) / len(degree_centrality),
-        "betweenness": sum(betweenness_centrality.values()) / len(betweenness_centrality),
+        "betweenness": sum(betweenness.values()) / len(betweenness),
         "pagerank": sum(pagerank.values()) / len(pagerank)
     }
 
     return {
         "degree": degree_centrality,
-        "betweenness": betweenness_centrality,
+        "betweenness": betweenness,
         "pagerank": pagerank,
-        "average": average_centrality
+        "average": average_centrality,
+        "convergence": {"pagerank": convergence}
     }
@@ -0,0 +1,31 @@
+import gzip
+from typing import Callable
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+# レスポンスを圧縮する最小サイズ(byte)
+GZIP_MINIMUM_SIZE = 1024
+
+class GzipRequest(Request):
+    """
+    Content-Encoding: gzipで送信されたリクエストボディを展開するリクエスト
+    """
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            body = await super().body()
+            if "gzip" in self.headers.getlist("Content-Encoding"):
+                body = gzip.decompress(body)
+            self._body = body
+        return self._body
+
+class GzipRoute(APIRoute):
+    """
+    gzip圧縮されたリクエストボディを受け付けるルート
+    """
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            return await original_route_handler(GzipRequest(request.scope, request.receive))
+
+        return route_handler
@@ -1,17 +1,66 @@
 from neo4j import GraphDatabase
+from neo4j.exceptions import Neo4jError
 import atexit
+import threading
+import numpy as np
 import pandas as pd
 import torch
 from torch_geometric.data import Data
 import networkx as nx
 from typing import Tuple
+from components.address import AddressTable, AddressTableFullError
+from components.cache import Snapshot, SnapshotCache, CentralityCache, ResultCache, EDGE_BYTES, extend_graph, frame_bytes
 from components.centralality import calculate_centrality
 
+# 取引データのカラムと型(from, toはAddressTableのID)
+TRANSACTION_COLUMNS = [
+    "tokenId",
+    "from",
+    "to",
+    "gasPrice",
+    "gasUsed",
+    "contractAddress",
+    "tokenUri",
+    "blockNumber",
+]
+TRANSACTION_DTYPES = {
+    "tokenId": "string",
+    "from": "uint32",
+    "to": "uint32",
+    "gasPrice": "float32",
+    "gasUsed": "float32",
+    "contractAddress": "string",
+    "tokenUri": "string",
+    "blockNumber": "uint32",
+}
+
+# カラム形式で取引データを取得する際のバッチサイズ
+FETCH_SIZE = 100000
+
+# ノードの特徴量の列(モデルの入力の順番)
+CENTRALITY_COLUMNS = ["degree", "betweenness", "pagerank"]
+FEATURE_COLUMNS = CENTRALITY_COLUMNS + ["gasPrice", "gasUsed", "blockNumber"]
+
 class Database:
-    def __init__(self, url):
+    def __init__(self, url, cache_entries: int = 8, cache_bytes: int = 1024 ** 3):
         # neo4j serverに接続するdriverの設定
         self.driver = GraphDatabase.driver(url)
         atexit.register(self.close)  # プログラム終了時にclose()を呼び出す
+
+        # コントラクトごとの取引データのキャッシュ
+        self.snapshot_cache = SnapshotCache(max_entries=cache_entries, max_bytes=cache_bytes)
+
+        # グラフごとの中心性のキャッシュ
+        self.centrality_cache = CentralityCache()
+
+        # コントラクトごとの前回のPageRank(新しい取引が追加された際の反復の初期値)
+        self.pagerank_cache = ResultCache(max_entries=cache_entries)
+
+        # アドレスとIDの対応表(グラフのノードや特徴量はIDで扱う)
+        # スナップショットが削除されてもIDは結果やPageRankのキャッシュで使われるため、登録したアドレスは残す
+        # 登録数が上限に達した場合は、対応表とIDを使うキャッシュをまとめて作り直す(reset_address_table)
+        self.address_table = AddressTable()
+        self.address_table_lock = threading.Lock()
     
     def close(self):
         if hasattr(self, 'driver') and self.driver:
@@ -20,19 +69,18 @@ class Database:
 
     # 取引データを取得する
     @staticmethod
-    def fetch_transaction(tx, contract_address: str) -> Tuple[pd.DataFrame, nx.DiGraph]:
+    def fetch_transaction(tx, contract_address: str, from_block: int = None) -> list[dict]:
         relation_list = []
-        graph = nx.DiGraph()
 
-        # データベースからトランザクションを取得
+        # データベースからトランザクションを取得(from_blockを指定した場合はそのブロック以降のみ)
         if contract_address == "all":
-            query = "MATCH p=()-[r:TRANSFER]->() RETURN p"
+            query = "MATCH p=()-[r:TRANSFER]->()"
         else:
-            query = """
-            MATCH p=()-[r:TRANSFER {contractAddress: $address}]->()
-            RETURN p
-            """
-        transactions = tx.run(query, address=contract_address)
+            query = "MATCH p=()-[r:TRANSFER {contractAddress: $address}]->()"
+        if from_block is not None:
+            query += " WHERE r.blockNumber >= $from_block"
+        query += " RETURN p"
+        transactions = tx.run(query, address=contract_address, from_block=from_block)
 
         # トランザクションの結果をリストに保存
         for transaction in transactions:
@@ -40,42 +88,250 @@ class Database:
             relationship = path.relationships[0]
             relation_list.append({
                 "tokenId": relationship["tokenId"],
-                "from": path.start_node["address"], 
-                "to": path.end_node["address"],
+                "from": str(path.start_node["address"]),
+                "to": str(path.end_node["address"]),
                 "gasPrice": relationship["gasPrice"],
                 "gasUsed": relationship["gasUsed"],
                 "contractAddress": relationship["contractAddress"],
                 "tokenUri": relationship["tokenUri"],
                 "blockNumber": relationship["blockNumber"],
             })
-            # グラフにエッジを追加
-            graph.add_edge(str(path.start_node["address"]), str(path.end_node["address"]))
-        return relation_list, graph
+        return relation_list
+
+    @staticmethod
+    def build_graph(relations: pd.DataFrame) -> nx.DiGraph:
+        """
+        取引データからアドレスのIDをノードとするグラフを作成する
+        """
+        graph = nx.DiGraph()
+        graph.add_edges_from(zip(relations["from"].tolist(), relations["to"].tolist()))
+        return graph
+
+    # インデックスを作成する
+    @staticmethod
+    def create_indexes(tx) -> None:
+        """
+        アドレスによるユーザーの検索と、コントラクト・ブロック番号による取引の検索に使うインデックスを作成する
+        """
+        tx.run("CREATE INDEX transfer_contract_block IF NOT EXISTS FOR ()-[r:TRANSFER]-() ON (r.contractAddress, r.blockNumber)")
+
+    def ensure_indexes(self) -> None:
+        with self.driver.session() as session:
+            # User.addressは一意制約によるインデックスを優先し、重複がある場合は通常のインデックスを作成する
+            try:
+                session.run("CREATE CONSTRAINT user_address_unique IF NOT EXISTS FOR (u:User) REQUIRE u.address IS UNIQUE").consume()
+            except Neo4jError:
+                session.run("CREATE INDEX user_address IF NOT EXISTS FOR (u:User) ON (u.address)").consume()
+            session.execute_write(self.create_indexes)
+
+    # 指定したアドレスの最新の取引を取得する
+    @staticmethod
+    def fetch_latest_transaction(tx, contract_address: str, address: str) -> dict | None:
+        """
+        アドレスが送信元の最新の取引を優先し、なければ受信先の最新の取引を返す
+        User.addressのインデックスからノードを特定し、そのノードに接続する取引のみを探索する
+        """
+        contract_filter = "" if contract_address == "all" else "WHERE r.contractAddress = $contract_address"
+        for pattern in ["(u:User {address: $address})-[r:TRANSFER]->(v:User)", "(v:User)-[r:TRANSFER]->(u:User {address: $address})"]:
+            record = tx.run(
+                f"""
+                MATCH {pattern}
+                {contract_filter}
+                RETURN startNode(r).address AS `from`, endNode(r).address AS `to`, r.tokenUri AS tokenUri
+                ORDER BY r.blockNumber DESC
+                LIMIT 1
+                """,
+                contract_address=contract_address,
+                address=address
+            ).single()
+            if record is not None:
+                return record.data()
+        return None
+
+    def get_latest_transaction(self, contract_address: str, address: str) -> dict | None:
+        with self.driver.session() as session:
+            return session.execute_read(self.fetch_latest_transaction, contract_address, address)
+
+    # 取引データをカラム形式で取得する
+    @staticmethod
+    def fetch_transaction_columns(tx, contract_address: str, from_block: int = None, address_table: AddressTable = None) -> Tuple[pd.DataFrame, nx.DiGraph]:
+        """
+        パスではなく必要なプロパティのみを返すクエリで取引データを取得する
+        結果はバッチ単位でカラムごとのリストに展開し、型付きの配列からDataFrameを作成する
+        アドレスはバッチごとにIDに変換し、取引数分の文字列を保持しない
+        """
+        address_table = address_table if address_table is not None else AddressTable()
+        if contract_address == "all":
+            query = "MATCH (s:User)-[r:TRANSFER]->(e:User)"
+        else:
+            query = "MATCH (s:User)-[r:TRANSFER {contractAddress: $address}]->(e:User)"
+        if from_block is not None:
+            query += " WHERE r.blockNumber >= $from_block"
+        query += """
+        RETURN r.tokenId AS tokenId, s.address AS `from`, e.address AS `to`,
+            coalesce(r.gasPrice, 0.0) AS gasPrice, coalesce(r.gasUsed, 0.0) AS gasUsed,
+            r.contractAddress AS contractAddress, r.tokenUri AS tokenUri,
+            coalesce(r.blockNumber, 0) AS blockNumber
+        """
+        result = tx.run(query, address=contract_address, from_block=from_block)
+
+        # バッチごとに行を転置してカラムに追加
+        columns = {name: [] for name in TRANSACTION_COLUMNS}
+        while True:
+            records = result.fetch(FETCH_SIZE)
+            if not records:
+                break
+            for name, values in zip(TRANSACTION_COLUMNS, zip(*records)):
+                if name in ["from", "to"]:
+                    columns[name].append(address_table.intern(values))
+                else:
+                    columns[name].extend(values)
+
+        relations = pd.DataFrame({
+            name: np.concatenate(values).astype(np.uint32) if name in ["from", "to"] and values
+            else pd.array(values, dtype="string") if TRANSACTION_DTYPES[name] == "string"
+            else np.asarray(values, dtype=TRANSACTION_DTYPES[name])
+            for name, values in columns.items()
+        })
+        del columns # メモリを節約するためにリストを削除
+
+        # グラフにエッジを追加
+        return relations, Database.build_graph(relations)
 
     # 取引データを取得する
-    def get_transaction(self, contract_address: str = "all") -> Tuple[pd.DataFrame, nx.DiGraph]:
+    def get_transaction(
+        self,
+        contract_address: str = "all",
+        use_cache: bool = True,
+        fetch_mode: str = "columnar",
+        address_table: AddressTable = None
+    ) -> Tuple[pd.DataFrame, nx.DiGraph]:
+        """
+        fetch_mode="columnar"は必要なプロパティのみをカラム形式で取得する
+        fetch_mode="path"はパスを取得して行ごとに変換する
+        address_tableを指定した場合はその対応表でアドレスをIDに変換する(作り直す前の対応表の場合はキャッシュを使わない)
+        """
+        if address_table is None:
+            address_table = self.address_table
+        use_cache = use_cache and address_table is self.address_table
+
+        # キャッシュ済みの場合は最後に読み込んだブロック以降の取引のみを取得
+        snapshot = self.snapshot_cache.get(contract_address) if use_cache else None
+        from_block = snapshot.last_block if snapshot is not None else None
 
         # neo4jに接続してトランザクションを実行
-        with self.driver.session() as session:
-            relation_list, graph = session.execute_read(self.fetch_transaction, contract_address)
-
-        # DataFrameに変換
-        relations = pd.DataFrame(relation_list).astype({
-            "tokenId": "string",
-            "from": "string",
-            "to": "string",
-            "gasPrice": "float32",
-            "gasUsed": "float32",
-            "contractAddress": "string",
-            "tokenUri": "string",
-            "blockNumber": "uint32",
-        }, copy=False)
-        del relation_list # メモリを節約するためにリストを削除
-
-        return relations, graph
+        with self.driver.session(fetch_size=FETCH_SIZE) as session:
+            if fetch_mode == "columnar":
+                relations, graph = session.execute_read(self.fetch_transaction_columns, contract_address, from_block, address_table)
+            elif fetch_mode == "path":
+                relation_list = session.execute_read(self.fetch_transaction, contract_address, from_block)
+
+                # DataFrameに変換し、アドレスをIDに変換
+                relations = pd.DataFrame(relation_list, columns=TRANSACTION_COLUMNS)
+                del relation_list # メモリを節約するためにリストを削除
+                for column in ["from", "to"]:
+                    relations[column] = address_table.intern(relations[column])
+                relations = relations.astype(TRANSACTION_DTYPES, copy=False)
+                graph = self.build_graph(relations)
+            else:
+                raise ValueError(f"Unknown fetch mode: {fetch_mode}")
+
+        if snapshot is not None:
+            merged = self.merge_snapshot(snapshot, relations, graph)
+            # 新しい取引がない場合はキャッシュ済みのスナップショットをそのまま返す
+            if merged is snapshot:
+                return snapshot.df_transaction, snapshot.graph
+            snapshot = merged
+        else:
+            snapshot = Snapshot(relations, graph)
+        # 取得中に対応表が作り直された場合は、古いIDのスナップショットを保持しない
+        if use_cache and address_table is self.address_table:
+            self.snapshot_cache.put(contract_address, snapshot)
+
+        return snapshot.df_transaction, snapshot.graph
+
+    def get_transaction_with_table(self, contract_address: str = "all") -> Tuple[pd.DataFrame, nx.DiGraph, AddressTable]:
+        """
+        プロセス全体の対応表でIDに変換した取引データと、その対応表を返す
+        対応表の登録数が上限に達した場合は対応表を作り直して取得し直す
+        """
+        address_table = self.address_table
+        try:
+            df_transaction, graph = self.get_transaction(contract_address=contract_address, address_table=address_table)
+        except AddressTableFullError:
+            self.reset_address_table(address_table)
+            address_table = self.address_table
+            df_transaction, graph = self.get_transaction(contract_address=contract_address, address_table=address_table)
+        return df_transaction, graph, address_table
+
+    def reset_address_table(self, full_table: AddressTable) -> None:
+        """
+        上限に達した対応表を新しい対応表に置き換え、IDを使うスナップショットと前回のPageRankのキャッシュを削除する
+        取得中のリクエストは置き換える前の対応表を使い続けられる(結果のキャッシュのキーには対応表の番号を含める)
+        """
+        with self.address_table_lock:
+            if self.address_table is not full_table:
+                return
+            self.address_table = AddressTable(max_size=full_table.max_size)
+            self.snapshot_cache.invalidate()
+            self.pagerank_cache.clear()
+
+    @staticmethod
+    def merge_snapshot(snapshot: Snapshot, relations: pd.DataFrame, graph: nx.DiGraph) -> Snapshot:
+        """
+        キャッシュ済みのスナップショットに新しい取引を追加したスナップショットを返す(新しい取引がない場合は元のスナップショット)
+        relationsは最終ブロック以降の取引であり、最終ブロックの取引はキャッシュ済みの分も含む
+        """
+        cached = snapshot.df_transaction
+        is_last_block = cached["blockNumber"] == snapshot.last_block
+
+        # 最終ブロックの取引数が変わっていなければ新しい取引はない
+        if len(relations) == int(is_last_block.sum()):
+            return snapshot
+
+        # 最終ブロックの取引を置き換えて新しい取引を追加
+        # 参照中のリクエストに影響しないように、グラフは追加するノードの辞書のみを複製して更新する
+        merged = pd.concat([cached[~is_last_block], relations], ignore_index=True)
+        new_edges = [edge for edge in graph.edges if not snapshot.graph.has_edge(*edge)]
+        merged_graph = extend_graph(snapshot.graph, new_edges)
+
+        # メモリ使用量とエッジ数は置き換えた取引と追加した取引の差分から求める
+        size = snapshot.size + frame_bytes(relations) - frame_bytes(cached[is_last_block]) + len(new_edges) * EDGE_BYTES
+        return Snapshot(merged, merged_graph, size=size, num_edges=snapshot.num_edges + len(new_edges))
     
-    # 特徴量を取得する
-    def get_features(self, df_transaction: pd.DataFrame, graph: nx.DiGraph) -> pd.DataFrame:
+    # 中心性を取得する
+    def get_centrality(
+        self,
+        graph: nx.DiGraph,
+        centrality_options: dict = None,
+        contract_address: str = None,
+        address_table: AddressTable = None
+    ) -> dict:
+        """
+        同じグラフに対する中心性は一度だけ計算し、特徴量とAPIの結果で共有する
+        contract_addressを指定した場合は、そのコントラクトの前回のPageRankを初期値にして計算する
+        address_tableにリクエストごとの対応表を指定した場合は、IDが共有されないため前回のPageRankをアドレスの文字列で保持する
+        返り値は共有されるため変更しないこと
+        """
+        centrality = self.centrality_cache.get(graph, centrality_options)
+        if centrality is None:
+            options = dict(centrality_options or {})
+            shared = address_table is None or address_table is self.address_table
+            key = (contract_address,) if shared else (contract_address, "labels")
+            pagerank_start = self.pagerank_cache.get(key) if contract_address is not None else None
+            if pagerank_start is not None and not shared:
+                ids = address_table.get_ids(pagerank_start)
+                pagerank_start = dict(zip(ids, (pagerank_start[address_table.label(node)] for node in ids)))
+            if pagerank_start:
+                options["pagerank_start"] = pagerank_start
+            centrality = calculate_centrality(graph, **options)
+            self.centrality_cache.put(graph, centrality, centrality_options)
+            if contract_address is not None:
+                pagerank = centrality["pagerank"]
+                self.pagerank_cache.put(key, pagerank if shared else dict(zip(address_table.labels(pagerank), pagerank.values())))
+        return centrality
+
+    def get_features(self, df_transaction: pd.DataFrame, graph: nx.DiGraph, centrality_options: dict = None) -> pd.DataFrame:
         # グラフが空の場合は空のDataFrameを返す
         if graph.number_of_nodes() == 0:
             return pd.DataFrame(columns=["degree", "betweenness", "pagerank"])
@@ -87,7 +343,7 @@ class Database:
         )
 
         # 中心性を計算
-        centrality = calculate_centrality(graph)
+        centrality = self.get_centrality(graph, centrality_options)
         df_feature["degree"] = pd.Series(centrality["degree"], dtype="float32")
         df_feature["betweenness"] = pd.Series(centrality["betweenness"], dtype="float32")
         df_feature["pagerank"] = pd.Series(centrality["pagerank"], dtype="float32")
@@ -117,76 +373,100 @@ class Database:
 
         return df_feature
 
+    def build_feature_data(
+        self,
+        df_transaction: pd.DataFrame,
+        graph: nx.DiGraph,
+        centrality_options: dict = None,
+        standardize: bool = True,
+        contract_address: str = None,
+        address_table: AddressTable = None
+    ) -> Tuple[pd.DataFrame, Data]:
+        """
+        ノードの特徴量とPyTorch GeometricのDataオブジェクトをまとめて作成する
+        アドレスの数値化は1度だけ行い、ノードごとの集計はnp.bincountで計算する
+        特徴量は1つのfloat32の配列に格納して標準化し、DataFrameとDataで共有する
+        DataFrameの行はDataのノードと同じ順番になる
+        """
+        num_edges = len(df_transaction)
+        codes, nodes = pd.factorize(pd.concat([df_transaction['from'], df_transaction['to']], ignore_index=True))
+        num_nodes = len(nodes)
+        from_codes, to_codes = codes[:num_edges], codes[num_edges:]
+        x = np.zeros((num_nodes, len(FEATURE_COLUMNS)), dtype=np.float32)
+
+        if num_nodes > 0:
+            # 中心性
+            centrality = self.get_centrality(graph, centrality_options, contract_address, address_table)
+            for column, metric in enumerate(CENTRALITY_COLUMNS):
+                values = centrality[metric]
+                x[:, column] = np.fromiter((values.get(node, 0.0) for node in nodes), dtype=np.float64, count=num_nodes)
+
+            # ガス代(送信と受信の合計)
+            for column in ["gasPrice", "gasUsed"]:
+                weights = np.nan_to_num(df_transaction[column].to_numpy(dtype=np.float64))
+                x[:, FEATURE_COLUMNS.index(column)] = np.bincount(codes, weights=np.concatenate([weights, weights]), minlength=num_nodes)
+
+            # ブロック番号(最初の送信と最初の受信の合計)
+            block_numbers = df_transaction['blockNumber'].to_numpy(dtype=np.float64)
+            column = FEATURE_COLUMNS.index("blockNumber")
+            for side_codes in [from_codes, to_codes]:
+                unique_codes, first_index = np.unique(side_codes, return_index=True)
+                x[unique_codes, column] += block_numbers[first_index]
+
+            # 標準化(配列を複製せずに更新)
+            if standardize:
+                means = x.mean(axis=0, dtype=np.float64)
+                stds = x.std(axis=0, dtype=np.float64)
+                stds[stds == 0] = 1
+                x -= means.astype(np.float32)
+                x /= stds.astype(np.float32)
+
+        df_feature = pd.DataFrame(x, index=pd.Index(nodes), columns=FEATURE_COLUMNS, copy=False)
+        edge_index = torch.from_numpy(np.stack([from_codes, to_codes]).astype(np.int64)).contiguous()
+        data = Data(x=torch.from_numpy(x), edge_index=edge_index)
+        return df_feature, data
+
     # Dataframe(取引履歴とノードの特徴量)をPyTorch GeometricのDataオブジェクトに変換する
-    def transform_data(self, df_transaction: pd.DataFrame, df_feature: pd.DataFrame) -> Data:
-        # ノードのユニークIDを取得し、ノードのインデックスを辞書として作成
-        unique_nodes = pd.concat([df_transaction['from'], df_transaction['to']]).unique()
-        node_to_index = {node: idx for idx, node in enumerate(unique_nodes)}
+    @staticmethod
+    def transform_data(df_transaction: pd.DataFrame, df_feature: pd.DataFrame) -> Data:
+        # from, toを連結して出現順にノードのインデックスを割り当てる
+        num_edges = len(df_transaction)
+        codes, unique_nodes = pd.factorize(pd.concat([df_transaction['from'], df_transaction['to']], ignore_index=True))
 
         # トランザクションからエッジインデックスを作成
-        edge_index = torch.tensor(
-            [[node_to_index[row['from']], node_to_index[row['to']]] for _, row in df_transaction.iterrows()],
-            dtype=torch.long
-        ).t().contiguous()
+        edge_index = torch.from_numpy(
+            np.stack([codes[:num_edges], codes[num_edges:]]).astype(np.int64)
+        ).contiguous()
 
         # ノードの特徴量をdf_featureから取得
         x = torch.tensor(df_feature.loc[unique_nodes].values, dtype=torch.float)
         data = Data(x=x, edge_index=edge_index)
         return data
 
-    def create_transaction_df(self, transactions: list) -> Tuple[pd.DataFrame, nx.DiGraph]:
-        # Web3経由で取得したトランザクションリストをneo4j取得分と同じ形式に正規化する
-        columns = [
-            "tokenId",
-            "from",
-            "to",
-            "gasPrice",
-            "gasUsed",
-            "contractAddress",
-            "tokenUri",
-            "blockNumber",
-        ]
-        graph = nx.DiGraph()
-
-        if not transactions:
-            empty_df = pd.DataFrame(columns=columns).astype({
-                "tokenId": "string",
-                "from": "string",
-                "to": "string",
-                "gasPrice": "float32",
-                "gasUsed": "float32",
-                "contractAddress": "string",
-                "tokenUri": "string",
-                "blockNumber": "uint32",
+    def create_transaction_df(self, transactions: list, address_table: AddressTable = None) -> Tuple[pd.DataFrame, nx.DiGraph]:
+        """
+        Web3経由で取得したトランザクションリストをneo4j取得分と同じ形式に正規化する
+        address_tableを指定した場合はその対応表でアドレスをIDに変換する(リクエストで指定された取引をプロセス全体の対応表に登録しない)
+        """
+        if address_table is None:
+            address_table = self.address_table
+        relation_list = []
+        for tx in transactions or []:
+            relation_list.append({
+                "tokenId": str(tx.get("tokenId", tx.get("token_id"))),
+                "from": str(tx.get("from", tx.get("from_address"))),
+                "to": str(tx.get("to", tx.get("to_address"))),
+                "gasPrice": float(tx.get("gasPrice", tx.get("gas_price")) or 0.0),
+                "gasUsed": float(tx.get("gasUsed", tx.get("gas_used")) or 0.0),
+                "contractAddress": str(tx.get("contractAddress", tx.get("contract_address")) or ""),
+                "tokenUri": str(tx.get("tokenUri", tx.get("token_uri")) or ""),
+                "blockNumber": int(tx.get("blockNumber", tx.get("block_number")) or 0),
             })
-            return empty_df, graph
 
-        relation_list = []
-        for tx in transactions:
-            from_addr = tx.get("from")
-            to_addr = tx.get("to")
-
-            entry = {
-                "tokenId": str(tx.get("tokenId")),
-                "from": str(from_addr),
-                "to": str(to_addr),
-                "gasPrice": float(tx.get("gasPrice")or 0.0),
-                "gasUsed": float(tx.get("gasUsed") or 0.0),
-                "contractAddress": "",
-                "blockNumber": int(tx.get("blockNumber") or 0),
-            }
-            relation_list.append(entry)
-            graph.add_edge(entry["from"], entry["to"])
-
-        df_transaction = pd.DataFrame(relation_list).astype({
-            "tokenId": "string",
-            "from": "string",
-            "to": "string",
-            "gasPrice": "float32",
-            "gasUsed": "float32",
-            "contractAddress": "string",
-            "tokenUri": "string",
-            "blockNumber": "uint32",
-        }, copy=False)
-
-        return df_transaction, graph
\ No newline at end of file
+        # アドレスをIDに変換
+        df_transaction = pd.DataFrame(relation_list, columns=TRANSACTION_COLUMNS)
+        for column in ["from", "to"]:
+            df_transaction[column] = address_table.intern(df_transaction[column]) if relation_list else []
+        df_transaction = df_transaction.astype(TRANSACTION_DTYPES, copy=False)
+
+        return df_transaction, self.build_graph(df_transaction)
@@ -2,12 +2,12 @@ import logging
 import pandas as pd
 import networkx as nx
 import torch
-from torch_geometric.nn import VGAE
 from torch_geometric.data import Data
 from torch_geometric.utils import negative_sampling
 from sklearn.metrics import roc_curve, roc_auc_score, accuracy_score, precision_score, recall_score
-from components.model import GraphEncoder
-from components.centralality import calculate_centrality
+from components.address import AddressTable
+from components.registry import model_registry
+from components.centralality import calculate_centrality, CENTRALITY_METRICS
 
 def configure_logger():
     """
@@ -16,9 +16,12 @@ def configure_logger():
     formatter = logging.Formatter('%(asctime)s - [%(levelname)s] - %(message)s')
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
-    handler = logging.FileHandler("data/generate.log", encoding='utf-8')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+
+    # ハンドラが重複して追加されないように初回のみ設定
+    if not logger.handlers:
+        handler = logging.FileHandler("data/generate.log", encoding='utf-8')
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
     return logger
 
 def log_evaluation_metrics(logger, preds, labels, optimal_threshold):
@@ -39,20 +42,48 @@ def log_evaluation_metrics(logger, preds, labels, optimal_threshold):
     logger.info(f"Precision: {precision:.4f}")
     logger.info(f"Recall: {recall:.4f}")
 
-def generate(df_feature: pd.DataFrame, data: Data) -> dict:
+def decode_edges(z: torch.Tensor, threshold: float, num_edges: int, block_bytes: int = 64 * 1024 ** 2) -> torch.Tensor:
+    """
+    接続確率sigmoid(z @ z.t())が閾値を超えるエッジから、num_edges本を一様ランダムに選択する
+    N×Nの確率行列を作らずに行ブロックごとに計算し、メモリ使用量をブロックサイズとnum_edgesで抑える
+    """
+    num_nodes = z.size(0)
+    block_size = max(1, block_bytes // max(1, num_nodes * z.element_size()))
+
+    # 各候補エッジにランダムなキーを割り当て、キーが小さい順にnum_edges本を保持する
+    # (全候補をランダムに並べ替えて先頭num_edges本を選ぶ場合と同じ分布になる)
+    edges = torch.empty((2, 0), dtype=torch.long)
+    keys = torch.empty(0)
+    for start in range(0, num_nodes, block_size):
+        prob = torch.sigmoid(z[start:start + block_size] @ z.t())
+        block_edges = (prob > threshold).nonzero(as_tuple=False).t().cpu()
+        del prob
+        if block_edges.size(1) == 0:
+            continue
+        block_edges[0] += start
+
+        edges = torch.cat([edges, block_edges], dim=1)
+        keys = torch.cat([keys, torch.rand(block_edges.size(1))])
+        if edges.size(1) > num_edges:
+            keys, order = torch.topk(keys, num_edges, largest=False)
+            edges = edges[:, order]
+
+    # 選択したエッジの順序をランダムにする
+    return edges[:, torch.randperm(edges.size(1))]
+
+def generate(df_feature: pd.DataFrame, data: Data, centrality_options: dict = None, address_table: AddressTable = None) -> dict:
     """
     学習済みのVGAEを用いてノード特徴量とエッジ情報から新しいネットワークを生成し、中心性を算出
+    address_tableを指定した場合は、ノードのIDをアドレスに戻してエッジリストのCSVに保存する
     """
     # logging設定
     logger = configure_logger()
 
-    # 入力・出力次元数の設定と学習用のモデルのロード
+    # 入力・出力次元数の設定と学習済みモデルの取得
     in_channels = data.x.size(-1)
     out_channels = data.x.size(-1)
     try:
-        model = VGAE(GraphEncoder(in_channels=in_channels, out_channels=out_channels))
-        checkpoint = torch.load("data/best_model.pt")
-        model.load_state_dict(checkpoint['model_state_dict'])
+        model = model_registry.get(in_channels)
     except Exception as e:
         logger.error(f"モデルのロードに失敗しました: {e}")
         raise RuntimeError(f"モデルのロードに失敗しました: {e}")
@@ -64,10 +95,10 @@ def generate(df_feature: pd.DataFrame, data: Data) -> dict:
 
     # ネットワーク生成
     logger.info("=== Network Generation Start ===")
-    model.eval()
     with torch.no_grad():
         # ノードの潜在表現を取得
-        z = model.encode(data.x, data.edge_index)
+        # モデルはリクエスト間で共有するため、モデルに値を書き込むencodeではなくエンコーダーを直接呼ぶ(推論モードのencodeと同じく平均を使う)
+        z, _ = model.encoder(data.x, data.edge_index)
 
         # 正エッジを予測
         num_pos_edges = data.edge_index.size(1)
@@ -97,10 +128,8 @@ def generate(df_feature: pd.DataFrame, data: Data) -> dict:
         # 各種評価指標を算出してログに出力
         log_evaluation_metrics(logger, preds, labels, optimal_threshold)
 
-        # エッジを保存
-        prob = torch.sigmoid(z @ z.t())
-        adj_matrix = (prob > optimal_threshold).nonzero(as_tuple=False).t().cpu()
-        network = adj_matrix[:, torch.randperm(adj_matrix.size(1))[:data.num_edges]]
+        # 閾値を超えるエッジからエッジ数分をランダムに選択
+        network = decode_edges(z, threshold=optimal_threshold, num_edges=data.num_edges)
     logger.info("=== Network Generation Finished ===")
 
     # networkをリストに変換する
@@ -115,15 +144,18 @@ def generate(df_feature: pd.DataFrame, data: Data) -> dict:
         target_label = node_labels[target_idx]
         node_with_label_list.append([source_label, target_label])
 
-    # CSVにエッジリストを保存
+    # CSVにエッジリストを保存(IDはプロセス内でのみ意味を持つため、アドレスに戻して保存する)
     edge_df = pd.DataFrame(node_with_label_list, columns=["source", "target"])
-    edge_df.to_csv("data/generated_network_edges.csv", index=False)
+    csv_df = edge_df
+    if address_table is not None:
+        csv_df = pd.DataFrame({column: address_table.labels(edge_df[column]) for column in edge_df.columns}, columns=edge_df.columns)
+    csv_df.to_csv("data/generated_network_edges.csv", index=False)
 
     # node_with_label_listをNetworkXデータに変換する
     generate_graph = nx.DiGraph()
     generate_graph.add_nodes_from(df_feature.index.tolist())
     generate_graph.add_edges_from(node_with_label_list)
-    centrality = calculate_centrality(generate_graph)
+    centrality = calculate_centrality(generate_graph, **(centrality_options or {}))
     del node_list
     del node_labels
     del node_with_label_list
@@ -133,3 +165,55 @@ def generate(df_feature: pd.DataFrame, data: Data) -> dict:
         "centrality": centrality,
         "edges_list": edge_df.values.tolist()
     }
+
+def filter_centrality(centrality: dict, addresses: set = None, metrics: list = None) -> dict:
+    """
+    中心性の計算結果を指定したアドレスと指標に絞り込む
+    平均値と収束情報は絞り込まずに指定した指標の値を返す
+    """
+    metrics = metrics or [metric for metric in CENTRALITY_METRICS if metric in centrality]
+    filtered = {}
+    for metric in metrics:
+        values = centrality[metric]
+        if addresses is not None:
+            values = {address: values[address] for address in addresses if address in values}
+        filtered[metric] = values
+    filtered["average"] = {metric: centrality["average"][metric] for metric in metrics}
+    if "convergence" in centrality:
+        filtered["convergence"] = {metric: value for metric, value in centrality["convergence"].items() if metric in metrics}
+    return filtered
+
+def filter_result(result: dict, addresses: list = None, metrics: list = None) -> dict:
+    """
+    /generateの結果を指定したアドレスの中心性と、そのアドレスに隣接する生成エッジのみに絞り込む
+    キャッシュされた結果を変更しないように新しい辞書を返す
+    """
+    if addresses is None and metrics is None:
+        return result
+    address_set = None if addresses is None else set(addresses)
+    generate_graph = result["generate_graph"]
+    if address_set is not None:
+        generate_graph = [edge for edge in generate_graph if edge[0] in address_set or edge[1] in address_set]
+    return {
+        **result,
+        "centrality": filter_centrality(result["centrality"], address_set, metrics),
+        "predict_centrality": filter_centrality(result["predict_centrality"], address_set, metrics),
+        "generate_graph": generate_graph
+    }
+
+def label_result(result: dict, address_table: AddressTable) -> dict:
+    """
+    /generateの結果のアドレスのIDを文字列に戻す(APIの応答の直前にのみ行う)
+    """
+    def label_centrality(centrality: dict) -> dict:
+        return {
+            metric: dict(zip(address_table.labels(values.keys()), values.values())) if metric in CENTRALITY_METRICS else values
+            for metric, values in centrality.items()
+        }
+
+    return {
+        **result,
+        "centrality": label_centrality(result["centrality"]),
+        "predict_centrality": label_centrality(result["predict_centrality"]),
+        "generate_graph": [address_table.labels(edge) for edge in result["generate_graph"]]
+    }
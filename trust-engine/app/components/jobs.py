@@ -0,0 +1,80 @@
+import multiprocessing
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, as_completed
+from typing import Iterator
+
+class JobManager:
+    """
+    時間のかかる処理をバックグラウンドのスレッドで実行し、ジョブIDで結果を取得する
+    processes=Trueの場合はワーカープロセスで実行する(CPU負荷の高い処理をGILに妨げられずに並列に実行できる)
+    ワーカープロセスはspawnで起動し、initializerでプロセスごとの状態を作成する
+    保持するジョブ数の上限を超えた場合は古いジョブから削除する
+    """
+    def __init__(self, max_workers: int = 2, max_jobs: int = 256, processes: bool = False, initializer=None, initargs: tuple = ()):
+        if processes:
+            self.executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=initializer,
+                initargs=initargs
+            )
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+        self.max_jobs = max_jobs
+        self.jobs: OrderedDict[str, Future] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs) -> str:
+        job_id = uuid.uuid4().hex
+        future = self.executor.submit(fn, *args, **kwargs)
+        with self.lock:
+            self.jobs[job_id] = future
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+        return job_id
+
+    def get(self, job_id: str, wait_seconds: float = 0) -> dict | None:
+        """
+        ジョブの状態を返す。wait_secondsを指定した場合は完了するまで最大その秒数だけ待つ
+        """
+        with self.lock:
+            future = self.jobs.get(job_id)
+        if future is None:
+            return None
+        if wait_seconds > 0:
+            wait([future], timeout=wait_seconds)
+
+        return self.describe(job_id, future)
+
+    def as_completed(self, job_ids: list[str], timeout: float = None) -> Iterator[dict]:
+        """
+        ジョブが完了した順に状態を返す
+        timeoutまでに完了しなかったジョブは実行中・待機中の状態に"timeout": Trueを付けて返し、削除済みのジョブは"not_found"として返す
+        """
+        with self.lock:
+            futures = {self.jobs[job_id]: job_id for job_id in job_ids if job_id in self.jobs}
+        for job_id in job_ids:
+            if job_id not in futures.values():
+                yield {"job_id": job_id, "status": "not_found"}
+        remaining = dict(futures)
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                del remaining[future]
+                yield self.describe(futures[future], future)
+        except TimeoutError:
+            for future, job_id in remaining.items():
+                yield {**self.describe(job_id, future), "timeout": True}
+
+    @staticmethod
+    def describe(job_id: str, future: Future) -> dict:
+        if not future.done():
+            return {"job_id": job_id, "status": "running" if future.running() else "pending"}
+        error = future.exception()
+        if error is not None:
+            return {"job_id": job_id, "status": "failed", "error": str(error)}
+        return {"job_id": job_id, "status": "finished", "result": future.result()}
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
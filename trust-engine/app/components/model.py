@@ -1,6 +1,8 @@
 import torch
 from torch_geometric.nn import GCNConv
-from pydantic import BaseModel
+from typing import Literal
+from pydantic import BaseModel, Field
+from components.centralality import PPR_EPSILON
 
 class GraphEncoder(torch.nn.Module):
     def __init__(self, in_channels, out_channels, dropout=0.2):
@@ -15,6 +17,32 @@ class GraphEncoder(torch.nn.Module):
         x = self.dropout(x)
         return self.conv_mu(x, edge_index), self.conv_logstd(x, edge_index)
 
+class CentralityOptions(BaseModel):
+    # 媒介中心性の計算方法(exact, sample, parallel)とサンプル数・プロセス数
+    betweenness_mode: Literal["exact", "sample", "parallel"] = "exact"
+    k: int | None = Field(None, gt=0)
+    workers: int | None = Field(None, gt=0)
+    seed: int | None = None
+    # 次数中心性とPageRankの計算方法(networkx, scipy)
+    backend: Literal["networkx", "scipy"] = "networkx"
+
 class GenerateRequestBody(BaseModel):
     contract_address: str
     transactions: list = None
+    centrality: CentralityOptions = CentralityOptions()
+    # 結果を絞り込むアドレスと中心性指標(指定しない場合は全て返す)
+    addresses: list[str] | None = None
+    metrics: list[Literal["degree", "betweenness", "pagerank"]] | None = None
+
+class ScoreRequestBody(BaseModel):
+    contract_address: str
+    # スコアを評価するアドレス(始点)とスコアを返すアドレス(指定しない場合は値が0より大きい全てのアドレス)
+    address: str
+    targets: list[str] | None = None
+    transactions: list = None
+    # プッシュを打ち切る残差の閾値(小さいほど正確で計算量が増える)
+    epsilon: float = Field(PPR_EPSILON, gt=0)
+
+class GenerateBatchRequestBody(BaseModel):
+    # 複数のコントラクトの生成リクエストをまとめたもの
+    items: list[GenerateRequestBody]
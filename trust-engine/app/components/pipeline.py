@@ -0,0 +1,75 @@
+from components.address import AddressTable
+from components.cache import ResultCache, transaction_digest, transaction_version
+from components.database import Database
+from components.generate import generate, filter_result, label_result
+from components.registry import model_registry
+
+def generate_result(
+    database: Database,
+    result_cache: ResultCache,
+    contract_address: str,
+    transactions: list = None,
+    centrality_options: dict = None,
+    addresses: list = None,
+    metrics: list = None
+) -> dict:
+    """
+    取引データの取得から特徴量の作成・ネットワーク生成までを行い、アドレスを文字列に戻した結果を返す
+    APIのプロセスとバッチ生成のワーカープロセスで共通の処理
+    """
+    centrality_options = centrality_options or {}
+
+    # 取引データの取得
+    # リクエストで指定された取引のアドレスは、プロセス全体の対応表が増え続けないようにリクエストごとの対応表でIDに変換する
+    # 取引データの版はNeo4jの取引では(対応表の番号, 最大ブロック番号, 取引数)、リクエストで指定された取引では内容のハッシュとする
+    if transactions is None:
+        df_transaction, graph, address_table = database.get_transaction_with_table(contract_address=contract_address)
+        version = (address_table.generation, *transaction_version(df_transaction))
+    else:
+        address_table = AddressTable()
+        df_transaction, graph = database.create_transaction_df(transactions=transactions, address_table=address_table)
+        version = transaction_digest(df_transaction, address_table)
+
+    # 取引データ・モデル・計算方法が同じであれば前回の結果を返す
+    result_key = (
+        contract_address,
+        version,
+        model_registry.get_version(),
+        tuple(sorted(centrality_options.items()))
+    )
+    # 結果はアドレスのIDで保持し、絞り込んでから文字列に戻す
+    address_ids = None if addresses is None else address_table.get_ids(addresses)
+    result = result_cache.get(result_key)
+    if result is not None:
+        return label_result(filter_result(result, addresses=address_ids, metrics=metrics), address_table)
+
+    # 標準化した特徴量とDataオブジェクトを作成
+    df_feature, data = database.build_feature_data(
+        df_transaction=df_transaction,
+        graph=graph,
+        centrality_options=centrality_options,
+        contract_address=contract_address,
+        address_table=address_table
+    )
+
+    # 元の中心性を取得(特徴量の計算時の結果を再利用)
+    original_centrality = database.get_centrality(
+        graph=graph,
+        centrality_options=centrality_options,
+        contract_address=contract_address,
+        address_table=address_table
+    )
+
+    # ネットワーク生成
+    predict_result = generate(df_feature=df_feature, data=data, centrality_options=centrality_options, address_table=address_table)
+
+    result = {
+        "message": "Generation finished",
+        "centrality": original_centrality,
+        "predict_centrality": predict_result["centrality"],
+        "generate_graph": predict_result["edges_list"]
+    }
+    result_cache.put(result_key, result)
+
+    # キャッシュには全ての結果を保持し、返すときに指定したアドレスと指標に絞り込む
+    return label_result(filter_result(result, addresses=address_ids, metrics=metrics), address_table)
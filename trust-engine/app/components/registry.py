@@ -0,0 +1,56 @@
+import os
+import threading
+import torch
+from torch_geometric.nn import VGAE
+from components.model import GraphEncoder
+
+MODEL_PATH = os.path.join("data", "best_model.pt")
+
+# チェックポイントがない場合の版
+MISSING_VERSION = -1
+
+class ModelRegistry:
+    """
+    学習済みモデルをプロセス内で共有するレジストリ
+    モデルは入力次元数ごとに一度だけロードし、推論モードで保持する
+    チェックポイントの更新時刻が変わった場合は次の取得時に再ロードする
+    """
+    def __init__(self, path: str = MODEL_PATH):
+        self.path = path
+        self.version = None
+        self.models: dict[int, VGAE] = {}
+        self.lock = threading.Lock()
+
+    def get_version(self) -> int:
+        """
+        チェックポイントの版(更新時刻)を返す
+        チェックポイントがない場合はMISSING_VERSIONを返し、ロード時のエラーとして扱う
+        """
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return MISSING_VERSION
+
+    def get(self, in_channels: int) -> VGAE:
+        with self.lock:
+            # チェックポイントが更新されていればロード済みのモデルを破棄
+            version = self.get_version()
+            if version != self.version:
+                self.models.clear()
+                self.version = version
+
+            model = self.models.get(in_channels)
+            if model is None:
+                model = VGAE(GraphEncoder(in_channels=in_channels, out_channels=in_channels))
+                checkpoint = torch.load(self.path)
+                model.load_state_dict(checkpoint['model_state_dict'])
+                model.eval()
+                self.models[in_channels] = model
+            return model
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.models.clear()
+            self.version = None
+
+model_registry = ModelRegistry()
@@ -1,19 +1,195 @@
-import os
+import copy
 import logging
+import os
+import random
+import time
 import torch
 from torch_geometric.data import Data
+from torch_geometric.loader import LinkNeighborLoader
 from torch_geometric.nn import VGAE
 from components.model import GraphEncoder
+from components.registry import MODEL_PATH
 
-def train(data: Data, epoch_num: int = 100):
-    # logging設定
+# ミニバッチ学習で1バッチに含める取引(エッジ)数
+TRAIN_BATCH_SIZE = 4096
+
+# ミニバッチ学習でGCNの各層がサンプリングする近傍ノード数(GraphEncoderの層数と合わせる)
+NUM_NEIGHBORS = [10, 10]
+
+# ベストモデルとみなす損失の最小改善幅
+MIN_DELTA = 1e-4
+
+# チェックポイントを保存する最小間隔(秒)
+CHECKPOINT_INTERVAL_SECONDS = 30
+
+# 損失が改善しないまま学習を続けるエポック数(Noneの場合は早期終了しない)
+PATIENCE = 10
+
+# 追加学習のエポック数
+WARM_START_EPOCHS = 10
+
+# 追加学習を許容する取引数の増加率(前回の全体学習時の取引数に対する割合)
+MAX_EDGE_GROWTH = 0.5
+
+# 追加学習を許容する損失の悪化率(前回の損失に対する割合)
+DRIFT_TOLERANCE = 0.5
+
+# 損失の評価で負例のサンプリングに使う乱数のシード(同じグラフは同じ負例で評価する)
+EVAL_SEED = 0
+
+def configure_logger():
+    """
+    ロギングの設定を行う
+    """
     formatter = logging.Formatter('%(asctime)s - [%(levelname)s] - %(message)s')
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
-    handler = logging.FileHandler("data/train.log", encoding='utf-8')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    
+
+    # ハンドラが重複して追加されないように初回のみ設定
+    if not logger.handlers:
+        handler = logging.FileHandler("data/train.log", encoding='utf-8')
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    return logger
+
+def save_checkpoint(checkpoint: dict, path: str = MODEL_PATH) -> None:
+    """
+    チェックポイントを一時ファイルに書き込んでから置き換える
+    推論側が書き込み途中のファイルを読み込まないようにする
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(checkpoint, tmp_path)
+    os.replace(tmp_path, path)
+
+def evaluate_loss(model: VGAE, data: Data) -> float:
+    """
+    勾配を計算せずに推論モードでグラフ全体の損失を求める
+    負例は固定したシードでサンプリングし、学習中の乱数の状態は変更しない
+    (negative_samplingはtorchに加えてPythonのrandomを使うため、両方の状態を退避する)
+    """
+    model.eval()
+    random_state = random.getstate()
+    try:
+        with torch.no_grad(), torch.random.fork_rng(devices=[]):
+            random.seed(EVAL_SEED)
+            torch.manual_seed(EVAL_SEED)
+            z = model.encode(data.x, data.edge_index)
+            loss = model.recon_loss(z, data.edge_index) + (1 / data.num_nodes) * model.kl_loss()
+    finally:
+        random.setstate(random_state)
+    return loss.item()
+
+def evaluate_checkpoint(model: VGAE, checkpoint: dict, data: Data) -> float:
+    """
+    チェックポイントの重みでグラフ全体の損失を推論モードで求める(モデルの重みは元に戻す)
+    """
+    current = copy.deepcopy(model.state_dict())
+    model.load_state_dict(checkpoint['model_state_dict'])
+    loss = evaluate_loss(model, data)
+    model.load_state_dict(current)
+    return loss
+
+def load_warm_start(data: Data, device: torch.device, logger: logging.Logger, path: str = MODEL_PATH) -> dict | None:
+    """
+    前回のチェックポイントから追加学習できる場合はチェックポイントを返す
+    チェックポイントがない場合、特徴量の次元数が変わった場合、取引数が大きく増えた場合、
+    前回のモデルの損失が大きく悪化した場合(ドリフト)はNoneを返して全体学習にする
+    """
+    if not os.path.exists(path):
+        logger.info("Warm Start Skipped: No checkpoint")
+        return None
+    checkpoint = torch.load(path, map_location=device)
+
+    in_channels = data.x.size(-1)
+    if checkpoint.get('in_channels') != in_channels:
+        logger.info(f"Warm Start Skipped: Feature dimension changed ({checkpoint.get('in_channels')} -> {in_channels})")
+        return None
+
+    base_num_edges = checkpoint.get('base_num_edges', 0)
+    num_edges = data.edge_index.size(1)
+    if num_edges > base_num_edges * (1 + MAX_EDGE_GROWTH):
+        logger.info(f"Warm Start Skipped: Number of edges grew from {base_num_edges} to {num_edges}")
+        return None
+
+    # 学習時の損失(学習モードやミニバッチの平均)ではなく、保存時に推論モードで求めた損失と比較する
+    reference_loss = checkpoint.get('eval_loss')
+    if reference_loss is None:
+        logger.info("Warm Start Skipped: No reference loss in checkpoint")
+        return None
+    model = VGAE(GraphEncoder(in_channels=in_channels, out_channels=in_channels)).to(device)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    loss = evaluate_loss(model, data.to(device))
+    if loss > reference_loss * (1 + DRIFT_TOLERANCE):
+        logger.info(f"Warm Start Skipped: Drift detected (eval loss {reference_loss} -> {loss})")
+        return None
+
+    logger.info(f"Warm Start: Loaded checkpoint of epoch {checkpoint['epoch']} (eval loss {reference_loss} -> {loss})")
+    return checkpoint
+
+def train_full_epoch(model: VGAE, optimizer: torch.optim.Optimizer, data: Data) -> tuple[float, int]:
+    """
+    グラフ全体を1回で学習する。(損失, 学習したエッジ数)を返す
+    """
+    model.train()
+    optimizer.zero_grad()
+    z = model.encode(data.x, data.edge_index)
+    recon_loss = model.recon_loss(z, data.edge_index)
+    kl_loss = (1 / data.num_nodes) * model.kl_loss()
+    loss = recon_loss + kl_loss
+    loss.backward()
+    optimizer.step()
+    return loss.item(), data.edge_index.size(1)
+
+def train_minibatch_epoch(model: VGAE, optimizer: torch.optim.Optimizer, loader: LinkNeighborLoader, device: torch.device) -> tuple[float, int]:
+    """
+    取引をバッチに分け、各取引の周辺をサンプリングした部分グラフで学習する
+    (エッジ数で重み付けした平均損失, 学習したエッジ数)を返す
+    """
+    model.train()
+    total_loss = 0.0
+    total_edges = 0
+    for batch in loader:
+        batch = batch.to(device)
+        optimizer.zero_grad()
+        z = model.encode(batch.x, batch.edge_index)
+        recon_loss = model.recon_loss(z, batch.edge_label_index)
+        kl_loss = (1 / batch.num_nodes) * model.kl_loss()
+        loss = recon_loss + kl_loss
+        loss.backward()
+        optimizer.step()
+
+        num_edges = batch.edge_label_index.size(1)
+        total_loss += loss.item() * num_edges
+        total_edges += num_edges
+    return total_loss / max(total_edges, 1), total_edges
+
+def train(
+    data: Data,
+    epoch_num: int = 100,
+    mode: str = "full",
+    batch_size: int = TRAIN_BATCH_SIZE,
+    num_neighbors: list[int] = NUM_NEIGHBORS,
+    min_delta: float = MIN_DELTA,
+    checkpoint_interval: float = CHECKPOINT_INTERVAL_SECONDS,
+    patience: int | None = PATIENCE,
+    warm_start: bool = False,
+    warm_start_epochs: int = WARM_START_EPOCHS
+):
+    """
+    VGAEを学習する
+    mode="full": グラフ全体を毎エポック学習する
+    mode="minibatch": 取引をbatch_size件ずつに分け、近傍をサンプリングした部分グラフで学習する(メモリ使用量がグラフの大きさに依存しない)
+    ベストモデルはメモリ上に保持し、checkpoint_interval秒以上の間隔と学習終了時にのみ保存する
+    保存時には推論モードでのグラフ全体の損失(eval_loss)を記録し、追加学習時のドリフト判定に使う
+    損失がmin_delta以上改善しないエポックがpatience回続いた場合は学習を打ち切る
+    warm_start=Trueの場合は前回のチェックポイントからwarm_start_epochsエポックだけ追加学習する(できない場合は全体学習)
+    """
+    if mode not in ["full", "minibatch"]:
+        raise ValueError(f"Unknown train mode: {mode}")
+
+    # logging設定
+    logger = configure_logger()
+
     # 特徴量の次元数、MLモデルを設定
     in_channels = data.x.size(-1)
     out_channels = data.x.size(-1)
@@ -22,14 +198,31 @@ def train(data: Data, epoch_num: int = 100):
     logger.info(f"Input Feature Dimension: {in_channels}")
     logger.info(f"Output Feature Dimension: {out_channels}")
 
-    # dataとmodelをGPUに転送
+    # modelをGPUに転送(dataは学習方法に応じて転送)
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    data = data.to(device)
     model = model.to(device)
     optimizer = torch.optim.Adam(model.parameters(), lr=0.01)
+
+    # 前回のモデルから追加学習する
+    train_type = "full"
+    base_num_edges = data.edge_index.size(1)
+    if warm_start:
+        checkpoint = load_warm_start(data, device, logger)
+        if checkpoint is not None:
+            model.load_state_dict(checkpoint['model_state_dict'])
+            optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+            train_type = "incremental"
+            base_num_edges = checkpoint['base_num_edges']
+            epoch_num = min(epoch_num, warm_start_epochs)
+    logger.info(f"Train Type: {train_type}")
     logger.info(f"Use Device: {device}")
     logger.info(f"Optimizer: Adam")
     logger.info(f"Epochs: {epoch_num}")
+    logger.info(f"Train Mode: {mode}")
+    logger.info(f"Patience: {patience}, Min Delta: {min_delta}")
+    if mode == "minibatch":
+        logger.info(f"Batch Size: {batch_size}")
+        logger.info(f"Number of Neighbors: {num_neighbors}")
     logger.info("=== Training Data Info ===")
     logger.info(f"Number of Nodes: {data.num_nodes}")
     logger.info(f"Number of Edges: {data.edge_index.size(1)}")
@@ -37,26 +230,69 @@ def train(data: Data, epoch_num: int = 100):
 
     # モデルを学習
     logger.info("=== Training Start ===")
+    if mode == "minibatch":
+        # サンプリングはCPU上のグラフで行い、バッチごとにデバイスへ転送する
+        data = data.cpu()
+        loader = LinkNeighborLoader(
+            data,
+            num_neighbors=num_neighbors,
+            edge_label_index=data.edge_index,
+            batch_size=batch_size,
+            shuffle=True
+        )
+    else:
+        data = data.to(device)
+
+    # 追加学習時のドリフト判定の基準として、保存するモデルのグラフ全体の損失を推論モードで求める
+    eval_data = data.to(device)
+
     best_loss = float('inf')
+    best_checkpoint = None
+    saved = True
+    last_saved = time.monotonic()
+    epochs_without_improvement = 0
     for epoch in range(1, epoch_num + 1):
-        model.train()
-        optimizer.zero_grad()
-        z = model.encode(data.x, data.edge_index)
-        recon_loss = model.recon_loss(z, data.edge_index)
-        kl_loss = (1 / data.num_nodes) * model.kl_loss()
-        loss = recon_loss + kl_loss
-        loss.backward()
-        optimizer.step()
+        start = time.perf_counter()
+        if mode == "minibatch":
+            loss, num_edges = train_minibatch_epoch(model, optimizer, loader, device)
+        else:
+            loss, num_edges = train_full_epoch(model, optimizer, data)
+        throughput = num_edges / max(time.perf_counter() - start, 1e-9)
 
-        # ベストモデルの更新
-        if loss < best_loss:
+        # ベストモデルの更新(保存はせずにメモリ上に複製を保持)
+        if loss < best_loss - min_delta:
             best_loss = loss
-            # モデルの保存
-            torch.save({
+            best_checkpoint = {
                 'epoch': epoch,
-                'model_state_dict': model.state_dict(),
-                'optimizer_state_dict': optimizer.state_dict(),
+                'model_state_dict': copy.deepcopy(model.state_dict()),
+                'optimizer_state_dict': copy.deepcopy(optimizer.state_dict()),
                 'loss': loss,
-            }, os.path.join("data", 'best_model.pt'))
-        logger.info(f"Epoch: {epoch}, Loss: {loss.item()}, Best Loss: {best_loss.item()}")
+                'in_channels': in_channels,
+                'base_num_edges': base_num_edges,
+                'train_type': train_type,
+            }
+            saved = False
+            epochs_without_improvement = 0
+        else:
+            epochs_without_improvement += 1
+        logger.info(f"Epoch: {epoch}, Loss: {loss}, Best Loss: {best_loss}, Throughput: {throughput:.0f} edges/s")
+
+        # 前回の保存から一定時間が経過していればベストモデルを保存
+        if not saved and time.monotonic() - last_saved >= checkpoint_interval:
+            best_checkpoint['eval_loss'] = evaluate_checkpoint(model, best_checkpoint, eval_data)
+            save_checkpoint(best_checkpoint)
+            saved = True
+            last_saved = time.monotonic()
+            logger.info(f"Checkpoint Saved: Epoch {best_checkpoint['epoch']}")
+
+        # 早期終了
+        if patience is not None and epochs_without_improvement >= patience:
+            logger.info(f"Early Stopping: No improvement for {patience} epochs")
+            break
+
+    # 保存していないベストモデルを保存
+    if not saved:
+        best_checkpoint['eval_loss'] = evaluate_checkpoint(model, best_checkpoint, eval_data)
+        save_checkpoint(best_checkpoint)
+        logger.info(f"Checkpoint Saved: Epoch {best_checkpoint['epoch']}")
     logger.info("=== Training Finished ===")
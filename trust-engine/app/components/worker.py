@@ -0,0 +1,23 @@
+from components.cache import ResultCache
+from components.database import Database
+from components.pipeline import generate_result
+
+# ワーカープロセスごとのデータベース接続と結果のキャッシュ(init_workerで作成する)
+database: Database = None
+result_cache: ResultCache = None
+
+def init_worker(url: str, cache_bytes: int = 1024 ** 3, result_bytes: int = 256 * 1024 ** 2) -> None:
+    """
+    バッチ生成のワーカープロセスの初期化
+    データベースの接続・スナップショット・モデルのレジストリはワーカーごとに持ち、ジョブ間で再利用する
+    cache_bytesとresult_bytesはこのワーカーの取引データと結果のキャッシュの上限(全体の上限をワーカー数で割った値)
+    """
+    global database, result_cache
+    database = Database(url, cache_bytes=cache_bytes)
+    result_cache = ResultCache(max_bytes=result_bytes)
+
+def run_generate(**kwargs) -> dict:
+    """
+    ワーカープロセスでネットワーク生成を行う(結果のアドレスは文字列のためプロセス間で受け渡せる)
+    """
+    return generate_result(database, result_cache, **kwargs)
@@ -1,14 +1,56 @@
-from fastapi import FastAPI, BackgroundTasks
+import json
+import logging
+import os
+from typing import Literal
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 import torch
+from components.address import AddressTable
 from components.database import Database
-from components.train import train
-from components.generate import generate
-from components.centralality import calculate_centrality
-from components.model import GenerateRequestBody
+from components.cache import ResultCache
+from components.compression import GzipRoute, GZIP_MINIMUM_SIZE
+from components.jobs import JobManager
+from components.pipeline import generate_result
+from components.train import train, TRAIN_BATCH_SIZE
+from components import worker
+from components.centralality import personalized_pagerank
+from components.model import GenerateRequestBody, GenerateBatchRequestBody, ScoreRequestBody, CentralityOptions
+
+# Neo4jの接続先
+DATABASE_URL = 'neo4j://graph-db:7687'
+
+# バッチ生成のワーカープロセス数(環境変数BATCH_WORKERSで変更できる)
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1))
+
+# バッチ生成のワーカープロセス全体で取引データと結果のキャッシュに使うメモリの上限(byte)
+# ワーカーはそれぞれキャッシュを持つため、上限をワーカー数で等分する
+BATCH_CACHE_BYTES = int(os.environ.get("BATCH_CACHE_BYTES", 1024 ** 3))
+BATCH_RESULT_BYTES = int(os.environ.get("BATCH_RESULT_BYTES", 256 * 1024 ** 2))
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
-database = Database('neo4j://graph-db:7687')
+app.router.route_class = GzipRoute  # gzip圧縮されたリクエストボディを受け付ける
+database = Database(DATABASE_URL)
+result_cache = ResultCache()
+job_manager = JobManager()
+
+# バッチ生成はコントラクトごとにワーカープロセスで並列に実行する(プロセスは最初のジョブの投入時に起動する)
+batch_job_manager = JobManager(
+    max_workers=BATCH_WORKERS,
+    processes=True,
+    initializer=worker.init_worker,
+    initargs=(DATABASE_URL, BATCH_CACHE_BYTES // BATCH_WORKERS, BATCH_RESULT_BYTES // BATCH_WORKERS)
+)
+
+# ロングポーリングで待機する最大秒数
+MAX_WAIT_SECONDS = 60
+
+# バッチ生成で全てのコントラクトの完了を待つ最大秒数
+BATCH_TIMEOUT_SECONDS = 3600
 
 # CORSの設定
 app.add_middleware(
@@ -19,6 +61,9 @@ app.add_middleware(
     allow_headers=["*"],  # すべてのヘッダーを許可
 )
 
+# Accept-Encoding: gzipを指定したクライアントにはレスポンスを圧縮して返す
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
 @app.get("/")
 def root():
     if torch.cuda.is_available():
@@ -33,76 +78,191 @@ def root():
             "GPU": "Not Available"
         }
 
-def run_train(contract_address: str) -> None:
+def run_train(
+    contract_address: str,
+    centrality_options: dict = None,
+    train_mode: str = "full",
+    batch_size: int = TRAIN_BATCH_SIZE,
+    incremental: bool = False
+) -> None:
     # 学習用のデータを取得
-    df_transaction, graph = database.get_transaction(contract_address=contract_address)
-    df_feature = database.get_features(df_transaction=df_transaction, graph=graph)
+    df_transaction, graph, address_table = database.get_transaction_with_table(contract_address=contract_address)
 
-    # 標準化
-    feature_means = df_feature.mean()
-    feature_stds = df_feature.std(ddof=0).replace(0, 1)
-    df_feature = (df_feature - feature_means) / feature_stds
+    # 標準化した特徴量とDataオブジェクトを作成
+    _, data = database.build_feature_data(
+        df_transaction=df_transaction,
+        graph=graph,
+        centrality_options=centrality_options,
+        contract_address=contract_address,
+        address_table=address_table
+    )
 
-    # データ型の変換
-    data = database.transform_data(df_transaction=df_transaction, df_feature=df_feature)
-    
     # モデルの学習
-    train(data)
+    train(data, mode=train_mode, batch_size=batch_size, warm_start=incremental)
 
 @app.get("/train")
-def train_model(background_tasks: BackgroundTasks, contract_address: str = "all"):
-    background_tasks.add_task(run_train, contract_address)
+def train_model(
+    background_tasks: BackgroundTasks,
+    contract_address: str = "all",
+    betweenness_mode: Literal["exact", "sample", "parallel"] = "exact",
+    k: int | None = Query(None, gt=0),
+    workers: int | None = Query(None, gt=0),
+    backend: Literal["networkx", "scipy"] = "networkx",
+    train_mode: Literal["full", "minibatch"] = "full",
+    batch_size: int = TRAIN_BATCH_SIZE,
+    incremental: bool = False
+):
+    centrality_options = CentralityOptions(betweenness_mode=betweenness_mode, k=k, workers=workers, backend=backend).model_dump()
+    background_tasks.add_task(run_train, contract_address, centrality_options, train_mode, batch_size, incremental)
     return {"message": "Training started"}
 
+def run_generate(
+    contract_address: str,
+    transactions: list = None,
+    centrality_options: dict = None,
+    addresses: list = None,
+    metrics: list = None
+) -> dict:
+    return generate_result(
+        database,
+        result_cache,
+        contract_address=contract_address,
+        transactions=transactions,
+        centrality_options=centrality_options,
+        addresses=addresses,
+        metrics=metrics
+    )
+
 @app.get("/generate")
 def generate_network(requestBody: GenerateRequestBody):
-    # リクエストボディからパラメータを取得
-    transactions = requestBody.transactions
-    contract_address = requestBody.contract_address
+    return run_generate(
+        contract_address=requestBody.contract_address,
+        transactions=requestBody.transactions,
+        centrality_options=requestBody.centrality.model_dump(),
+        addresses=requestBody.addresses,
+        metrics=requestBody.metrics
+    )
 
-    # 取引データの取得
-    if transactions is not None:
-        df_transaction, graph = database.get_transaction(contract_address=contract_address)
-    else:
-        df_transaction, graph = database.create_transaction_df(transactions=transactions)
-    df_feature = database.get_features(df_transaction=df_transaction, graph=graph)
+@app.post("/generate/jobs")
+def submit_generate_job(requestBody: GenerateRequestBody):
+    """
+    ネットワーク生成をジョブとして投入し、ジョブIDを返す
+    """
+    job_id = job_manager.submit(
+        run_generate,
+        contract_address=requestBody.contract_address,
+        transactions=requestBody.transactions,
+        centrality_options=requestBody.centrality.model_dump(),
+        addresses=requestBody.addresses,
+        metrics=requestBody.metrics
+    )
+    return {"message": "Generation job submitted", "job_id": job_id}
+
+@app.post("/generate/batch")
+def generate_batch(requestBody: GenerateBatchRequestBody):
+    """
+    複数のコントラクトのネットワーク生成をジョブとしてまとめて投入し、完了した順に結果をNDJSONで返す
+    ジョブはワーカープロセスで並列に実行し、取引データを指定しない同じ条件のリクエストは1つのジョブにまとめる
+    BATCH_TIMEOUT_SECONDSまでに完了しなかったジョブは"timeout": Trueを付けた状態を返す(結果は/generate/jobs/{job_id}で取得できる)
+    """
+    job_ids = []
+    shared_jobs = {}
+    for item in requestBody.items:
+        options = item.centrality.model_dump()
+        key = None
+        if item.transactions is None:
+            key = (item.contract_address, tuple(sorted(options.items())), tuple(item.addresses or []), tuple(item.metrics or []))
+        if key is not None and key in shared_jobs:
+            job_ids.append(shared_jobs[key])
+            continue
+        job_id = batch_job_manager.submit(
+            worker.run_generate,
+            contract_address=item.contract_address,
+            transactions=item.transactions,
+            centrality_options=options,
+            addresses=item.addresses,
+            metrics=item.metrics
+        )
+        if key is not None:
+            shared_jobs[key] = job_id
+        job_ids.append(job_id)
+
+    def stream():
+        # ジョブIDと対応するリクエストの番号を先に返し、途中で切断されてもジョブの結果を取得できるようにする
+        indexes = {}
+        for index, job_id in enumerate(job_ids):
+            indexes.setdefault(job_id, []).append(index)
+        yield json.dumps({"status": "submitted", "job_ids": job_ids}) + "\n"
+        for job in batch_job_manager.as_completed(list(indexes), timeout=BATCH_TIMEOUT_SECONDS):
+            for index in indexes[job["job_id"]]:
+                line = {"index": index, "contract_address": requestBody.items[index].contract_address, **job}
+                yield json.dumps(jsonable_encoder(line)) + "\n"
 
-    # 標準化
-    feature_means = df_feature.mean()
-    feature_stds = df_feature.std(ddof=0).replace(0, 1)
-    df_feature = (df_feature - feature_means) / feature_stds
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
-    # データ型の変換
-    data = database.transform_data(df_transaction=df_transaction, df_feature=df_feature)
+@app.get("/generate/jobs/{job_id}")
+def get_generate_job(job_id: str, wait: float = 0):
+    """
+    ジョブの状態と結果を取得する。waitを指定した場合は完了するまで最大wait秒待つ(ロングポーリング)
+    """
+    # バッチ生成のジョブも同じIDで取得できる
+    wait_seconds = min(wait, MAX_WAIT_SECONDS)
+    job = job_manager.get(job_id, wait_seconds=wait_seconds) or batch_job_manager.get(job_id, wait_seconds=wait_seconds)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-    # 元の中心性を取得
-    original_centrality = calculate_centrality(graph=graph)
+@app.post("/score")
+def get_personalized_score(requestBody: ScoreRequestBody):
+    """
+    addressから見た取引相手の信用スコア(個人化PageRank)を返す
+    addressの周辺のみを探索するため、ネットワーク生成(/generate)より低コストで計算できる
+    """
+    # 取引データの取得(スナップショットのグラフを再利用し、リクエストで指定された取引はリクエストごとの対応表でIDに変換する)
+    if requestBody.transactions is None:
+        _, graph, address_table = database.get_transaction_with_table(contract_address=requestBody.contract_address)
+    else:
+        address_table = AddressTable()
+        _, graph = database.create_transaction_df(transactions=requestBody.transactions, address_table=address_table)
+
+    # アドレスをIDに変換して計算し、結果を文字列に戻す
+    source = address_table.get_id(requestBody.address)
+    estimate, pushes, residual = personalized_pagerank(graph, source, epsilon=requestBody.epsilon)
+    if requestBody.targets is None:
+        scores = {address_table.label(node): value for node, value in estimate.items()}
+    else:
+        address_ids = [address_table.get_id(target) for target in requestBody.targets]
+        scores = {target: estimate.get(node, 0.0) for target, node in zip(requestBody.targets, address_ids)}
 
-    # ネットワーク生成
-    predict_result = generate(df_feature=df_feature, data=data)
-    
     return {
-        "message": "Generation finished",
-        "centrality": original_centrality,
-        "predict_centrality": predict_result["centrality"],
-        "generate_graph": predict_result["edges_list"]
+        "message": "Score calculated",
+        "address": requestBody.address,
+        "scores": scores,
+        "pushes": pushes,
+        "residual": residual
     }
 
 @app.get("/transaction")
 def get_transaction(contract_address: str, address: str):
-    df_transaction, graph = database.get_transaction(contract_address=contract_address)
-    df_transaction = df_transaction.sort_values(by="blockNumber", ascending=False)
-    result = df_transaction[df_transaction["from"] == address][["from", "to", "tokenUri"]]
-    if result.empty:
-        result = df_transaction[df_transaction["to"] == address][["from", "to", "tokenUri"]]
+    result = database.get_latest_transaction(contract_address=contract_address, address=address)
 
     return {
         "message": "Transaction data retrieved",
-        "result": result.iloc[0].to_dict() if not result.empty else None,
+        "result": result,
     }
 
+@app.on_event("startup")
+def startup_event():
+    # 検索に使うインデックスを作成
+    try:
+        database.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Error creating indexes: {e}")
+
 @app.on_event("shutdown")
 def shutdown_event():
     global database
     if database:
         database.close()
+    job_manager.shutdown()
+    batch_job_manager.shutdown()
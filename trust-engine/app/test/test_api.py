@@ -0,0 +1,130 @@
+import json
+import threading
+import pytest
+import torch
+from fastapi.testclient import TestClient
+from torch_geometric.nn import VGAE
+from components import worker
+from components.database import FEATURE_COLUMNS
+from components.jobs import JobManager
+from components.model import GraphEncoder
+from components.pipeline import generate_result
+from components.registry import model_registry
+import main
+from main import app, database, result_cache
+
+def make_transactions(num_transactions: int, num_addresses: int = 7, block_number: bool = True) -> list:
+    return [
+        {
+            "tokenId": str(i),
+            "from": f"0x{i % num_addresses:040x}",
+            "to": f"0x{(i * 3 + 1) % num_addresses:040x}",
+            "gasPrice": 1.0,
+            "gasUsed": 1.0,
+            **({"blockNumber": i} if block_number else {})
+        }
+        for i in range(num_transactions)
+    ]
+
+@pytest.fixture
+def checkpoint(tmp_path, monkeypatch):
+    """作業ディレクトリにランダムな重みのチェックポイントを作成"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    model = VGAE(GraphEncoder(in_channels=len(FEATURE_COLUMNS), out_channels=len(FEATURE_COLUMNS)))
+    torch.save({"model_state_dict": model.state_dict()}, tmp_path / "data" / "best_model.pt")
+    model_registry.invalidate()
+
+def test_generate_reports_pagerank_convergence(checkpoint):
+    """/generateの結果にPageRankの反復回数と収束時の変化量が含まれることのテスト"""
+    client = TestClient(app)
+    transactions = make_transactions(30)
+
+    response = client.request("GET", "/generate", json={"contract_address": "0xapi", "transactions": transactions})
+
+    assert response.status_code == 200
+    convergence = response.json()["centrality"]["convergence"]["pagerank"]
+    assert convergence["iterations"] is not None
+    assert convergence["residual"] is not None
+
+def test_centrality_options_reject_non_positive_k_and_workers():
+    """kとworkersに0以下を指定した場合に422を返すことのテスト"""
+    client = TestClient(app)
+
+    for params in [{"k": 0}, {"workers": -1}]:
+        response = client.get("/train", params=params)
+        assert response.status_code == 422
+        response = client.request("GET", "/generate", json={"contract_address": "0xapi", "centrality": params})
+        assert response.status_code == 422
+
+def test_request_transactions_use_request_address_table(checkpoint):
+    """リクエストで指定した取引のアドレスをプロセス全体の対応表に登録しないことのテスト"""
+    client = TestClient(app)
+    size = len(database.address_table)
+    transactions = make_transactions(30, num_addresses=9)
+
+    first = client.request("GET", "/generate", json={"contract_address": "0xrequest", "transactions": transactions[:29]})
+    second = client.request("GET", "/generate", json={"contract_address": "0xrequest", "transactions": transactions})
+    score = client.post("/score", json={"contract_address": "0xrequest", "address": transactions[0]["from"], "transactions": transactions})
+
+    assert first.status_code == second.status_code == score.status_code == 200
+    assert len(database.address_table) == size
+    assert set(second.json()["centrality"]["pagerank"]) == {f"0x{i:040x}" for i in range(9)}
+    # リクエストごとに対応表が異なっても、前回のPageRankを初期値にする
+    assert second.json()["centrality"]["convergence"]["pagerank"]["warm_start"] is True
+    assert transactions[0]["to"] in score.json()["scores"]
+
+def test_request_transactions_cache_by_content(checkpoint):
+    """最大ブロック番号と取引数が同じで内容が異なる取引に前回の結果を返さないことのテスト"""
+    client = TestClient(app)
+    # ブロック番号がない取引は全て0になる
+    first = make_transactions(30, num_addresses=9, block_number=False)
+    second = make_transactions(30, num_addresses=5, block_number=False)
+
+    responses = [client.request("GET", "/generate", json={"contract_address": "0xcontent", "transactions": transactions}) for transactions in [first, second, second]]
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert set(responses[1].json()["centrality"]["pagerank"]) == {f"0x{i:040x}" for i in range(5)}
+    # 同じ内容の取引は前回の結果を返す
+    assert responses[2].json() == responses[1].json()
+
+def test_request_transactions_cache_by_gas(checkpoint):
+    """ガス代のみが異なる取引で前回の結果を共有しないことのテスト"""
+    client = TestClient(app)
+    first = make_transactions(30, num_addresses=9)
+    second = [{**transaction, "gasPrice": 2.0, "gasUsed": 3.0} for transaction in first]
+    size = len(result_cache.results)
+
+    responses = [client.request("GET", "/generate", json={"contract_address": "0xgas", "transactions": transactions}) for transactions in [first, second, second]]
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    # ガス代の異なる取引は別の結果として保持し、同じ内容の取引は前回の結果を使う
+    assert len(result_cache.results) == size + 2
+
+def test_generate_without_checkpoint(tmp_path, monkeypatch):
+    """チェックポイントがない場合にモデルのロードのエラーとして扱うことのテスト"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    model_registry.invalidate()
+
+    with pytest.raises(RuntimeError, match="モデルのロードに失敗しました"):
+        generate_result(database, result_cache, contract_address="0xmissing", transactions=make_transactions(30))
+
+def test_generate_batch_reports_unfinished_jobs(monkeypatch):
+    """バッチ生成で時間内に完了しなかったジョブも1行ずつ返すことのテスト"""
+    event = threading.Event()
+    job_manager = JobManager(max_workers=1)
+    monkeypatch.setattr(main, "batch_job_manager", job_manager)
+    monkeypatch.setattr(main, "BATCH_TIMEOUT_SECONDS", 0.1)
+    monkeypatch.setattr(worker, "run_generate", lambda **kwargs: event.wait())
+    client = TestClient(app)
+
+    response = client.post("/generate/batch", json={"items": [{"contract_address": "0xa"}, {"contract_address": "0xb"}]})
+    event.set()
+    job_manager.shutdown()
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["status"] == "submitted"
+    assert sorted(line["index"] for line in lines[1:]) == [0, 1]
+    assert {line["status"] for line in lines[1:]} == {"running", "pending"}
+    assert all(line["timeout"] is True for line in lines[1:])
@@ -0,0 +1,115 @@
+import pytest
+import networkx as nx
+from components import centralality
+from components.centralality import betweenness_centrality, calculate_centrality, parallel_betweenness_centrality, personalized_pagerank
+
+@pytest.fixture
+def power_law_graph():
+    """べき乗則に従うサンプルグラフ"""
+    graph = nx.DiGraph(nx.scale_free_graph(200, seed=1))
+    graph.remove_edges_from(nx.selfloop_edges(graph))
+    return graph
+
+def test_parallel_betweenness_matches_exact(power_law_graph):
+    """複数プロセスで計算した媒介中心性が厳密解と一致することのテスト"""
+    exact = nx.betweenness_centrality(power_law_graph)
+    parallel = betweenness_centrality(power_law_graph, mode="parallel", workers=2)
+
+    assert parallel.keys() == exact.keys()
+    assert all(parallel[node] == pytest.approx(exact[node], abs=1e-12) for node in exact)
+
+def test_parallel_betweenness_reuses_workers(power_law_graph):
+    """ワーカープロセスで計算した媒介中心性が厳密解と一致し、プールを呼び出し間で再利用することのテスト"""
+    exact = nx.betweenness_centrality(power_law_graph)
+    centralality.shutdown_betweenness_executor()
+    try:
+        # 小さいグラフはワーカープロセスを起動せずに計算する
+        parallel_betweenness_centrality(power_law_graph, workers=2)
+        assert centralality._betweenness_executor is None
+
+        first = parallel_betweenness_centrality(power_law_graph, workers=2, min_nodes=0)
+        executor = centralality._betweenness_executor
+        second = parallel_betweenness_centrality(power_law_graph, k=50, workers=2, seed=0, min_nodes=0)
+
+        assert executor is not None
+        assert centralality._betweenness_executor is executor
+        assert all(first[node] == pytest.approx(exact[node], abs=1e-12) for node in exact)
+        # サンプリングはプロセス数によらず同じ始点を使う
+        serial = parallel_betweenness_centrality(power_law_graph, k=50, workers=1, seed=0)
+        assert all(second[node] == pytest.approx(serial[node], abs=1e-12) for node in serial)
+    finally:
+        centralality.shutdown_betweenness_executor()
+
+def test_sample_betweenness(power_law_graph):
+    """サンプリングした媒介中心性が全ノード分返ることのテスト"""
+    sample = betweenness_centrality(power_law_graph, mode="sample", k=20, seed=0)
+
+    assert sample.keys() == set(power_law_graph.nodes)
+    assert all(value >= 0 for value in sample.values())
+
+def test_calculate_centrality_unknown_mode(power_law_graph):
+    """未知の計算方法を指定した場合のテスト"""
+    with pytest.raises(ValueError):
+        calculate_centrality(power_law_graph, betweenness_mode="unknown")
+
+def test_scipy_backend_matches_networkx(power_law_graph):
+    """疎行列で計算した次数中心性とPageRankがNetworkXの結果と一致することのテスト"""
+    graph = power_law_graph.copy()
+    graph.add_node("isolated")  # 出次数0のノード
+
+    expected = {"degree": nx.in_degree_centrality(graph), "pagerank": nx.pagerank(graph)}
+    result = calculate_centrality(graph, backend="scipy")
+
+    for metric in ["degree", "pagerank"]:
+        assert result[metric].keys() == expected[metric].keys()
+        assert all(result[metric][node] == pytest.approx(expected[metric][node], abs=1e-6) for node in graph)
+    assert result["betweenness"] == calculate_centrality(graph, backend="networkx")["betweenness"]
+
+    # networkxのバックエンドはnx.pagerankの値をそのまま返す
+    assert calculate_centrality(graph, backend="networkx")["pagerank"] == expected["pagerank"]
+
+    with pytest.raises(ValueError):
+        calculate_centrality(graph, backend="unknown")
+
+def test_pagerank_warm_start(power_law_graph):
+    """前回のPageRankを初期値にした場合に少ない反復回数で同じ値に収束することのテスト"""
+    previous = calculate_centrality(power_law_graph, backend="scipy")
+    graph = power_law_graph.copy()
+    graph.add_edges_from([(0, 150), (150, 199), (199, "new")])
+
+    cold = calculate_centrality(graph, backend="scipy")
+    warm = calculate_centrality(graph, backend="scipy", pagerank_start=previous["pagerank"])
+
+    assert cold["convergence"]["pagerank"]["warm_start"] is False
+    assert warm["convergence"]["pagerank"]["warm_start"] is True
+    assert warm["convergence"]["pagerank"]["iterations"] < cold["convergence"]["pagerank"]["iterations"]
+    assert warm["convergence"]["pagerank"]["residual"] < graph.number_of_nodes() * 1e-6
+    assert all(warm["pagerank"][node] == pytest.approx(cold["pagerank"][node], abs=1e-5) for node in graph)
+
+    # networkxでも初期値をnx.pagerankのnstartに渡し、反復回数と変化量を記録する
+    result = calculate_centrality(graph, pagerank_start=previous["pagerank"])
+    nstart = {node: previous["pagerank"].get(node, 1 / graph.number_of_nodes()) for node in graph}
+    assert result["pagerank"] == nx.pagerank(graph, nstart=nstart)
+    assert result["convergence"]["pagerank"]["warm_start"] is True
+    assert result["convergence"]["pagerank"]["iterations"] == warm["convergence"]["pagerank"]["iterations"]
+    assert result["convergence"]["pagerank"]["residual"] is not None
+    assert all(result["pagerank"][node] == pytest.approx(cold["pagerank"][node], abs=1e-5) for node in graph)
+
+def test_personalized_pagerank_matches_networkx(power_law_graph):
+    """フォワードプッシュで近似した個人化PageRankがnx.pagerankと一致することのテスト"""
+    source = 0
+    expected = nx.pagerank(power_law_graph, personalization={source: 1}, tol=1e-12, max_iter=1000)
+
+    estimate, pushes, residual = personalized_pagerank(power_law_graph, source, epsilon=1e-8)
+
+    assert pushes > 0
+    assert sum(estimate.values()) + residual == pytest.approx(1.0)
+    assert all(estimate.get(node, 0.0) == pytest.approx(expected[node], abs=1e-5) for node in power_law_graph)
+
+    # 閾値を大きくするとプッシュ回数が減る
+    _, coarse_pushes, coarse_residual = personalized_pagerank(power_law_graph, source, epsilon=1e-3)
+    assert coarse_pushes < pushes
+    assert coarse_residual > residual
+
+    # グラフに含まれない始点は空の結果を返す
+    assert personalized_pagerank(power_law_graph, "unknown") == ({}, 0, 0.0)
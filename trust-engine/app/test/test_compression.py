@@ -0,0 +1,35 @@
+import gzip
+import json
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.testclient import TestClient
+from components.compression import GzipRoute, GZIP_MINIMUM_SIZE
+from components.model import GenerateRequestBody
+
+def test_gzip_request_and_response():
+    """gzip圧縮したリクエストボディの展開とレスポンスの圧縮のテスト"""
+    app = FastAPI()
+    app.router.route_class = GzipRoute
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
+    @app.post("/echo")
+    def echo(requestBody: GenerateRequestBody):
+        return {"transactions": requestBody.transactions}
+
+    client = TestClient(app)
+    transactions = [{"from": f"0x{i:040x}", "to": f"0x{i + 1:040x}"} for i in range(100)]
+    body = json.dumps({"contract_address": "0x1", "transactions": transactions}).encode()
+
+    # 圧縮したリクエスト
+    response = client.post(
+        "/echo",
+        content=gzip.compress(body),
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip", "Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.json()["transactions"] == transactions
+
+    # 圧縮しないリクエスト
+    response = client.post("/echo", content=body, headers={"Content-Type": "application/json"})
+    assert response.json()["transactions"] == transactions
@@ -1,10 +1,13 @@
+import threading
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, MagicMock, patch
 import pandas as pd
 import networkx as nx
 import torch
 from torch_geometric.data import Data
 from components.database import Database
+from components.address import AddressTable, AddressTableFullError
+from components.cache import Snapshot, SnapshotCache, ResultCache, extend_graph, payload_bytes
 
 @pytest.fixture
 def mock_database():
@@ -103,6 +106,7 @@ def test_transform_data():
 def test_create_transaction_df():
     """Web3トランザクションリストからDataFrameとグラフを生成するテスト"""
     db = Database.__new__(Database)  # driver接続を避けてメソッドだけ利用
+    db.address_table = AddressTable()
     transactions = [
         {
             "tokenId": "1",
@@ -140,6 +144,322 @@ def test_create_transaction_df():
         "blockNumber",
     ]
     assert df_transaction.shape[0] == 2
-    assert set(df_transaction["from"]) == {"addr1", "addr2"}
+    assert df_transaction["from"].dtype == "uint32"
+    assert db.address_table.labels(df_transaction["from"]) == ["addr1", "addr2"]
     assert graph.number_of_nodes() == 3
     assert graph.number_of_edges() == 2
+
+def test_get_transaction_incremental_cache():
+    """2回目以降の取得で最終ブロック以降の取引のみが追加されることのテスト"""
+    def relation(token_id, from_address, to_address, block_number):
+        return {
+            "tokenId": token_id,
+            "from": from_address,
+            "to": to_address,
+            "gasPrice": 100.0,
+            "gasUsed": 21000.0,
+            "contractAddress": "contract1",
+            "tokenUri": "uri",
+            "blockNumber": block_number,
+        }
+
+    first = [relation("1", "addr1", "addr2", 1000), relation("2", "addr2", "addr3", 1001)]
+    second = [relation("2", "addr2", "addr3", 1001), relation("3", "addr3", "addr4", 1002)]
+
+    db = Database.__new__(Database)  # driver接続を避けてメソッドだけ利用
+    db.driver = MagicMock()
+    session = db.driver.session.return_value.__enter__.return_value
+    session.execute_read.side_effect = [first, second[:1], second]
+    db.snapshot_cache = SnapshotCache()
+    db.address_table = AddressTable()
+
+    # 初回は全件取得
+    df_transaction, graph = db.get_transaction("contract1", fetch_mode="path")
+    assert session.execute_read.call_args.args[2] is None
+    assert len(df_transaction) == 2
+
+    # 新しい取引がない場合はキャッシュをそのまま返す(スナップショットを作り直さない)
+    snapshot = db.snapshot_cache.get("contract1")
+    cached_df, cached_graph = db.get_transaction("contract1", fetch_mode="path")
+    assert session.execute_read.call_args.args[2] == 1001
+    assert cached_df is df_transaction
+    assert cached_graph is graph
+    assert db.snapshot_cache.get("contract1") is snapshot
+
+    # 新しい取引がある場合は最終ブロック以降を追加
+    df_transaction, graph = db.get_transaction("contract1", fetch_mode="path")
+    assert session.execute_read.call_args.args[2] == 1001
+    assert sorted(df_transaction["tokenId"].tolist()) == ["1", "2", "3"]
+    assert graph.number_of_edges() == 3
+    assert cached_graph.number_of_edges() == 2
+
+    # メモリ使用量とエッジ数は差分から求めた値が全件から求めた値と一致する
+    merged = db.snapshot_cache.get("contract1")
+    assert merged.num_edges == 3
+    assert merged.size == Snapshot(merged.df_transaction, merged.graph).size
+
+
+def test_extend_graph_keeps_original():
+    """エッジを追加したグラフを作っても元のグラフが変わらないことのテスト"""
+    graph = nx.DiGraph([(1, 2), (2, 3), (4, 5)])
+
+    extended = extend_graph(graph, [(2, 4), (3, 6)])
+
+    assert sorted(extended.edges) == [(1, 2), (2, 3), (2, 4), (3, 6), (4, 5)]
+    assert sorted(graph.edges) == [(1, 2), (2, 3), (4, 5)]
+    assert 6 not in graph
+    assert sorted(extended.predecessors(4)) == [2]
+    assert list(graph.predecessors(4)) == []
+    # エッジを追加していないノードの辞書は共有する
+    assert extended._succ[4] is graph._succ[4]
+
+
+def test_snapshot_cache_eviction():
+    """スナップショットキャッシュの保持数上限による削除のテスト"""
+    cache = SnapshotCache(max_entries=2)
+    df_transaction = pd.DataFrame({"blockNumber": [1000]})
+    for contract_address in ["contract1", "contract2", "contract3"]:
+        cache.put(contract_address, Snapshot(df_transaction, nx.DiGraph()))
+
+    assert cache.get("contract1") is None
+    assert cache.get("contract2") is not None
+    assert cache.get("contract3") is not None
+
+
+def test_result_cache_bytes_limit():
+    """結果のキャッシュのメモリ使用量上限による削除のテスト"""
+    result = {"generate_graph": [[i, i + 1] for i in range(1000)]}
+    size = payload_bytes(result)
+    cache = ResultCache(max_bytes=size * 2)
+    for key in ["contract1", "contract2", "contract3"]:
+        cache.put((key,), result)
+
+    assert cache.get(("contract1",)) is None
+    assert cache.get(("contract2",)) is not None
+    assert cache.get(("contract3",)) is not None
+    assert cache.total_bytes == size * 2
+
+    # 上限を超える単一の結果は保持しない
+    cache.put(("large",), {"generate_graph": [[i, i + 1] for i in range(3000)]})
+    assert cache.get(("large",)) is None
+
+
+def test_fetch_transaction_columns():
+    """カラム形式の取得結果がDataFrameとグラフに変換されることのテスト"""
+    records = [
+        ("1", "addr1", "addr2", 100.0, 21000.0, "contract1", "uri1", 1000),
+        ("2", "addr2", "addr3", 200.0, 25000.0, "contract1", None, 1001),
+    ]
+    tx = Mock()
+    tx.run.return_value.fetch.side_effect = [records, []]
+
+    address_table = AddressTable()
+    df_transaction, graph = Database.fetch_transaction_columns(tx, "contract1", address_table=address_table)
+
+    assert list(df_transaction.columns) == [
+        "tokenId", "from", "to", "gasPrice", "gasUsed", "contractAddress", "tokenUri", "blockNumber"
+    ]
+    assert df_transaction["gasPrice"].dtype == "float32"
+    assert df_transaction["blockNumber"].dtype == "uint32"
+    assert df_transaction["from"].dtype == "uint32"
+    assert address_table.labels(df_transaction["from"]) == ["addr1", "addr2"]
+    assert df_transaction["tokenUri"].isna().tolist() == [False, True]
+    assert {tuple(address_table.labels(edge)) for edge in graph.edges} == {("addr1", "addr2"), ("addr2", "addr3")}
+
+
+def test_transform_data_matches_iterrows(sample_transaction_data):
+    """ベクトル化したエッジインデックスが行ごとの変換結果と一致することのテスト"""
+    df_transaction = pd.concat([sample_transaction_data] * 3, ignore_index=True).astype({"from": "string", "to": "string"})
+    df_transaction.loc[3, "from"] = "addr4"
+    df_feature = pd.DataFrame(
+        {"degree": [1.0, 2.0, 3.0, 4.0], "pagerank": [0.1, 0.2, 0.3, 0.4]},
+        index=["addr4", "addr3", "addr2", "addr1"]
+    )
+
+    # 従来の行ごとの変換
+    unique_nodes = pd.concat([df_transaction['from'], df_transaction['to']]).unique()
+    node_to_index = {node: idx for idx, node in enumerate(unique_nodes)}
+    expected_edge_index = torch.tensor(
+        [[node_to_index[row['from']], node_to_index[row['to']]] for _, row in df_transaction.iterrows()],
+        dtype=torch.long
+    ).t().contiguous()
+    expected_x = torch.tensor(df_feature.loc[unique_nodes].values, dtype=torch.float)
+
+    data = Database.transform_data(df_transaction=df_transaction, df_feature=df_feature)
+
+    assert data.edge_index.dtype == torch.long
+    assert torch.equal(data.edge_index, expected_edge_index)
+    assert torch.equal(data.x, expected_x)
+
+
+@patch('components.database.calculate_centrality')
+def test_get_centrality_reuses_result(mock_centrality, sample_transaction_data, sample_graph):
+    """同じグラフの中心性が特徴量とAPIの結果で共有されることのテスト"""
+    mock_centrality.return_value = {
+        'degree': {'addr1': 2.0, 'addr2': 2.0, 'addr3': 2.0},
+        'betweenness': {'addr1': 0.5, 'addr2': 0.5, 'addr3': 0.0},
+        'pagerank': {'addr1': 0.4, 'addr2': 0.3, 'addr3': 0.3}
+    }
+
+    database = Database('neo4j://graph-db:7687')
+    database.get_features(sample_transaction_data, sample_graph)
+    centrality = database.get_centrality(sample_graph)
+    assert centrality is mock_centrality.return_value
+    mock_centrality.assert_called_once_with(sample_graph)
+
+    # グラフが更新された場合は再計算する
+    updated_graph = sample_graph.copy()
+    updated_graph.add_edge('addr3', 'addr4')
+    database.get_centrality(updated_graph)
+    assert mock_centrality.call_count == 2
+
+@patch('components.database.calculate_centrality')
+def test_get_centrality_warm_starts_pagerank(mock_centrality, sample_graph):
+    """同じコントラクトのグラフが更新された場合に前回のPageRankを初期値にすることのテスト"""
+    pagerank = {'addr1': 0.4, 'addr2': 0.3, 'addr3': 0.3}
+    mock_centrality.return_value = {'degree': {}, 'betweenness': {}, 'pagerank': pagerank}
+    database = Database('neo4j://graph-db:7687')
+
+    database.get_centrality(sample_graph, contract_address="contract1")
+    assert "pagerank_start" not in mock_centrality.call_args.kwargs
+
+    updated_graph = sample_graph.copy()
+    updated_graph.add_edge('addr3', 'addr4')
+    database.get_centrality(updated_graph, contract_address="contract1")
+    assert mock_centrality.call_args.kwargs["pagerank_start"] is pagerank
+
+    # 別のコントラクトでは初期値を使わない
+    database.get_centrality(updated_graph.copy(), contract_address="contract2")
+    assert "pagerank_start" not in mock_centrality.call_args.kwargs
+
+
+def test_fetch_latest_transaction_falls_back_to_receiver():
+    """送信元の取引がない場合に受信先の最新の取引を返すことのテスト"""
+    record = Mock()
+    record.data.return_value = {"from": "addr1", "to": "addr2", "tokenUri": "uri1"}
+    tx = Mock()
+    tx.run.return_value.single.side_effect = [None, record]
+
+    result = Database.fetch_latest_transaction(tx, "contract1", "addr2")
+
+    assert result == {"from": "addr1", "to": "addr2", "tokenUri": "uri1"}
+    assert tx.run.call_count == 2
+    assert "(u:User {address: $address})-[r:TRANSFER]->" in tx.run.call_args_list[0].args[0]
+    assert "->(u:User {address: $address})" in tx.run.call_args_list[1].args[0]
+    assert tx.run.call_args.kwargs == {"contract_address": "contract1", "address": "addr2"}
+
+@patch('components.database.calculate_centrality')
+def test_build_feature_data_matches_pandas(mock_centrality, sample_transaction_data, sample_graph):
+    """1回の走査で作成した特徴量が従来のpandasの集計と標準化の結果と一致することのテスト"""
+    mock_centrality.return_value = {
+        'degree': {'addr1': 0.0, 'addr2': 0.5, 'addr3': 1.0},
+        'betweenness': {'addr1': 0.0, 'addr2': 0.5, 'addr3': 0.0},
+        'pagerank': {'addr1': 0.2, 'addr2': 0.3, 'addr3': 0.5}
+    }
+    df_transaction = pd.concat([sample_transaction_data] * 2, ignore_index=True)
+    df_transaction.loc[3, "from"] = "addr3"
+    graph = sample_graph.copy()
+    graph.add_edge("addr3", "addr2")
+    database = Database('neo4j://graph-db:7687')
+
+    # 従来の集計と標準化
+    expected = database.get_features(df_transaction, graph)
+    expected = (expected - expected.mean()) / expected.std(ddof=0).replace(0, 1)
+    expected_data = Database.transform_data(df_transaction, expected)
+
+    df_feature, data = database.build_feature_data(df_transaction, graph)
+
+    assert list(df_feature.index) == ["addr1", "addr2", "addr3"]
+    pd.testing.assert_frame_equal(df_feature, expected.loc[df_feature.index].astype("float32"), rtol=1e-5)
+    assert data.x.dtype == torch.float32
+    assert torch.allclose(data.x, expected_data.x, atol=1e-5)
+    assert torch.equal(data.edge_index, expected_data.edge_index)
+
+
+def test_address_table_round_trip():
+    """アドレスがIDに変換され、チェックサム形式のまま文字列に戻ることのテスト"""
+    addresses = [
+        "0x76B50696B8EFFCA6Ee6Da7F6471110F334536321",
+        "0x0000000000000000000000000000000000000001",
+        "0x76b50696b8effca6ee6da7f6471110f334536321",
+        "addr1",
+    ]
+    address_table = AddressTable()
+
+    ids = address_table.intern(addresses + addresses[:2])
+
+    assert ids.dtype == "uint32"
+    assert ids.tolist() == [0, 1, 2, 3, 0, 1]
+    assert address_table.labels(ids) == addresses + addresses[:2]
+    assert address_table.get_ids(["addr1", "unknown"]) == [3]
+    assert address_table.get_id("0x76b50696b8effca6ee6da7f6471110f334536321") == 2
+
+    # 16進数のアドレスは文字列ではなくIDの順のN×20のuint8の配列と大文字の位置(N×5)で保持する
+    assert address_table.values.dtype == "uint8"
+    assert address_table.values[0].tobytes().hex() == addresses[0][2:].lower()
+    assert address_table.values[2].tobytes() == address_table.values[0].tobytes()
+    assert address_table.other_labels == {3: "addr1"}
+
+    # 上限を超える登録はエラー
+    with pytest.raises(AddressTableFullError):
+        AddressTable(max_size=1).intern(addresses[:2])
+
+
+def test_address_table_grows():
+    """配列とハッシュ表を拡張しても登録済みのIDが変わらないことのテスト"""
+    addresses = [f"0x{i:040x}" for i in range(5000)]
+    address_table = AddressTable()
+
+    first = address_table.intern(addresses[:100])
+    ids = address_table.intern(addresses[::-1])
+
+    assert len(address_table) == 5000
+    assert address_table.intern(addresses[:100]).tolist() == first.tolist() == list(range(100))
+    assert address_table.labels(ids) == addresses[::-1]
+    assert address_table.get_ids(addresses) == address_table.intern(addresses).tolist()
+    assert len(address_table.slots) >= 2 * len(address_table)
+
+
+def test_reset_address_table_when_full():
+    """対応表の登録数が上限に達した場合に、対応表とIDを使うキャッシュを作り直して取得し直すことのテスト"""
+    def relations(start):
+        # 4つのアドレスが順に送信する取引
+        return [
+            {"tokenId": str(i), "from": f"0x{i:040x}", "to": f"0x{i + 1:040x}", "gasPrice": 1.0, "gasUsed": 1.0,
+             "contractAddress": "contract", "tokenUri": "uri", "blockNumber": i}
+            for i in range(start, start + 3)
+        ]
+
+    db = Database.__new__(Database)  # driver接続を避けてメソッドだけ利用
+    db.driver = MagicMock()
+    session = db.driver.session.return_value.__enter__.return_value
+    db.snapshot_cache = SnapshotCache()
+    db.pagerank_cache = ResultCache()
+    db.address_table = AddressTable(max_size=6)
+    db.address_table_lock = threading.Lock()
+
+    # カラム形式の取得と同じく、指定した対応表でアドレスをIDに変換する
+    def execute_read(function, contract_address, from_block, address_table):
+        df_transaction = pd.DataFrame(relations(0 if contract_address == "contract1" else 10))
+        for column in ["from", "to"]:
+            df_transaction[column] = address_table.intern(df_transaction[column])
+        return df_transaction, Database.build_graph(df_transaction)
+    session.execute_read.side_effect = execute_read
+
+    _, _, first_table = db.get_transaction_with_table("contract1")
+    db.pagerank_cache.put(("contract1",), {0: 1.0})
+    assert len(first_table) == 4
+
+    # contract2の登録で上限を超えるため、対応表を作り直してキャッシュを削除する
+    df_transaction, _, address_table = db.get_transaction_with_table("contract2")
+    assert address_table is db.address_table is not first_table
+    assert address_table.generation != first_table.generation
+    assert address_table.labels(df_transaction["from"]) == [f"0x{i:040x}" for i in range(10, 13)]
+    assert len(address_table) == 4
+    assert db.snapshot_cache.get("contract1") is None
+    assert db.snapshot_cache.get("contract2") is not None
+    assert db.pagerank_cache.get(("contract1",)) is None
+
+    # 作り直す前の対応表を使う取得はキャッシュを使わない
+    db.get_transaction("contract1", address_table=first_table)
+    assert db.snapshot_cache.get("contract1") is None
@@ -1,9 +1,17 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
 import pytest
 import pandas as pd
 import torch
 from torch_geometric.data import Data
+from torch_geometric.nn import VGAE
 from components.database import Database
-from components.generate import generate
+from components.address import AddressTable
+from components import generate as generate_module
+from components.generate import generate, decode_edges, filter_result, label_result
+from components.model import GraphEncoder
+from components.registry import ModelRegistry
 
 @pytest.fixture
 def mock_data():
@@ -54,3 +62,136 @@ def test_generate_database(mock_database):
     # 結果の検証
     assert isinstance(result, list)
     assert all(isinstance(edge, list) and len(edge) == 2 for edge in result)
+
+def test_decode_edges_matches_dense():
+    """行ブロックごとのデコード結果が密行列の閾値処理と一致することのテスト"""
+    torch.manual_seed(0)
+    z = torch.randn(50, 4)
+    threshold = 0.7
+    dense = (torch.sigmoid(z @ z.t()) > threshold).nonzero(as_tuple=False).t()
+    dense_edges = set(map(tuple, dense.t().tolist()))
+
+    # エッジ数が候補数以上の場合は全ての候補を返す
+    edges = decode_edges(z, threshold=threshold, num_edges=dense.size(1) + 10, block_bytes=7 * 50 * 4)
+    assert set(map(tuple, edges.t().tolist())) == dense_edges
+    assert edges.size(1) == dense.size(1)
+
+    # エッジ数が候補数より少ない場合は候補から重複なく選択する
+    edges = decode_edges(z, threshold=threshold, num_edges=20, block_bytes=7 * 50 * 4)
+    sampled_edges = list(map(tuple, edges.t().tolist()))
+    assert len(sampled_edges) == 20
+    assert len(set(sampled_edges)) == 20
+    assert set(sampled_edges) <= dense_edges
+
+def test_model_registry_reload(tmp_path):
+    """モデルレジストリがモデルを共有し、チェックポイントの更新時に再ロードすることのテスト"""
+    path = tmp_path / "best_model.pt"
+    model = VGAE(GraphEncoder(in_channels=6, out_channels=6))
+    torch.save({'model_state_dict': model.state_dict()}, path)
+
+    registry = ModelRegistry(path=str(path))
+    first = registry.get(6)
+    assert registry.get(6) is first
+    assert not first.training
+
+    # チェックポイントが更新された場合は再ロードする
+    torch.save({'model_state_dict': model.state_dict()}, path)
+    os.utime(path, ns=(0, registry.version + 1))
+    assert registry.get(6) is not first
+
+def test_generate_concurrent_shared_model(tmp_path, monkeypatch):
+    """共有したモデルで大きさの異なるグラフを同時に生成しても、他のグラフの潜在表現が混ざらないことのテスト"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    torch.manual_seed(0)
+    model = VGAE(GraphEncoder(in_channels=6, out_channels=6))
+    model.eval()
+    monkeypatch.setattr(generate_module.model_registry, "get", lambda in_channels: model)
+
+    def make_graph(prefix: str, num_nodes: int):
+        df_feature = pd.DataFrame(torch.rand(num_nodes, 6).numpy(), index=[f"{prefix}{i}" for i in range(num_nodes)])
+        edge_index = torch.stack([torch.arange(num_nodes), (torch.arange(num_nodes) + 1) % num_nodes])
+        return df_feature, Data(x=torch.tensor(df_feature.values), edge_index=edge_index, num_nodes=num_nodes)
+
+    graphs = [make_graph("small", 20), make_graph("large", 400)]
+    options = {"betweenness_mode": "sample", "k": 2, "seed": 0}
+
+    def run(index: int) -> bool:
+        df_feature, data = graphs[index % 2]
+        result = generate(df_feature=df_feature, data=data, centrality_options=options)
+        return all(source in df_feature.index and target in df_feature.index for source, target in result["edges_list"])
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert all(executor.map(run, range(20)))
+    # 共有したモデルの状態(VGAE.encodeが書き込む__mu__)を書き換えない
+    assert not hasattr(model, "__mu__")
+
+    # 推論モードのencodeと同じ潜在表現を使う
+    _, data = graphs[0]
+    with torch.no_grad():
+        mu, _ = model.encoder(data.x, data.edge_index)
+        assert torch.equal(mu, model.encode(data.x, data.edge_index))
+
+def test_generate_csv_uses_addresses(tmp_path, monkeypatch):
+    """生成したエッジリストのCSVにIDではなくアドレスを保存することのテスト"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    torch.manual_seed(0)
+    model = VGAE(GraphEncoder(in_channels=6, out_channels=6))
+    model.eval()
+    monkeypatch.setattr(generate_module.model_registry, "get", lambda in_channels: model)
+
+    address_table = AddressTable()
+    addresses = [f"0x{i:040X}" for i in range(10)]
+    node_ids = address_table.intern(addresses)
+    df_feature = pd.DataFrame(torch.rand(10, 6).numpy(), index=node_ids)
+    edge_index = torch.stack([torch.arange(10), (torch.arange(10) + 1) % 10])
+    data = Data(x=torch.tensor(df_feature.values), edge_index=edge_index, num_nodes=10)
+
+    result = generate(df_feature=df_feature, data=data, address_table=address_table)
+
+    df_edges = pd.read_csv(tmp_path / "data" / "generated_network_edges.csv")
+    assert len(df_edges) == len(result["edges_list"]) > 0
+    assert set(df_edges["source"]) | set(df_edges["target"]) <= set(addresses)
+    assert df_edges.values.tolist() == [address_table.labels(edge) for edge in result["edges_list"]]
+
+def test_filter_result_by_addresses_and_metrics():
+    """指定したアドレスと指標のみに結果を絞り込むことのテスト"""
+    nodes = [f"0x{i:040x}" for i in range(1000)]
+    centrality = {
+        metric: {node: i / 1000 for i, node in enumerate(nodes)} for metric in ["degree", "betweenness", "pagerank"]
+    }
+    centrality["average"] = {"degree": 0.5, "betweenness": 0.5, "pagerank": 0.5}
+    result = {
+        "message": "Generation finished",
+        "centrality": centrality,
+        "predict_centrality": centrality,
+        "generate_graph": [[nodes[i], nodes[(i + 1) % 1000]] for i in range(1000)]
+    }
+
+    filtered = filter_result(result, addresses=[nodes[0], nodes[5]], metrics=["pagerank"])
+
+    assert filtered["centrality"] == {
+        "pagerank": {nodes[0]: 0.0, nodes[5]: 0.005},
+        "average": {"pagerank": 0.5}
+    }
+    assert filtered["generate_graph"] == [[nodes[0], nodes[1]], [nodes[4], nodes[5]], [nodes[5], nodes[6]], [nodes[999], nodes[0]]]
+    assert len(json.dumps(filtered)) < len(json.dumps(result)) / 100
+    assert filter_result(result) is result
+    assert len(result["centrality"]["degree"]) == 1000  # キャッシュされた結果は変更しない
+
+def test_label_result():
+    """結果のアドレスのIDが文字列に戻ることのテスト"""
+    address_table = AddressTable()
+    ids = address_table.intern(["0xAb00000000000000000000000000000000000001", "0x0000000000000000000000000000000000000002"]).tolist()
+    centrality = {"pagerank": {ids[0]: 0.6, ids[1]: 0.4}, "average": {"pagerank": 0.5}}
+    result = {"centrality": centrality, "predict_centrality": centrality, "generate_graph": [[ids[0], ids[1]]]}
+
+    labeled = label_result(result, address_table)
+
+    assert labeled["centrality"]["pagerank"] == {
+        "0xAb00000000000000000000000000000000000001": 0.6,
+        "0x0000000000000000000000000000000000000002": 0.4
+    }
+    assert labeled["centrality"]["average"] == {"pagerank": 0.5}
+    assert labeled["generate_graph"] == [["0xAb00000000000000000000000000000000000001", "0x0000000000000000000000000000000000000002"]]
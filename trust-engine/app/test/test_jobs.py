@@ -0,0 +1,94 @@
+import os
+import threading
+from components.jobs import JobManager
+
+# ワーカープロセスごとの状態(プロセスで実行する関数はモジュールの最上位に定義する)
+worker_state = {}
+
+def init_worker_state(value):
+    worker_state["value"] = value
+
+def read_worker_state():
+    return {"value": worker_state["value"], "pid": os.getpid()}
+
+def test_job_manager_long_poll():
+    """ジョブの投入とロングポーリングによる結果取得のテスト"""
+    job_manager = JobManager(max_workers=1)
+    event = threading.Event()
+
+    def run(value):
+        event.wait()
+        return {"value": value}
+
+    job_id = job_manager.submit(run, 1)
+    assert job_manager.get(job_id)["status"] in ["pending", "running"]
+
+    event.set()
+    job = job_manager.get(job_id, wait_seconds=5)
+    assert job == {"job_id": job_id, "status": "finished", "result": {"value": 1}}
+    job_manager.shutdown()
+
+def test_job_manager_failed_job():
+    """失敗したジョブと存在しないジョブの取得のテスト"""
+    job_manager = JobManager(max_workers=1)
+
+    def run():
+        raise RuntimeError("failed")
+
+    job_id = job_manager.submit(run)
+    job = job_manager.get(job_id, wait_seconds=5)
+    assert job["status"] == "failed"
+    assert job["error"] == "failed"
+    assert job_manager.get("unknown") is None
+    job_manager.shutdown()
+
+def test_job_manager_as_completed():
+    """完了した順にジョブの結果が返ることのテスト"""
+    job_manager = JobManager(max_workers=2)
+    event = threading.Event()
+
+    def run(value):
+        if value == "slow":
+            event.wait()
+        return {"value": value}
+
+    def fail():
+        raise ValueError("error")
+
+    job_ids = [job_manager.submit(run, "slow"), job_manager.submit(run, "fast")]
+    results = job_manager.as_completed(job_ids)
+    assert next(results)["result"] == {"value": "fast"}
+    event.set()
+    assert next(results)["result"] == {"value": "slow"}
+
+    failed_id = job_manager.submit(fail)
+    assert list(job_manager.as_completed([failed_id])) == [{"job_id": failed_id, "status": "failed", "error": "error"}]
+    job_manager.shutdown()
+
+def test_job_manager_as_completed_timeout():
+    """timeoutまでに完了しなかったジョブと削除済みのジョブも状態を返すことのテスト"""
+    job_manager = JobManager(max_workers=1)
+    event = threading.Event()
+    job_ids = [job_manager.submit(event.wait), job_manager.submit(lambda: {"value": "queued"})]
+
+    jobs = list(job_manager.as_completed(job_ids + ["unknown"], timeout=0.1))
+
+    assert jobs[0] == {"job_id": "unknown", "status": "not_found"}
+    assert {job["job_id"]: (job["status"], job["timeout"]) for job in jobs[1:]} == {
+        job_ids[0]: ("running", True),
+        job_ids[1]: ("pending", True)
+    }
+    event.set()
+    job_manager.shutdown()
+
+def test_job_manager_processes():
+    """ワーカープロセスで初期化した状態を使ってジョブを実行することのテスト"""
+    job_manager = JobManager(max_workers=2, processes=True, initializer=init_worker_state, initargs=("initialized",))
+
+    job_ids = [job_manager.submit(read_worker_state) for _ in range(4)]
+    jobs = list(job_manager.as_completed(job_ids, timeout=60))
+
+    assert len(jobs) == 4
+    assert all(job["status"] == "finished" and job["result"]["value"] == "initialized" for job in jobs)
+    assert all(job["result"]["pid"] != os.getpid() for job in jobs)
+    job_manager.shutdown()
@@ -1,7 +1,13 @@
+import logging
+import random
 import pytest
 import torch
+import torch_geometric.typing
 from torch_geometric.data import Data
-from components.train import train
+from torch_geometric.nn import VGAE
+from torch_geometric.utils import k_hop_subgraph
+from components.model import GraphEncoder
+from components.train import train, save_checkpoint, evaluate_loss, load_warm_start
 from components.database import Database
 
 @pytest.fixture
@@ -23,6 +29,55 @@ def test_train(mock_data):
     data = mock_data
     train(data, epoch_num=10)
 
+@pytest.mark.skipif(
+    not (torch_geometric.typing.WITH_PYG_LIB or torch_geometric.typing.WITH_TORCH_SPARSE),
+    reason="近傍サンプリングにはpyg-libまたはtorch-sparseが必要"
+)
+def test_train_minibatch(mock_data):
+    """ミニバッチ学習のテスト"""
+    data = mock_data
+    train(data, epoch_num=2, mode="minibatch", batch_size=2)
+
+class SubgraphLinkLoader:
+    """
+    LinkNeighborLoaderの代わりに、取引の周辺をk_hop_subgraphで取り出してバッチを作るローダー
+    pyg-libやtorch-sparseがない環境でもミニバッチ学習の処理を通すために使う
+    """
+    instances = []
+
+    def __init__(self, data, num_neighbors, edge_label_index, batch_size, shuffle):
+        self.data = data
+        self.num_neighbors = num_neighbors
+        self.edge_label_index = edge_label_index
+        self.batch_size = batch_size
+        self.batches = 0
+        SubgraphLinkLoader.instances.append(self)
+
+    def __iter__(self):
+        for start in range(0, self.edge_label_index.size(1), self.batch_size):
+            edge_label_index = self.edge_label_index[:, start:start + self.batch_size]
+            subset, edge_index, mapping, _ = k_hop_subgraph(
+                edge_label_index.flatten(), len(self.num_neighbors), self.data.edge_index,
+                relabel_nodes=True, num_nodes=self.data.num_nodes
+            )
+            self.batches += 1
+            yield Data(x=self.data.x[subset], edge_index=edge_index, edge_label_index=mapping.view(2, -1))
+
+def test_train_minibatch_without_sampler(mock_data, tmp_path, monkeypatch):
+    """近傍サンプリングのライブラリがない環境でもミニバッチ学習の処理が動くことのテスト"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    SubgraphLinkLoader.instances.clear()
+    monkeypatch.setattr("components.train.LinkNeighborLoader", SubgraphLinkLoader)
+
+    train(mock_data, epoch_num=2, mode="minibatch", batch_size=2)
+
+    loader, = SubgraphLinkLoader.instances
+    assert torch.equal(loader.edge_label_index, mock_data.edge_index)
+    assert loader.batches == 4  # 3件の取引を2件ずつ、2エポック
+    checkpoint = torch.load(tmp_path / "data" / "best_model.pt")
+    assert "eval_loss" in checkpoint
+
 def test_train_for_validation(mock_database):
     """学習関数のテスト(DBからのデータ取得)"""
     database = mock_database
@@ -30,3 +85,75 @@ def test_train_for_validation(mock_database):
     df_feature = database.get_features(df_transaction, graph)
     data = database.transform_data(df_transaction, df_feature)
     train(data, epoch_num=10)
+
+def test_train_early_stopping(mock_data, tmp_path, monkeypatch, caplog):
+    """損失が改善しない場合に学習を打ち切り、ベストモデルを1回だけ保存することのテスト"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    saved = []
+    monkeypatch.setattr("components.train.save_checkpoint", lambda checkpoint: saved.append(checkpoint["epoch"]))
+    monkeypatch.setattr("components.train.train_full_epoch", lambda model, optimizer, data: (1.0, 3))
+
+    with caplog.at_level("INFO", logger="components.train"):
+        train(mock_data, epoch_num=100, patience=5, checkpoint_interval=3600)
+
+    assert saved == [1]
+    assert "Epoch: 6," in caplog.text
+    assert "Epoch: 7," not in caplog.text
+
+def test_checkpoint_records_eval_loss(mock_data, tmp_path, monkeypatch):
+    """チェックポイントに推論モードの損失を記録し、同じグラフでは同じ値になることのテスト"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    train(mock_data, epoch_num=5)
+
+    checkpoint = torch.load(tmp_path / "data" / "best_model.pt")
+    model = VGAE(GraphEncoder(in_channels=6, out_channels=6))
+    model.load_state_dict(checkpoint["model_state_dict"])
+    assert checkpoint["eval_loss"] == evaluate_loss(model, mock_data)
+
+    # チェックポイントに推論モードの損失がない場合は全体学習にする
+    del checkpoint["eval_loss"]
+    save_checkpoint(checkpoint, str(tmp_path / "data" / "best_model.pt"))
+    assert load_warm_start(mock_data, torch.device("cpu"), logging.getLogger(__name__)) is None
+
+def test_save_checkpoint_atomic(tmp_path):
+    """チェックポイントが一時ファイルを残さずに置き換わることのテスト"""
+    path = tmp_path / "best_model.pt"
+    save_checkpoint({"epoch": 1}, str(path))
+    save_checkpoint({"epoch": 2}, str(path))
+
+    assert torch.load(path)["epoch"] == 2
+    assert [file.name for file in tmp_path.iterdir()] == ["best_model.pt"]
+
+def test_train_warm_start(mock_data, tmp_path, monkeypatch, caplog):
+    """前回のチェックポイントから追加学習し、特徴量の次元数が変わった場合は全体学習にすることのテスト"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    random.seed(0)
+    torch.manual_seed(0)
+    with caplog.at_level("INFO", logger="components.train"):
+        train(mock_data, epoch_num=5, warm_start=True)
+        assert "Warm Start Skipped: No checkpoint" in caplog.text
+        caplog.clear()
+
+        # 取引を1件追加して追加学習
+        data = Data(x=mock_data.x, edge_index=torch.tensor([[0, 1, 2, 3], [1, 2, 0, 4]], dtype=torch.long))
+        train(data, epoch_num=100, warm_start=True, warm_start_epochs=3, patience=None)
+        assert "Train Type: incremental" in caplog.text
+        assert "Epoch: 3," in caplog.text and "Epoch: 4," not in caplog.text
+        caplog.clear()
+
+        # 保存時の推論モードの損失から大きく悪化した場合(ドリフト)
+        data = Data(x=mock_data.x * 100, edge_index=data.edge_index)
+        train(data, epoch_num=5, warm_start=True)
+        assert "Drift detected" in caplog.text
+        assert "Train Type: full" in caplog.text
+        caplog.clear()
+
+        # 特徴量の次元数が変わった場合
+        data = Data(x=torch.randn(10, 7), edge_index=data.edge_index)
+        train(data, epoch_num=5, warm_start=True)
+        assert "Feature dimension changed" in caplog.text
+        assert "Train Type: full" in caplog.text
+    assert torch.load(tmp_path / "data" / "best_model.pt")["in_channels"] == 7
@@ -0,0 +1,43 @@
+"""
+Contract.fetch_tokensのガス代の取得方法ごとの処理時間を比較するベンチマーク
+
+スタブノードを起動し、ログごとに取得する従来の方法とバッチリクエストでまとめて取得する方法を比較する
+    python -m benchmark.fetch_tokens --transfers 2000 --latency 0.005
+"""
+import argparse
+import os
+import sys
+import time
+
+# 親ディレクトリをPythonパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from components.tools.contract import Contract
+from benchmark.stub_node import StubChain, serve, TOKEN_CONTRACT_ADDRESS, SCORING_CONTRACT_ADDRESS
+
+# ベンチマーク用の秘密鍵(Hardhatのテストアカウント)
+PRIVATE_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transfers", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    server = serve(StubChain(args.transfers), latency=args.latency)
+    contract = Contract(
+        rpc_url=f"http://127.0.0.1:{server.server_port}",
+        token_contract_address=TOKEN_CONTRACT_ADDRESS,
+        scoring_contract_address=SCORING_CONTRACT_ADDRESS,
+        private_key=PRIVATE_KEY
+    )
+    results = {}
+    for fetch_mode in ["sequential", "batch"]:
+        start = time.perf_counter()
+        results[fetch_mode] = contract.fetch_tokens(fetch_mode=fetch_mode, batch_size=args.batch_size)
+        print(f"{fetch_mode}: {len(results[fetch_mode])} tokens, {time.perf_counter() - start:.3f} s")
+    assert results["sequential"] == results["batch"]
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+信用スコアの登録方法ごとの処理時間を比較するベンチマーク
+
+スタブノードを起動し、1件ずつ確定を待って登録する方法と
+全てのトランザクションを連続して送信してからまとめて確定を待つ方法を比較する
+最後に一部のスコアのみを変更して再登録し、変更のないアドレスへの書き込みが省略されることを確認する
+    python -m benchmark.regist_scores --addresses 51 --block-time 0.5
+"""
+import argparse
+import os
+import sys
+import time
+
+# 親ディレクトリをPythonパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from components.tools.contract import Contract
+from benchmark.stub_node import StubChain, serve, TOKEN_CONTRACT_ADDRESS, SCORING_CONTRACT_ADDRESS
+from benchmark.fetch_tokens import PRIVATE_KEY
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--addresses", type=int, default=51)
+    parser.add_argument("--block-time", type=float, default=0.5)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    chain = StubChain(0, num_accounts=args.addresses, block_time=args.block_time)
+    server = serve(chain, latency=args.latency)
+    contract = Contract(
+        rpc_url=f"http://127.0.0.1:{server.server_port}",
+        token_contract_address=TOKEN_CONTRACT_ADDRESS,
+        scoring_contract_address=SCORING_CONTRACT_ADDRESS,
+        private_key=PRIVATE_KEY
+    )
+    scores = {contract.w3.to_checksum_address(address): i / args.addresses for i, address in enumerate(chain.accounts)}
+
+    start = time.perf_counter()
+    for address, score in scores.items():
+        contract.regist_scores({address: score}, skip_unchanged=False)
+    print(f"sequential: {len(scores)} scores, {time.perf_counter() - start:.3f} s")
+
+    start = time.perf_counter()
+    results = contract.regist_scores(scores, skip_unchanged=False)
+    failures = sum(result["status"] == "failed" for result in results.values())
+    print(f"pipelined: {len(scores)} scores, {failures} failures, {time.perf_counter() - start:.3f} s")
+
+    # 1割のスコアのみを変更して再登録
+    contract.rating_cache.clear()
+    changed = {address: score + 0.01 if i % 10 == 0 else score for i, (address, score) in enumerate(scores.items())}
+    start = time.perf_counter()
+    results = contract.regist_scores(changed)
+    skipped = sum(result["status"] == "skipped" for result in results.values())
+    print(f"skip unchanged: {len(scores)} scores, {skipped} skipped, {time.perf_counter() - start:.3f} s")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
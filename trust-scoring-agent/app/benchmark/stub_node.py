@@ -0,0 +1,203 @@
+"""
+ベンチマーク用のAnvil/Hardhat互換のスタブノード
+
+ERC721のTransferイベントと、そのトランザクション・レシートを返すJSON-RPCサーバー
+HTTPリクエストごとにlatency秒の遅延を入れ、ネットワーク越しのRPCノードを模擬する
+送信されたトランザクションはblock_time秒ごとのブロックで確定する(Anvilのインターバルマイニングと同様)
+"""
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import rlp
+from eth_utils import keccak
+
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+TOKEN_CONTRACT_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+SCORING_CONTRACT_ADDRESS = "0xe7f1725E7734CE288F8367e1Bb143E90bb3F0512"
+
+def to_hex(value: int) -> str:
+    return hex(value)
+
+def pad(value: str | int) -> str:
+    value = int(value, 16) if isinstance(value, str) else value
+    return "0x" + format(value, "064x")
+
+class StubChain:
+    """
+    スタブノードが返すチェーンの状態
+    """
+    def __init__(self, num_transfers: int, num_accounts: int = 100, transfers_per_block: int = 5, block_time: float = 1.0, seed: int = 0):
+        rng = random.Random(seed)
+        self.block_time = block_time
+        self.sent = {}
+        self.ratings = {}
+        self.lock = threading.Lock()
+        self.accounts = ["0x" + format(rng.getrandbits(160), "040x") for _ in range(num_accounts)]
+        self.logs = []
+        self.transactions = {}
+        for i in range(num_transfers):
+            block_number = i // transfers_per_block + 1
+            transaction_hash = pad(rng.getrandbits(256))
+            from_address, to_address = rng.sample(self.accounts, 2)
+            self.logs.append({
+                "address": TOKEN_CONTRACT_ADDRESS,
+                "topics": [TRANSFER_TOPIC, pad(from_address), pad(to_address), pad(i)],
+                "data": "0x",
+                "blockNumber": to_hex(block_number),
+                "blockHash": pad(block_number),
+                "transactionHash": transaction_hash,
+                "transactionIndex": "0x0",
+                "logIndex": to_hex(i % transfers_per_block),
+                "removed": False,
+            })
+            self.transactions[transaction_hash] = {
+                "from": from_address,
+                "to": TOKEN_CONTRACT_ADDRESS,
+                "blockNumber": to_hex(block_number),
+                "gasPrice": to_hex(rng.randint(1, 100) * 10 ** 9),
+                "gasUsed": to_hex(rng.randint(21000, 200000)),
+            }
+        self.block_number = num_transfers // transfers_per_block + 1
+
+    def get_logs(self, params: dict) -> list:
+        from_block = int(params.get("fromBlock", "0x0"), 16)
+        to_block = params.get("toBlock", "latest")
+        to_block = self.block_number if to_block == "latest" else int(to_block, 16)
+        return [log for log in self.logs if from_block <= int(log["blockNumber"], 16) <= to_block]
+
+    def get_transaction(self, transaction_hash: str) -> dict:
+        tx = self.transactions[transaction_hash]
+        return {
+            "hash": transaction_hash,
+            "from": tx["from"],
+            "to": tx["to"],
+            "blockNumber": tx["blockNumber"],
+            "blockHash": pad(int(tx["blockNumber"], 16)),
+            "transactionIndex": "0x0",
+            "gasPrice": tx["gasPrice"],
+            "gas": "0x493e0",
+            "nonce": "0x0",
+            "value": "0x0",
+            "input": "0x",
+            "type": "0x0",
+            "chainId": "0x7a69",
+            "v": "0x1b",
+            "r": pad(1),
+            "s": pad(1),
+        }
+
+    def send_raw_transaction(self, raw_transaction: str) -> str:
+        # 次のブロックの時刻に確定させる
+        transaction_hash = "0x" + keccak(hexstr=raw_transaction).hex()
+        with self.lock:
+            self.sent[transaction_hash] = math.ceil(time.time() / self.block_time) * self.block_time
+
+            # rate(address, int8)の呼び出しであれば評価値を更新する(レガシートランザクションのみ対応)
+            data = rlp.decode(bytes.fromhex(raw_transaction[2:]))[5]
+            if data[:4] == keccak(text="rate(address,int8)")[:4]:
+                address = "0x" + data[4:36][-20:].hex()
+                self.ratings[address] = int.from_bytes(data[36:68], "big", signed=True)
+        return transaction_hash
+
+    def call(self, params: dict) -> str:
+        # ratingOf(address)の呼び出しのみ対応
+        data = bytes.fromhex(params.get("data", params.get("input"))[2:])
+        if data[:4] != keccak(text="ratingOf(address)")[:4]:
+            raise ValueError("Unsupported call")
+        rating = self.ratings.get("0x" + data[4:36][-20:].hex(), 0)
+        return "0x" + rating.to_bytes(32, "big", signed=True).hex()
+
+    def get_sent_receipt(self, transaction_hash: str) -> dict | None:
+        if time.time() < self.sent[transaction_hash]:
+            return None
+        return {
+            "transactionHash": transaction_hash,
+            "from": self.accounts[0],
+            "to": SCORING_CONTRACT_ADDRESS,
+            "blockNumber": to_hex(self.block_number),
+            "blockHash": pad(self.block_number),
+            "transactionIndex": "0x0",
+            "gasUsed": "0xc350",
+            "cumulativeGasUsed": "0xc350",
+            "effectiveGasPrice": to_hex(50 * 10 ** 9),
+            "contractAddress": None,
+            "logs": [],
+            "logsBloom": "0x" + "00" * 256,
+            "status": "0x1",
+            "type": "0x0",
+        }
+
+    def get_transaction_receipt(self, transaction_hash: str) -> dict | None:
+        if transaction_hash in self.sent:
+            return self.get_sent_receipt(transaction_hash)
+        tx = self.transactions[transaction_hash]
+        return {
+            "transactionHash": transaction_hash,
+            "from": tx["from"],
+            "to": tx["to"],
+            "blockNumber": tx["blockNumber"],
+            "blockHash": pad(int(tx["blockNumber"], 16)),
+            "transactionIndex": "0x0",
+            "gasUsed": tx["gasUsed"],
+            "cumulativeGasUsed": tx["gasUsed"],
+            "effectiveGasPrice": tx["gasPrice"],
+            "contractAddress": None,
+            "logs": [],
+            "logsBloom": "0x" + "00" * 256,
+            "status": "0x1",
+            "type": "0x0",
+        }
+
+    def handle(self, method: str, params: list):
+        if method == "web3_clientVersion":
+            return "stub-node/0.1"
+        elif method == "eth_chainId":
+            return "0x7a69"
+        elif method == "eth_blockNumber":
+            return to_hex(self.block_number)
+        elif method == "eth_getLogs":
+            return self.get_logs(params[0])
+        elif method == "eth_getTransactionByHash":
+            return self.get_transaction(params[0])
+        elif method == "eth_getTransactionReceipt":
+            return self.get_transaction_receipt(params[0])
+        elif method == "eth_getTransactionCount":
+            return to_hex(len(self.sent))
+        elif method == "eth_sendRawTransaction":
+            return self.send_raw_transaction(params[0])
+        elif method == "eth_call":
+            return self.call(params[0])
+        raise ValueError(f"Unsupported method: {method}")
+
+def serve(chain: StubChain, latency: float = 0.005, port: int = 0) -> ThreadingHTTPServer:
+    """
+    スタブノードを別スレッドで起動する。server.server_portで割り当てられたポートを取得できる
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(latency)
+
+            def respond(request):
+                try:
+                    return {"jsonrpc": "2.0", "id": request["id"], "result": chain.handle(request["method"], request.get("params", []))}
+                except Exception as e:
+                    return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32601, "message": str(e)}}
+
+            response = [respond(request) for request in body] if isinstance(body, list) else respond(body)
+            payload = json.dumps(response).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
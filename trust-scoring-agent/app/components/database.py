@@ -1,7 +1,15 @@
+import logging
+import time
 from typing import List
 from neo4j import GraphDatabase
+from neo4j.exceptions import Neo4jError
 from components.models import Log
 
+# 一括登録で1回のクエリに含めるログ数
+INGEST_BATCH_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
 class Database:
     def __init__(self, url: str) -> None:
         self.driver = GraphDatabase.driver(url)
@@ -11,60 +19,76 @@ class Database:
             self.driver.close()
             self.driver = None
 
-    @staticmethod
-    def _create_addresses(tx, addresses: set) -> None:
-        addresses = list(addresses)
-        tx.run(
-            """
-            UNWIND $addresses AS address
-            MERGE (u:User {address: address})
-            """,
-            addresses=addresses
-        )
-
-    def save_address(self, logs: List[Log]) -> None:
+    def ensure_constraints(self) -> None:
         """
-        NFT取引ログからユーザーのアドレスを保存する
+        User.addressの一意制約と、取引の重複排除に使うインデックスを作成する
         """
-
-        # Logsのtoとfromアドレスの重複なしリストを作成する
-        unique_addresses = set()
-        for log in logs:
-            unique_addresses.add(log.from_address)
-            unique_addresses.add(log.to_address)
-
-        # 重複を排除したアドレスリストをデータベースに保存する
         with self.driver.session() as session:
-            session.execute_write(self._create_addresses, unique_addresses)
+            try:
+                session.run("CREATE CONSTRAINT user_address_unique IF NOT EXISTS FOR (u:User) REQUIRE u.address IS UNIQUE").consume()
+            except Neo4jError as e:
+                # 既存のデータに重複がある場合は制約を作成できない
+                logger.error(f"Error creating constraint on User.address: {e}")
+            session.run("CREATE INDEX transfer_key IF NOT EXISTS FOR ()-[r:TRANSFER]-() ON (r.transactionHash, r.tokenId)").consume()
 
     @staticmethod
-    def _create_relationship(tx, logs: List[Log]) -> None:
-        logs = [log.dict() for log in logs]
-
-        # 一括でTRANSFERリレーションシップを作成（重複チェック付き）
-        tx.run(
-            """
-            UNWIND $logs AS log
-            MATCH (from:User {address: log.from_address}), (to:User {address: log.to_address})
-            MERGE (from)-[:TRANSFER {
-                tokenId: log.token_id, 
-                contractAddress: log.contract_address, 
-                blockNumber: log.block_number,
-                gasPrice: log.gas_price,
-                gasUsed: log.gas_used,
-                tokenUri: log.token_uri
-            }]->(to)
-            """,
-            logs=logs
-        )
-        del logs
+    def _merge_logs(tx, batches: List[List[dict]]) -> None:
+        # ノードとエッジを同じトランザクション内でバッチごとに登録する
+        # 取引は(transactionHash, tokenId)で重複を排除する
+        # transactionHashを持たない以前のエッジは、同じ送信元・送信先・tokenId・コントラクト・ブロック番号であれば
+        # transactionHashを補完して同じ取引とみなす(過去のログを登録し直してもエッジが重複しない)
+        for batch in batches:
+            tx.run(
+                """
+                UNWIND $logs AS log
+                MERGE (from:User {address: log.from_address})
+                MERGE (to:User {address: log.to_address})
+                WITH from, to, log
+                OPTIONAL MATCH (from)-[legacy:TRANSFER {
+                    tokenId: log.token_id,
+                    contractAddress: log.contract_address,
+                    blockNumber: log.block_number
+                }]->(to)
+                WHERE legacy.transactionHash IS NULL
+                WITH from, to, log, head(collect(legacy)) AS legacy
+                FOREACH (edge IN CASE WHEN legacy IS NULL THEN [] ELSE [legacy] END |
+                    SET edge.transactionHash = log.transaction_hash
+                )
+                WITH from, to, log
+                MERGE (from)-[r:TRANSFER {transactionHash: log.transaction_hash, tokenId: log.token_id}]->(to)
+                ON CREATE SET
+                    r.contractAddress = log.contract_address,
+                    r.blockNumber = log.block_number,
+                    r.gasPrice = log.gas_price,
+                    r.gasUsed = log.gas_used,
+                    r.tokenUri = log.token_uri
+                """,
+                logs=batch
+            ).consume()
 
-    def save_relationship(self, logs: List[Log]) -> None:
+    def save_logs(self, logs: List[Log], batch_size: int = INGEST_BATCH_SIZE) -> dict:
         """
-        NFT取引ログからユーザー間のエッジを保存する
+        NFT取引ログのアドレスとエッジを1つの書き込みトランザクションで一括登録し、処理件数と1秒あたりの件数を返す
         """
+        start = time.perf_counter()
+
+        # 同じ取引の重複を排除
+        unique_logs = {}
+        for log in logs:
+            unique_logs[(log.transaction_hash, log.token_id)] = log.model_dump()
+        rows = list(unique_logs.values())
+        batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+
         with self.driver.session() as session:
-            session.execute_write(self._create_relationship, logs)
+            session.execute_write(self._merge_logs, batches)
+
+        seconds = time.perf_counter() - start
+        return {
+            "rows": len(rows),
+            "duplicates": len(logs) - len(rows),
+            "seconds": seconds,
+            "rows_per_second": len(rows) / seconds if seconds > 0 else 0.0
+        }
 
     @staticmethod
     def _get_node(tx, contract_address: str):
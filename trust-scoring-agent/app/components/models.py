@@ -31,6 +31,7 @@ class AuthRequestBody(BaseModel):
     contract_address: str = Field(..., description="The address of the contract for which authentication is requested.")
     from_address: str = Field(..., description="The address of the user to authenticate.")
     to_address_list: List[str] = Field(..., description="The addresses of the users to authenticate.")
+    score_mode: Literal["generate", "personalized"] = Field("generate", description="How to score the users: network generation or personalized PageRank from from_address.")
 
 class User(BaseModel):
     """
@@ -1,15 +1,109 @@
+import logging
+import threading
+import time
 from web3 import Web3
 from eth_account import Account
+from hexbytes import HexBytes
 from .abi import token_abi, scoring_abi
+from .log_store import LogStore
+
+# 1回のバッチリクエストでガス代を取得するトランザクション数
+RECEIPT_BATCH_SIZE = 100
+
+# ログを同期する際に1回のget_logsで取得するブロック数
+SYNC_CHUNK_SIZE = 2000
+
+# 再編成に備えて毎回再取得するブロック数
+CONFIRMATIONS = 12
+
+# 登録済みの信用スコアをキャッシュする秒数(他のエージェントが更新した値を読み直す間隔)
+RATING_CACHE_TTL = 60
+
+logger = logging.getLogger(__name__)
+
+class NonceManager:
+    """
+    送信元アカウントのnonceをローカルで管理する
+    ブロックの確定を待たずに連続してトランザクションを送信するために使う
+    nonceを参照してから更新するまではlockを取得すること
+    """
+    def __init__(self, w3: Web3, address: str):
+        self.w3 = w3
+        self.address = address
+        self.lock = threading.RLock()
+        self.nonce = None
+
+    def sync(self) -> None:
+        # 未確定のトランザクションも含めてチェーンからnonceを取得
+        self.nonce = self.w3.eth.get_transaction_count(self.address, "pending")
+
+    def peek(self) -> int:
+        if self.nonce is None:
+            self.sync()
+        return self.nonce
+
+    def advance(self) -> None:
+        self.nonce += 1
+
+class RatingCache:
+    """
+    登録済みの信用スコア(ratingOfの値)をttl秒の間だけ保持するキャッシュ
+    期限切れの値は返さず、次回チェーンから読み直す
+    """
+    def __init__(self, ttl: float = RATING_CACHE_TTL):
+        self.ttl = ttl
+        self.ratings: dict[str, tuple[int, float]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, address: str) -> int | None:
+        with self.lock:
+            entry = self.ratings.get(address)
+            if entry is None:
+                return None
+            rating, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self.ratings[address]
+                return None
+            return rating
+
+    def put(self, address: str, rating: int) -> None:
+        with self.lock:
+            self.ratings[address] = (rating, time.monotonic() + self.ttl)
+
+    def pop(self, address: str) -> None:
+        with self.lock:
+            self.ratings.pop(address, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.ratings.clear()
 
 class Contract:
-    def __init__(self, rpc_url: str, token_contract_address: str, scoring_contract_address: str, private_key: str):
+    def __init__(
+        self,
+        rpc_url: str,
+        token_contract_address: str,
+        scoring_contract_address: str,
+        private_key: str,
+        log_store_path: str = None,
+        sync_chunk_size: int = SYNC_CHUNK_SIZE,
+        confirmations: int = CONFIRMATIONS
+    ):
         self.w3 = Web3(Web3.HTTPProvider(rpc_url))
         self.token_contract = None
         self.scoring_contract = None
         self.account = None
         self.private_key = private_key
 
+        # Transferイベントのローカルストアと同期の設定
+        self.log_store = LogStore(log_store_path) if log_store_path else None
+        self.sync_chunk_size = sync_chunk_size
+        self.confirmations = confirmations
+        self.sync_lock = threading.Lock()
+
+        # 登録済みの信用スコアのライトスルーキャッシュ(有効期限付き)
+        self.rating_cache = RatingCache()
+
         # Ethereumネットワークへの接続
         if not self.w3.is_connected():
             raise Exception("Failed to connect to the Ethereum network")
@@ -19,25 +113,105 @@ class Contract:
             self.token_contract = self.w3.eth.contract(address=token_contract_address, abi=token_abi)
             self.scoring_contract = self.w3.eth.contract(address=scoring_contract_address, abi=scoring_abi)
             self.account = Account.from_key(private_key)
+            self.nonce_manager = NonceManager(self.w3, self.account.address)
 
     def regist_score(self, address: str, score: float) -> None:
         """
         信用スコアをブロックチェーンに登録する
         """
-        score = int(score * 100)
+        result = self.regist_scores({address: score})[address]
+        if result["status"] == "failed":
+            raise Exception(result["error"])
+
+    def send_transaction(self, build_tx) -> HexBytes:
+        """
+        ローカルで管理するnonceを渡してトランザクションを構築し、署名して送信する
+        送信に失敗した場合はnonceをチェーンと同期し直す
+        """
+        with self.nonce_manager.lock:
+            try:
+                tx = build_tx(self.nonce_manager.peek())
+                signed_tx = self.w3.eth.account.sign_transaction(tx, private_key=self.private_key)
+                tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            except Exception:
+                self.nonce_manager.sync()
+                raise
+            self.nonce_manager.advance()
+        return tx_hash
 
-        # トランザクションを構築
-        tx = self.scoring_contract.functions.rate(address, score).build_transaction({
-            "from": self.account.address,
-            "gas": 300000,
-            "gasPrice": self.w3.to_wei("50", "gwei"),
-            "nonce": self.w3.eth.get_transaction_count(self.account.address),
-        })
+    def regist_scores(self, scores: dict[str, float], timeout: float = 120, skip_unchanged: bool = True) -> dict[str, dict]:
+        """
+        複数の信用スコアをブロックチェーンに登録する
+        ローカルで管理するnonceを使って全てのトランザクションを連続して送信し、最後にまとめてレシートを待つ
+        skip_unchanged=Trueの場合は登録済みの値と同じアドレスへの書き込みを省略する
+        アドレスごとに登録結果(status, tx_hash, error)を返す。statusはsuccess, failed, skippedのいずれか
+        """
+        results = {}
+        tx_hashes = {}
+        ratings = {address: int(score * 100) for address, score in scores.items()}
+
+        # 登録済みの値と変わらないアドレスは書き込みを省略
+        # 読み出しに失敗した場合は省略せずに全てのアドレスに書き込む(アドレスごとの登録結果を返すため)
+        if skip_unchanged:
+            try:
+                current_ratings = self.get_ratings(list(ratings))
+            except Exception as e:
+                logger.warning(f"Error reading ratings, sending all ratings: {e}")
+                current_ratings = {}
+            for address, rating in ratings.items():
+                if current_ratings.get(address) == rating:
+                    results[address] = {"status": "skipped", "tx_hash": None, "error": None}
 
-        # トランザクションの署名と送信をしてスコアを取得
-        signed_tx = self.w3.eth.account.sign_transaction(tx, private_key=self.private_key)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        # トランザクションの構築・署名・送信
+        for address, rating in ratings.items():
+            if address in results:
+                continue
+            try:
+                tx_hashes[address] = self.send_transaction(
+                    lambda nonce: self.scoring_contract.functions.rate(address, rating).build_transaction({
+                        "from": self.account.address,
+                        "gas": 300000,
+                        "gasPrice": self.w3.to_wei("50", "gwei"),
+                        "nonce": nonce,
+                    })
+                )
+            except Exception as e:
+                results[address] = {"status": "failed", "tx_hash": None, "error": str(e)}
+
+        # 送信した全てのトランザクションのレシートを待つ
+        for address, tx_hash in tx_hashes.items():
+            try:
+                receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+                if receipt["status"] == 1:
+                    results[address] = {"status": "success", "tx_hash": tx_hash.to_0x_hex(), "error": None}
+                    self.rating_cache.put(address, ratings[address])
+                else:
+                    results[address] = {"status": "failed", "tx_hash": tx_hash.to_0x_hex(), "error": "Transaction reverted"}
+            except Exception as e:
+                results[address] = {"status": "failed", "tx_hash": tx_hash.to_0x_hex(), "error": str(e)}
+        # 登録に失敗したアドレスは次回チェーンから読み直す
+        for address, result in results.items():
+            if result["status"] == "failed":
+                self.rating_cache.pop(address)
+        return {address: results[address] for address in scores}
+
+    def get_ratings(self, addresses: list[str], batch_size: int = RECEIPT_BATCH_SIZE) -> dict[str, int]:
+        """
+        登録済みの信用スコア(ratingOfの値)を取得する
+        キャッシュにない(または期限切れの)アドレスのみをbatch_size件ずつバッチリクエストでまとめて読み出す
+        """
+        ratings = {address: self.rating_cache.get(address) for address in dict.fromkeys(addresses)}
+        missing = [address for address, rating in ratings.items() if rating is None]
+        for start in range(0, len(missing), batch_size):
+            chunk = missing[start:start + batch_size]
+            with self.w3.batch_requests() as batch:
+                for address in chunk:
+                    batch.add(self.scoring_contract.functions.ratingOf(address))
+                responses = batch.execute()
+            for address, rating in zip(chunk, responses):
+                self.rating_cache.put(address, rating)
+                ratings[address] = rating
+        return ratings
 
     def get_score(self, address: str) -> float:
         """
@@ -58,17 +232,15 @@ class Contract:
 
         # 指定したコントラクトアドレスにETHを送信
         try: 
-            tx1 = {
+            tx_hash1 = self.send_transaction(lambda nonce: {
                 "to": self.token_contract.address,
                 "value": self.w3.to_wei(0.31, "ether"),
                 "from": self.account.address,
                 "gas": 600000,
                 "gasPrice": gasprice,
-                "nonce": self.w3.eth.get_transaction_count(self.account.address),
+                "nonce": nonce,
                 "chainId": chain_id
-            }
-            signed_tx1 = self.w3.eth.account.sign_transaction(tx1, private_key=self.private_key)
-            tx_hash1 = self.w3.eth.send_raw_transaction(signed_tx1.raw_transaction)
+            })
             self.w3.eth.wait_for_transaction_receipt(tx_hash1)
         except Exception as e:
             print(f"Error sending ether: {e}")
@@ -76,33 +248,70 @@ class Contract:
 
         # 指定したアドレスにETHを送信
         try:
-            tx2 = self.token_contract.functions.faucet(address).build_transaction({
+            tx_hash2 = self.send_transaction(lambda nonce: self.token_contract.functions.faucet(address).build_transaction({
                 "from": self.account.address,
                 "gas": 600000,
                 "gasPrice": gasprice,
-                "nonce": self.w3.eth.get_transaction_count(self.account.address),
+                "nonce": nonce,
                 "chainId": chain_id
-            })
-            signed_tx2 = self.w3.eth.account.sign_transaction(tx2, private_key=self.private_key)
-            tx_hash2 = self.w3.eth.send_raw_transaction(signed_tx2.raw_transaction)
+            }))
             self.w3.eth.wait_for_transaction_receipt(tx_hash2)
         except Exception as e:
             print(f"Error sending faucet transaction: {e}")
             return False
         return True
 
-    def fetch_tokens(self) -> list[dict]:
+    def fetch_tokens(self, fetch_mode: str = "batch", batch_size: int = RECEIPT_BATCH_SIZE) -> list[dict]:
         """
         スマートコントラクトから転送されたNFTトークンの情報を取得する
+        fetch_mode="batch"はガス代の取得をJSON-RPCのバッチリクエストにまとめる
+        fetch_mode="sequential"はログごとにトランザクションとレシートを取得する
+        ローカルストアを設定している場合は前回同期したブロック以降のみを取得する
         """
-        tokens: list[dict] = []
+        if self.log_store is not None:
+            return self.sync_tokens(fetch_mode=fetch_mode, batch_size=batch_size)
         logs = self.token_contract.events.Transfer().get_logs(from_block=0)
+        return self.decode_tokens(logs, fetch_mode=fetch_mode, batch_size=batch_size)
+
+    def sync_tokens(self, fetch_mode: str = "batch", batch_size: int = RECEIPT_BATCH_SIZE) -> list[dict]:
+        """
+        ローカルストアのカーソル以降のブロックをsync_chunk_sizeブロックずつ取得してストアに追加する
+        再編成に備えて、カーソルからconfirmationsブロック分は毎回再取得する
+        """
+        contract_address = self.token_contract.address
+        with self.sync_lock:
+            latest_block = self.w3.eth.block_number
+            cursor = self.log_store.get_cursor(contract_address)
+            from_block = 0 if cursor is None else max(0, cursor + 1 - self.confirmations)
+            self.log_store.rewind(contract_address, from_block)
+
+            for start in range(from_block, latest_block + 1, self.sync_chunk_size):
+                end = min(start + self.sync_chunk_size - 1, latest_block)
+                logs = self.token_contract.events.Transfer().get_logs(from_block=start, to_block=end)
+                tokens = self.decode_tokens(logs, fetch_mode=fetch_mode, batch_size=batch_size, include_position=True)
+                self.log_store.append(contract_address, tokens, last_block=end)
+        return self.log_store.get_tokens(contract_address)
+
+    def decode_tokens(self, logs: list, fetch_mode: str = "batch", batch_size: int = RECEIPT_BATCH_SIZE, include_position: bool = False) -> list[dict]:
+        """
+        Transferイベントのログにガス代を付与してトークン情報に変換する
+        include_position=Trueの場合はログの位置(transactionHash, logIndex)も含める
+        """
+        # ミント（0x0からの転送）は除外
+        logs = [log for log in logs if log["args"]["from"] != "0x0000000000000000000000000000000000000000"]
+
+        # ガス代をトランザクションごとに取得
+        transaction_hashes = list(dict.fromkeys(log["transactionHash"] for log in logs))
+        if fetch_mode == "batch":
+            gas = self.fetch_gas_batch(transaction_hashes, batch_size=batch_size)
+        elif fetch_mode == "sequential":
+            gas = self.fetch_gas_sequential(transaction_hashes)
+        else:
+            raise ValueError(f"Unknown fetch mode: {fetch_mode}")
+
+        tokens: list[dict] = []
         for log in logs:
-            # ミント（0x0からの転送）は除外
-            if log["args"]["from"] == "0x0000000000000000000000000000000000000000":
-                continue
-            gas_price = self.w3.eth.get_transaction(log["transactionHash"])["gasPrice"]
-            gas_used = self.w3.eth.get_transaction_receipt(log["transactionHash"])["gasUsed"]
+            gas_price, gas_used = gas[log["transactionHash"]]
             token = {
                 "from": log["args"]["from"],
                 "to": log["args"]["to"],
@@ -111,5 +320,35 @@ class Contract:
                 "gasUsed": gas_used,
                 "blockNumber": log["blockNumber"],
             }
+            if include_position:
+                token["transactionHash"] = log["transactionHash"].to_0x_hex()
+                token["logIndex"] = log["logIndex"]
             tokens.append(token)
-        return tokens
\ No newline at end of file
+        return tokens
+
+    def fetch_gas_sequential(self, transaction_hashes: list) -> dict:
+        """
+        トランザクションごとにgasPriceとgasUsedを取得する
+        """
+        gas = {}
+        for transaction_hash in transaction_hashes:
+            gas_price = self.w3.eth.get_transaction(transaction_hash)["gasPrice"]
+            gas_used = self.w3.eth.get_transaction_receipt(transaction_hash)["gasUsed"]
+            gas[transaction_hash] = (gas_price, gas_used)
+        return gas
+
+    def fetch_gas_batch(self, transaction_hashes: list, batch_size: int = RECEIPT_BATCH_SIZE) -> dict:
+        """
+        batch_size件のトランザクションごとに、トランザクションとレシートの取得を1回のバッチリクエストで送信する
+        """
+        gas = {}
+        for start in range(0, len(transaction_hashes), batch_size):
+            chunk = transaction_hashes[start:start + batch_size]
+            with self.w3.batch_requests() as batch:
+                for transaction_hash in chunk:
+                    batch.add(self.w3.eth.get_transaction(transaction_hash))
+                    batch.add(self.w3.eth.get_transaction_receipt(transaction_hash))
+                responses = batch.execute()
+            for i, transaction_hash in enumerate(chunk):
+                gas[transaction_hash] = (responses[2 * i]["gasPrice"], responses[2 * i + 1]["gasUsed"])
+        return gas
@@ -1,32 +1,111 @@
+import gzip
+import json
+import time
 from typing import Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ロングポーリングで1回あたりに待機する秒数
+POLL_WAIT_SECONDS = 30
+
+# 接続とレスポンス待ちのタイムアウト(秒)
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+
+# 接続エラーやサーバーの一時的なエラーを再試行する回数
+MAX_RETRIES = 3
+
+# リクエストボディを圧縮する最小サイズ(byte)
+COMPRESS_MIN_BYTES = 1024
 
 class Engine:
-    def __init__(self, engine_url :str):
+    def __init__(self, engine_url :str, pool_size: int = 4):
         self.url = engine_url
 
-    def predict_score(self, contract_address: str, transactions: list = None) -> dict:
+        # 接続を再利用するセッション(POSTは接続エラーのみ再試行する)
+        retry = Retry(
+            total=MAX_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=[502, 503, 504]
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip"})
+
+    def post_json(self, path: str, body: dict, timeout: float = READ_TIMEOUT) -> requests.Response:
+        """
+        JSONをPOSTする。COMPRESS_MIN_BYTES以上のボディはgzip圧縮して送信する
+        """
+        data = json.dumps(body, separators=(",", ":")).encode()
+        headers = {"Content-Type": "application/json"}
+        if len(data) >= COMPRESS_MIN_BYTES:
+            data = gzip.compress(data, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return self.session.post(f"{self.url}{path}", data=data, headers=headers, timeout=(CONNECT_TIMEOUT, timeout))
+
+    def predict_score(self, contract_address: str, transactions: list = None, addresses: list = None, timeout: float = 600) -> dict:
         """
         `Trust Engine`に接続し、信用スコアを予測する。
         信用スコアは、`Trust Score`と`Predict Trust Score`の2つの指標で表される。
+        予測はジョブとして投入し、完了するまでロングポーリングで結果を待つ。
+        addressesを指定した場合は、そのアドレスのスコアと隣接するエッジのみを取得する。
         """
         centrality_key = "pagerank"
-        json = {
+        body = {
             "contract_address": contract_address,
-            "transactions": transactions
+            "transactions": transactions,
+            "addresses": addresses,
+            "metrics": [centrality_key]
         }
-        response = requests.get(f"{self.url}/generate", json=json)
-        if response.status_code == 200:
-            centrality = response.json().get("centrality")
-            predict_centrality = response.json().get("predict_centrality")
-            generate_graph = response.json().get("generate_graph")
-            return {
-                "original_score": centrality[centrality_key],
-                "predict_score": predict_centrality[centrality_key],
-                "generate_graph": generate_graph
-            }
+        response = self.post_json("/generate/jobs", body)
+        if response.status_code != 200:
+            return {}
+        job_id = response.json().get("job_id")
+
+        # ジョブが完了するまで待つ
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            wait = min(POLL_WAIT_SECONDS, max(deadline - time.monotonic(), 0))
+            response = self.session.get(
+                f"{self.url}/generate/jobs/{job_id}",
+                params={"wait": wait},
+                timeout=(CONNECT_TIMEOUT, wait + READ_TIMEOUT)
+            )
+            if response.status_code != 200:
+                return {}
+            job = response.json()
+            if job.get("status") == "finished":
+                result = job.get("result")
+                return {
+                    "original_score": result.get("centrality")[centrality_key],
+                    "predict_score": result.get("predict_centrality")[centrality_key],
+                    "generate_graph": result.get("generate_graph")
+                }
+            elif job.get("status") == "failed":
+                return {}
         return {}
 
+    def personalized_score(self, contract_address: str, address: str, targets: list, transactions: list = None, epsilon: float = None) -> dict:
+        """
+        `Trust Engine`に接続し、addressから見た取引相手(targets)の信用スコアを取得する。
+        スコアはaddressを始点とする個人化PageRankであり、addressの周辺のみを探索するため`predict_score`より低コストで計算できる。
+        """
+        body = {
+            "contract_address": contract_address,
+            "address": address,
+            "targets": targets,
+            "transactions": transactions
+        }
+        if epsilon is not None:
+            body["epsilon"] = epsilon
+        response = self.post_json("/score", body)
+        if response.status_code != 200:
+            return {}
+        return response.json().get("scores", {})
+
     def get_transaction(self, contract_address: str, address: str) -> dict:
         """
         特定のユーザーの最近の取引情報を取得する。
@@ -37,7 +116,7 @@ class Engine:
             "contract_address": contract_address,
             "address": address
         }
-        response = requests.get(f"{self.url}/transaction", params=params)
+        response = self.session.get(f"{self.url}/transaction", params=params, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
         if response.status_code == 200:
             return response.json()
         return {}
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+
+class LogStore:
+    """
+    デコード済みのTransferイベントと同期済みのブロック番号をSQLiteに保存するローカルストア
+    """
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connect() as connection:
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS transfers (
+                    contract_address TEXT NOT NULL,
+                    block_number INTEGER NOT NULL,
+                    log_index INTEGER NOT NULL,
+                    transaction_hash TEXT NOT NULL,
+                    from_address TEXT NOT NULL,
+                    to_address TEXT NOT NULL,
+                    token_id TEXT NOT NULL,
+                    gas_price INTEGER NOT NULL,
+                    gas_used INTEGER NOT NULL,
+                    PRIMARY KEY (contract_address, block_number, log_index)
+                );
+                CREATE TABLE IF NOT EXISTS cursors (
+                    contract_address TEXT PRIMARY KEY,
+                    last_block INTEGER NOT NULL
+                );
+                """
+            )
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    def get_cursor(self, contract_address: str) -> int | None:
+        """
+        同期済みの最後のブロック番号を返す。未同期の場合はNoneを返す
+        """
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT last_block FROM cursors WHERE contract_address = ?", (contract_address,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def rewind(self, contract_address: str, from_block: int) -> None:
+        """
+        from_block以降のログを削除し、カーソルをfrom_blockの直前に戻す(再編成に備えて再取得するため)
+        """
+        with self.connect() as connection:
+            connection.execute(
+                "DELETE FROM transfers WHERE contract_address = ? AND block_number >= ?", (contract_address, from_block)
+            )
+            self._set_cursor(connection, contract_address, from_block - 1)
+
+    def append(self, contract_address: str, tokens: list[dict], last_block: int) -> None:
+        """
+        ログを追加し、カーソルをlast_blockに進める(同じトランザクション内で更新する)
+        """
+        with self.connect() as connection:
+            connection.executemany(
+                """
+                INSERT OR REPLACE INTO transfers
+                (contract_address, block_number, log_index, transaction_hash, from_address, to_address, token_id, gas_price, gas_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        contract_address, token["blockNumber"], token["logIndex"], token["transactionHash"],
+                        token["from"], token["to"], str(token["tokenId"]), token["gasPrice"], token["gasUsed"]
+                    )
+                    for token in tokens
+                ]
+            )
+            self._set_cursor(connection, contract_address, last_block)
+
+    @staticmethod
+    def _set_cursor(connection: sqlite3.Connection, contract_address: str, last_block: int) -> None:
+        connection.execute(
+            "INSERT OR REPLACE INTO cursors (contract_address, last_block) VALUES (?, ?)", (contract_address, last_block)
+        )
+
+    def get_tokens(self, contract_address: str) -> list[dict]:
+        """
+        保存済みのログをfetch_tokensと同じ形式で返す
+        """
+        with self.connect() as connection:
+            rows = connection.execute(
+                """
+                SELECT from_address, to_address, token_id, gas_price, gas_used, block_number
+                FROM transfers WHERE contract_address = ?
+                ORDER BY block_number, log_index
+                """,
+                (contract_address,)
+            ).fetchall()
+        return [
+            {
+                "from": from_address,
+                "to": to_address,
+                "tokenId": int(token_id),
+                "gasPrice": gas_price,
+                "gasUsed": gas_used,
+                "blockNumber": block_number,
+            }
+            for from_address, to_address, token_id, gas_price, gas_used, block_number in rows
+        ]
@@ -5,8 +5,11 @@ from .models import State, User
 from .tools.contract import Contract
 from .tools.engine import Engine
 
+# 個人化PageRankで認可する取引相手のスコアの閾値(トラストエンジンのプッシュの打ち切り閾値と同じ)
+PERSONALIZED_SCORE_THRESHOLD = 1e-4
+
 class TrustScoringAgent:
-    def __init__(self, model, blockchain_url: str, engine_url: str, token_contract_address: str, scoring_contract_address: str, private_key: str):
+    def __init__(self, model, blockchain_url: str, engine_url: str, token_contract_address: str, scoring_contract_address: str, private_key: str, log_store_path: str = None):
         self.model = model
         self.private_key = private_key
         self.engine = Engine(engine_url)
@@ -18,7 +21,8 @@ class TrustScoringAgent:
                 rpc_url=blockchain_url,
                 token_contract_address=token_contract_address,
                 scoring_contract_address=scoring_contract_address,
-                private_key=private_key
+                private_key=private_key,
+                log_store_path=log_store_path
             )
         except Exception as e:
             self.contract = None
@@ -105,39 +109,72 @@ class TrustScoringAgent:
             status="thinking"
         )
         
-    def auth(self, contract_address: str, from_address: str, to_address_list: List[str], requireFetch: bool = False) -> dict:
+    def auth(
+        self,
+        contract_address: str,
+        from_address: str,
+        to_address_list: List[str],
+        requireFetch: bool = False,
+        score_mode: Literal["generate", "personalized"] = "generate",
+        score_threshold: float = PERSONALIZED_SCORE_THRESHOLD
+    ) -> dict:
         """
         取引先の信頼スコアを評価し、ユーザーを認可する
         1. 信用スコアを予測
         2. fromとtoの信用スコアをブロックチェーンに登録
         3. スマートコントラクトが信用スコアに基づいて認可するユーザーを決定
         4. 信用スコアをブロックチェーンに記録
+        score_mode="personalized"の場合はネットワーク生成を行わず、fromから見たtoの個人化PageRankが閾値以上のユーザーを認可する
+        個人化PageRankは問い合わせたユーザーごとに異なる値のため、ブロックチェーンには登録しない
         """
         authorized_users = []       # 生成されたグラフの中心性と隣接するユーザーから認可するユーザーを決定
         authorized_score_users = [] # 生成されたグラフの中心性のみから認可するユーザーを決定
         authorized_graph_users = [] # 生成されたグラフの隣接するユーザーのみから認可するユーザーを決定
 
         # トラストエンジンに問い合わせて信用スコアを予測
-        if not requireFetch:
-            result_score = self.engine.predict_score(contract_address=contract_address)
-        else:
-            transactions = self.contract.fetch_tokens()
-            result_score = self.engine.predict_score(contract_address=contract_address, transactions=transactions)
+        # 評価に使うfromとtoのアドレスのスコアと隣接するエッジのみを取得
+        addresses = [from_address] + list(to_address_list)
+        transactions = self.contract.fetch_tokens() if requireFetch else None
+        if score_mode == "personalized":
+            # fromの周辺のみを探索してtoのスコアを取得し、閾値以上のユーザーを認可する(読み出しのみ)
+            personalized_scores = self.engine.personalized_score(
+                contract_address=contract_address,
+                address=from_address,
+                targets=list(to_address_list),
+                transactions=transactions
+            )
+            for to_address in to_address_list:
+                if personalized_scores.get(to_address, 0.0) >= score_threshold:
+                    authorized_users.append(to_address)
+                    authorized_score_users.append(to_address)
+            return {
+                "authorized_users": authorized_users,
+                "authorized_graph_users": authorized_graph_users,
+                "authorized_score_users": authorized_score_users,
+                "registration_failures": {},
+                "skipped_writes": 0
+            }
+
+        result_score = self.engine.predict_score(contract_address=contract_address, transactions=transactions, addresses=addresses)
         original_scores = result_score.get("original_score", {})
         predict_scores = result_score.get("predict_score", {})
         generate_graph = result_score.get("generate_graph", [])
 
-        # fromとtoの信用スコアで最も高いスコアをブロックチェーンに登録
-        from_score = max(
+        # fromとtoの信用スコアで最も高いスコアをまとめてブロックチェーンに登録
+        scores = {}
+        scores[from_address] = max(
             original_scores.get(from_address, 0.0),
             predict_scores.get(from_address, 0.0)
         )
-        self.contract.regist_score(address=from_address, score=from_score)
         for to_address in to_address_list:
             to_original_score = original_scores.get(to_address, 0.0)
             to_predict_score = predict_scores.get(to_address, 0.0)
-            to_score = max(to_original_score, to_predict_score)
-            self.contract.regist_score(address=to_address, score=to_score)
+            scores[to_address] = max(to_original_score, to_predict_score)
+        registration = self.contract.regist_scores(scores)
+        registration_failures = {
+            address: result["error"] for address, result in registration.items() if result["status"] == "failed"
+        }
+        skipped_writes = sum(result["status"] == "skipped" for result in registration.values())
 
         # 生成されたグラフから隣接する取引相手を選択する
         for edge in generate_graph:
@@ -152,7 +189,9 @@ class TrustScoringAgent:
         return {
             "authorized_users": authorized_users,
             "authorized_graph_users": authorized_graph_users,
-            "authorized_score_users": authorized_score_users
+            "authorized_score_users": authorized_score_users,
+            "registration_failures": registration_failures,
+            "skipped_writes": skipped_writes
         }
 
     def faucet(self, address: str) -> bool:
@@ -1,3 +1,4 @@
+import logging
 import os
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
@@ -9,6 +10,7 @@ from components.models import RequestLogs, AuthRequestBody
 from components.database import Database
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 app = FastAPI()
 database = Database(os.environ["GRAPH_DB_URL"])
 model = AzureChatOpenAI(
@@ -22,7 +24,8 @@ trust_score_agent = TrustScoringAgent(
     engine_url=os.environ["TRUST_ENGINE_URL"],
     token_contract_address=os.environ["TOKEN_CONTRACT_ADDRESS"],
     scoring_contract_address=os.environ["SCORING_CONTRACT_ADDRESS"],
-    private_key=os.environ["PRIVATE_KEY"]
+    private_key=os.environ["PRIVATE_KEY"],
+    log_store_path=os.environ.get("LOG_STORE_PATH", "data/transfer_logs.sqlite3")
 )
 
 # CORSの設定
@@ -47,9 +50,8 @@ def post_logs(request_logs: RequestLogs):
     変換したログを保存する
     """
     try:
-        database.save_address(logs=request_logs.transfer_logs)
-        database.save_relationship(logs=request_logs.transfer_logs)
-        return {"message": "Logs recorded successfully"}
+        ingest = database.save_logs(logs=request_logs.transfer_logs)
+        return {"message": "Logs recorded successfully", "ingest": ingest}
     except Exception as e:
         return {"error": str(e)}
 
@@ -69,14 +71,17 @@ def get_auth(request_body: AuthRequestBody):
             contract_address=contract_address,
             from_address=from_address,
             to_address_list=to_address_list,
-            requireFetch=True
+            requireFetch=True,
+            score_mode=request_body.score_mode
         )
         return {
             "message": "Authorization process completed",
             "authorized_users": result["authorized_users"],
             "other": {
                 "authorized_graph_users": result["authorized_graph_users"],
-                "authorized_score_users": result["authorized_score_users"]
+                "authorized_score_users": result["authorized_score_users"],
+                "registration_failures": result["registration_failures"],
+                "skipped_writes": result["skipped_writes"]
             }
         }
     except Exception as e:
@@ -96,6 +101,14 @@ def post_faucet(address: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.on_event("startup")
+def startup_event():
+    # アドレスの一意制約と取引のインデックスを作成
+    try:
+        database.ensure_constraints()
+    except Exception as e:
+        logger.error(f"Error creating constraints: {e}")
+
 @app.on_event("shutdown")
 def shutdown_event():
     global database
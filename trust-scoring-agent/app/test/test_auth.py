@@ -0,0 +1,35 @@
+import os
+import sys
+from unittest.mock import MagicMock
+import pytest
+
+# 親ディレクトリをPythonパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+pytest.importorskip("langfuse")
+from components.trust_scoring_agent import TrustScoringAgent
+
+def test_auth_personalized_is_read_only():
+    """個人化PageRankのモードでは閾値以上の取引相手を認可し、スコアを登録しないことのテスト"""
+    # Arrange
+    agent = TrustScoringAgent.__new__(TrustScoringAgent)  # LLMとRPC接続を避けてメソッドだけ利用
+    agent.engine = MagicMock()
+    agent.contract = MagicMock()
+    agent.contract.fetch_tokens.return_value = [{"from": "0xa", "to": "0xb"}]
+    agent.engine.personalized_score.return_value = {"0xb": 0.2, "0xc": 0.0}
+
+    # Act
+    result = agent.auth("0x1", from_address="0xa", to_address_list=["0xb", "0xc", "0xd"], requireFetch=True, score_mode="personalized")
+
+    # Assert
+    agent.engine.personalized_score.assert_called_once_with(
+        contract_address="0x1",
+        address="0xa",
+        targets=["0xb", "0xc", "0xd"],
+        transactions=[{"from": "0xa", "to": "0xb"}]
+    )
+    agent.engine.predict_score.assert_not_called()
+    agent.contract.regist_scores.assert_not_called()
+    assert result["authorized_users"] == ["0xb"]
+    assert result["authorized_score_users"] == ["0xb"]
+    assert result["registration_failures"] == {}
+    assert result["skipped_writes"] == 0
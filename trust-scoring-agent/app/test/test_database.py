@@ -0,0 +1,57 @@
+import os
+import sys
+from unittest.mock import MagicMock
+
+# 親ディレクトリをPythonパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from components.database import Database
+from components.models import Log
+
+def create_log(token_id: str, transaction_hash: str) -> Log:
+    return Log(
+        token_id=token_id,
+        from_address="0x123",
+        to_address="0x456",
+        block_number=1000,
+        gas_price=1000000000,
+        gas_used=21000,
+        contract_address="0x50cA110B20FebEF46647c9bd68cAF848c56d9d03",
+        transaction_hash=transaction_hash,
+        token_uri="uri"
+    )
+
+def test_save_logs_in_single_transaction():
+    """ログが重複を排除して1つのトランザクションでバッチごとに登録されることのテスト"""
+    # Arrange
+    database = Database.__new__(Database)  # driver接続を避けてメソッドだけ利用
+    database.driver = MagicMock()
+    session = database.driver.session.return_value.__enter__.return_value
+    logs = [create_log("1", "0xabc"), create_log("2", "0xabc"), create_log("1", "0xabc"), create_log("3", "0xdef")]
+
+    # Act
+    result = database.save_logs(logs, batch_size=2)
+
+    # Assert
+    session.execute_write.assert_called_once()
+    batches = session.execute_write.call_args.args[1]
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert result["rows"] == 3
+    assert result["duplicates"] == 1
+    assert result["rows_per_second"] > 0
+
+def test_merge_logs_matches_legacy_edges():
+    """transactionHashを持たない以前のエッジに補完してから重複を排除するクエリであることのテスト"""
+    # Arrange
+    tx = MagicMock()
+    logs = [create_log("1", "0xabc").model_dump()]
+
+    # Act
+    Database._merge_logs(tx, [logs])
+
+    # Assert
+    query = tx.run.call_args.args[0]
+    assert "WHERE legacy.transactionHash IS NULL" in query
+    assert "SET edge.transactionHash = log.transaction_hash" in query
+    # 補完は重複排除のMERGEより前に行う
+    assert query.index("SET edge.transactionHash") < query.index("MERGE (from)-[r:TRANSFER")
+    assert tx.run.call_args.kwargs["logs"] == logs
@@ -1,10 +1,19 @@
-from app.components.tools.engine import Engine
+import gzip
+import json
+import os
+import sys
+from unittest.mock import MagicMock
+
+# 親ディレクトリをPythonパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from components.tools.engine import Engine
 
 engine = Engine(
     engine_url="http://trust-engine:9000"
 )
 
 def test_predict_score():
+    """起動中のトラストエンジンから信用スコアを取得することのテスト(結合テスト)"""
     contract_address = "0x32F4866B63CaDeD01058540Cff9Bb1fcC05E1cb7"
     result = engine.predict_score(contract_address)
 
@@ -32,4 +41,53 @@ def test_predict_score():
         assert len(sublist) == 2
         assert sublist[0].startswith("0x")
         assert sublist[1].startswith("0x")
-    
\ No newline at end of file
+
+def test_predict_score_compresses_large_request():
+    """大きな取引リストをgzip圧縮して送信し、同じセッションで結果を取得することのテスト"""
+    # Arrange
+    engine = Engine("http://engine")
+    engine.session = MagicMock()
+    engine.session.post.return_value = MagicMock(status_code=200, json=lambda: {"job_id": "job"})
+    engine.session.get.return_value = MagicMock(status_code=200, json=lambda: {
+        "status": "finished",
+        "result": {
+            "centrality": {"pagerank": {"0xa": 0.1}},
+            "predict_centrality": {"pagerank": {"0xa": 0.2}},
+            "generate_graph": [["0xa", "0xb"]]
+        }
+    })
+    transactions = [{"from": f"0x{i:040x}", "to": f"0x{i + 1:040x}"} for i in range(100)]
+
+    # Act
+    result = engine.predict_score("0x1", transactions=transactions)
+
+    # Assert
+    kwargs = engine.session.post.call_args.kwargs
+    assert kwargs["headers"]["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(kwargs["data"]))["transactions"] == transactions
+    assert result["predict_score"] == {"0xa": 0.2}
+    assert engine.session.get.call_args.kwargs["timeout"][1] > engine.session.get.call_args.kwargs["params"]["wait"]
+
+def test_personalized_score():
+    """個人化PageRankのスコアを/scoreから取得することのテスト"""
+    # Arrange
+    engine = Engine("http://engine")
+    engine.session = MagicMock()
+    engine.session.post.return_value = MagicMock(status_code=200, json=lambda: {
+        "scores": {"0xb": 0.3, "0xc": 0.0},
+        "pushes": 12,
+        "residual": 1e-4
+    })
+
+    # Act
+    scores = engine.personalized_score("0x1", address="0xa", targets=["0xb", "0xc"])
+
+    # Assert
+    args, kwargs = engine.session.post.call_args
+    assert args[0] == "http://engine/score"
+    assert json.loads(kwargs["data"]) == {"contract_address": "0x1", "address": "0xa", "targets": ["0xb", "0xc"], "transactions": None}
+    assert scores == {"0xb": 0.3, "0xc": 0.0}
+
+    # エラーの場合は空のスコアを返す
+    engine.session.post.return_value = MagicMock(status_code=500)
+    assert engine.personalized_score("0x1", address="0xa", targets=["0xb"]) == {}
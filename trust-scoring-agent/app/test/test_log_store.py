@@ -0,0 +1,38 @@
+import os
+import sys
+
+# 親ディレクトリをPythonパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from components.tools.log_store import LogStore
+
+CONTRACT_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+
+def create_token(block_number: int, log_index: int) -> dict:
+    return {
+        "from": "0x123",
+        "to": "0x456",
+        "tokenId": 2 ** 200 + block_number,
+        "gasPrice": 1000000000,
+        "gasUsed": 21000,
+        "blockNumber": block_number,
+        "transactionHash": f"0x{block_number:064x}",
+        "logIndex": log_index,
+    }
+
+def test_log_store_cursor_and_rewind(tmp_path):
+    """ログの追加・カーソルの更新・再編成に備えた巻き戻しのテスト"""
+    # Arrange
+    store = LogStore(str(tmp_path / "data" / "logs.sqlite3"))
+    assert store.get_cursor(CONTRACT_ADDRESS) is None
+
+    # Act
+    store.append(CONTRACT_ADDRESS, [create_token(1, 0), create_token(1, 1), create_token(5, 0)], last_block=9)
+    store.rewind(CONTRACT_ADDRESS, from_block=5)
+    store.append(CONTRACT_ADDRESS, [create_token(6, 0)], last_block=10)
+    tokens = store.get_tokens(CONTRACT_ADDRESS)
+
+    # Assert
+    assert store.get_cursor(CONTRACT_ADDRESS) == 10
+    assert [token["blockNumber"] for token in tokens] == [1, 1, 6]
+    assert tokens[0]["tokenId"] == 2 ** 200 + 1
+    assert set(tokens[0].keys()) == {"from", "to", "tokenId", "gasPrice", "gasUsed", "blockNumber"}
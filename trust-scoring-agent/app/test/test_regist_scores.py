@@ -0,0 +1,102 @@
+import os
+import sys
+from unittest.mock import MagicMock
+from hexbytes import HexBytes
+
+# 親ディレクトリをPythonパスに追加
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from components.tools.contract import Contract, NonceManager, RatingCache
+
+def test_regist_scores_reports_failures_per_address():
+    """連続送信したスコア登録の結果がアドレスごとに返ることのテスト"""
+    # Arrange
+    contract = Contract.__new__(Contract)  # RPC接続を避けてメソッドだけ利用
+    contract.w3 = MagicMock()
+    contract.private_key = "0x0"
+    contract.account = MagicMock(address="0xsender")
+    contract.scoring_contract = MagicMock()
+    contract.nonce_manager = NonceManager(contract.w3, "0xsender")
+    contract.rating_cache = RatingCache()
+    contract.w3.eth.get_transaction_count.side_effect = [5, 6]
+    contract.w3.eth.send_raw_transaction.side_effect = [HexBytes("0x01"), Exception("nonce too low"), HexBytes("0x03")]
+    contract.w3.eth.wait_for_transaction_receipt.side_effect = [{"status": 1}, {"status": 0}]
+    contract.scoring_contract.functions.rate.return_value.build_transaction.side_effect = lambda tx: tx
+
+    # Act
+    results = contract.regist_scores({"0xa": 0.1, "0xb": 0.2, "0xc": 0.3}, skip_unchanged=False)
+
+    # Assert
+    nonces = [call.args[0]["nonce"] for call in contract.w3.eth.account.sign_transaction.call_args_list]
+    assert nonces == [5, 6, 6]
+    assert list(results) == ["0xa", "0xb", "0xc"]
+    assert results["0xa"]["status"] == "success"
+    assert results["0xb"] == {"status": "failed", "tx_hash": None, "error": "nonce too low"}
+    assert results["0xc"]["error"] == "Transaction reverted"
+    assert contract.w3.eth.wait_for_transaction_receipt.call_count == 2
+    assert [contract.rating_cache.get(address) for address in ["0xa", "0xb", "0xc"]] == [10, None, None]
+
+def test_regist_scores_skips_unchanged_ratings():
+    """登録済みのスコアと同じアドレスへの書き込みが省略されることのテスト"""
+    # Arrange
+    contract = Contract.__new__(Contract)  # RPC接続を避けてメソッドだけ利用
+    contract.w3 = MagicMock()
+    contract.private_key = "0x0"
+    contract.account = MagicMock(address="0xsender")
+    contract.scoring_contract = MagicMock()
+    contract.nonce_manager = NonceManager(contract.w3, "0xsender")
+    contract.rating_cache = RatingCache()
+    contract.rating_cache.put("0xa", 10)
+    batch = contract.w3.batch_requests.return_value.__enter__.return_value
+    batch.execute.return_value = [20, 0]
+    contract.w3.eth.get_transaction_count.return_value = 0
+    contract.w3.eth.send_raw_transaction.return_value = HexBytes("0x01")
+    contract.w3.eth.wait_for_transaction_receipt.return_value = {"status": 1}
+    contract.scoring_contract.functions.rate.return_value.build_transaction.side_effect = lambda tx: tx
+
+    # Act
+    results = contract.regist_scores({"0xa": 0.1, "0xb": 0.2, "0xc": 0.3})
+
+    # Assert
+    assert batch.add.call_count == 2  # キャッシュ済みの0xaは読み出さない
+    assert results["0xa"]["status"] == "skipped"
+    assert results["0xb"]["status"] == "skipped"
+    assert results["0xc"]["status"] == "success"
+    assert contract.w3.eth.send_raw_transaction.call_count == 1
+    assert [contract.rating_cache.get(address) for address in ["0xa", "0xb", "0xc"]] == [10, 20, 30]
+
+def test_regist_scores_sends_all_when_ratings_unavailable(caplog):
+    """登録済みのスコアの読み出しに失敗した場合に全てのアドレスに書き込むことのテスト"""
+    # Arrange
+    contract = Contract.__new__(Contract)  # RPC接続を避けてメソッドだけ利用
+    contract.w3 = MagicMock()
+    contract.private_key = "0x0"
+    contract.account = MagicMock(address="0xsender")
+    contract.scoring_contract = MagicMock()
+    contract.nonce_manager = NonceManager(contract.w3, "0xsender")
+    contract.rating_cache = RatingCache()
+    contract.w3.batch_requests.return_value.__enter__.return_value.execute.side_effect = Exception("batch failed")
+    contract.w3.eth.get_transaction_count.return_value = 0
+    contract.w3.eth.send_raw_transaction.return_value = HexBytes("0x01")
+    contract.w3.eth.wait_for_transaction_receipt.return_value = {"status": 1}
+    contract.scoring_contract.functions.rate.return_value.build_transaction.side_effect = lambda tx: tx
+
+    # Act
+    with caplog.at_level("WARNING", logger="components.tools.contract"):
+        results = contract.regist_scores({"0xa": 0.1, "0xb": 0.2})
+
+    # Assert
+    assert [result["status"] for result in results.values()] == ["success", "success"]
+    assert "batch failed" in caplog.text
+    assert contract.w3.eth.send_raw_transaction.call_count == 2
+
+def test_rating_cache_expires(monkeypatch):
+    """有効期限を過ぎた登録済みのスコアを返さないことのテスト"""
+    now = [100.0]
+    monkeypatch.setattr("components.tools.contract.time.monotonic", lambda: now[0])
+    cache = RatingCache(ttl=60)
+
+    cache.put("0xa", 10)
+    assert cache.get("0xa") == 10
+
+    now[0] += 60
+    assert cache.get("0xa") is None